@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the parallel analysis of an indexed capture file.
+
+A recorded game is repeated for many connections in one capture with index
+and analyzed with a growing number of worker processes.
+
+Run with ``python benchmarks/bench_analysis.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import os
+import time
+import shutil
+import tempfile
+import multiprocessing
+
+from pokerthproto import logger
+from pokerthproto.analysis import HandReducer, analyze
+from pokerthproto.capture import CaptureWriter, CaptureReader
+from pokerthproto.index import IndexBuilder, indexPath
+
+from tests.test_replay import recordGame
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_CONNECTIONS = 64
+
+
+class WinsReducer(HandReducer):
+    """
+    Sums up the money won per player id
+    """
+
+    def initial(self):
+        return {}
+
+    def reduce(self, result, hand):
+        for playerId, money in hand.game.wins.items():
+            result[playerId] = result.get(playerId, 0) + money
+        return result
+
+    def merge(self, result, other):
+        for playerId, money in other.items():
+            result[playerId] = result.get(playerId, 0) + money
+        return result
+
+
+def main():
+    logger.setLevel(logger.Level.WARNING)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'game.cap')
+        recordGame(path, numPlayers=10)
+        records = list(CaptureReader(path))
+        path = os.path.join(tmpdir, 'games.cap')
+        with CaptureWriter(path, compression='zlib',
+                           index=IndexBuilder(indexPath(path))) as writer:
+            for connId in range(1, NUM_CONNECTIONS + 1):
+                for r in records:
+                    writer.write(r.direction, connId, r.frame, r.timestamp)
+        print("{} records of {} connections, {} CPUs".format(
+            NUM_CONNECTIONS*len(records), NUM_CONNECTIONS,
+            multiprocessing.cpu_count()))
+        expected = None
+        serial = None
+        for numWorkers in (0, 1, 2, 4, 8):
+            start = time.time()
+            result = analyze([path], WinsReducer(), numWorkers=numWorkers)
+            elapsed = time.time() - start
+            assert expected is None or result == expected
+            expected = result
+            serial = serial or elapsed
+            print("{} workers: {:.2f} s, speedup {:.2f}".format(
+                numWorkers, elapsed, serial/elapsed))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
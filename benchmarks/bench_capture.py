@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of capture files compared to the hex text log of frames.
+
+Writes the same frames as hex log lines through Twisted's log and as capture
+files without and with zlib compression and reads them back, by parsing the
+lines respectively by streaming and mapping the capture files.
+
+Run with ``python benchmarks/bench_capture.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import os
+import time
+import random
+import shutil
+import binascii
+import tempfile
+
+from twisted.python import log
+
+from pokerthproto import pokerth_pb2
+from pokerthproto import transport
+from pokerthproto import logger
+from pokerthproto.capture import CaptureWriter, CaptureReader, Direction
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_FRAMES = 200000
+
+
+def makeFrames(numFrames):
+    rand = random.Random(42)
+    frames = []
+    for _ in range(numFrames):
+        msg = pokerth_pb2.PlayersActionDoneMessage()
+        msg.gameId = rand.randint(1, 100)
+        msg.playerId = rand.randint(1, 1000)
+        msg.gameState = pokerth_pb2.netStatePreflop
+        msg.playerAction = pokerth_pb2.netActionCall
+        msg.totalPlayerBet = rand.randint(1, 500)
+        msg.playerMoney = rand.randint(1, 10000)
+        msg.highestSet = rand.randint(1, 500)
+        msg.minimumRaise = 20
+        frames.append(transport.pack(transport.envelop(msg))[4:])
+    return frames
+
+
+def writeLog(path, frames):
+    with open(path, 'w') as fh:
+        observer = log.FileLogObserver(fh)
+        log.addObserver(observer.emit)
+        logger.wire.level = logger.Level.DEBUG
+        try:
+            for frame in frames:
+                logger.wire.debug("Data: {}", logger.Hex(frame))
+        finally:
+            logger.wire.level = logger.Level.INFO
+            log.removeObserver(observer.emit)
+
+
+def readLog(path):
+    with open(path) as fh:
+        return sum(1 for line in fh
+                   if binascii.unhexlify(line.rsplit(' ', 1)[1].strip()))
+
+
+def writeCapture(path, frames, compression):
+    with CaptureWriter(path, compression=compression) as writer:
+        for i, frame in enumerate(frames):
+            writer.write(Direction.FROM_CLIENT, i % 100, frame)
+
+
+def readCapture(path, useMmap):
+    return sum(1 for _ in CaptureReader(path, useMmap=useMmap))
+
+
+def measure(f, *args):
+    start = time.time()
+    result = f(*args)
+    return time.time() - start, result
+
+
+def main():
+    frames = makeFrames(NUM_FRAMES)
+    wire = sum(4 + len(frame) for frame in frames)
+    print("{} frames, {:.1f} MB on the wire".format(NUM_FRAMES, wire/1e6))
+    tmpdir = tempfile.mkdtemp()
+    try:
+        setups = [('hex log', writeLog, (), readLog, ()),
+                  ('capture', writeCapture, (None,), readCapture, (False,)),
+                  ('capture, mmap', writeCapture, (None,), readCapture,
+                   (True,)),
+                  ('capture, zlib', writeCapture, ('zlib',), readCapture,
+                   (False,))]
+        for name, write, writeArgs, read, readArgs in setups:
+            path = os.path.join(tmpdir, 'frames')
+            writeTime, _ = measure(write, path, frames, *writeArgs)
+            readTime, count = measure(read, path, *readArgs)
+            assert count == NUM_FRAMES
+            print("{:>14}: {:5.1f} MB, write {:4.2f} us/frame, "
+                  "read {:4.2f} us/frame".format(
+                      name, os.path.getsize(path)/1e6,
+                      1e6*writeTime/NUM_FRAMES, 1e6*readTime/NUM_FRAMES))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of enveloping/developing messages over all PokerTH message types.
+
+Compares the former :obj:`~.transport.envelop` and :obj:`~.transport.develop`
+based on ``ListFields`` and name munging with the descriptor built lookup
+tables.
+
+Run with ``python benchmarks/bench_envelope.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import timeit
+
+from pokerthproto import transport
+from pokerthproto.pokerth_pb2 import PokerTHMessage
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+REPEAT = 200
+
+
+def legacyDevelop(envelope):
+    msg = [v for _, v in envelope.ListFields() if v != envelope.messageType]
+    assert len(msg) == 1
+    return msg[0]
+
+
+def tableDevelop(envelope):
+    return getattr(envelope, transport._fieldByType[envelope.messageType])
+
+
+def legacyEnvelop(msg):
+    msg_name = msg.__class__.__name__
+    envelope = PokerTHMessage()
+    envelope_msg = getattr(envelope, msg_name[0].lower() + msg_name[1:])
+    envelope_msg.MergeFrom(msg)
+    msg_type = getattr(envelope, "Type_{}".format(msg_name))
+    setattr(envelope, 'messageType', msg_type)
+    return envelope
+
+
+def makeEnvelopes():
+    envelopes = []
+    for msg_type, field in sorted(transport._fieldByType.items()):
+        envelope = PokerTHMessage()
+        envelope.messageType = msg_type
+        getattr(envelope, field).SetInParent()
+        envelopes.append(envelope)
+    return envelopes
+
+
+def main():
+    envelopes = makeEnvelopes()
+    msgs = [tableDevelop(envelope) for envelope in envelopes]
+    print("{} message types".format(len(envelopes)))
+    cases = [('develop', legacyDevelop, tableDevelop, envelopes),
+             ('envelop', legacyEnvelop, transport.envelop, msgs)]
+    for name, legacy, table, args in cases:
+        for arg in args:
+            assert legacy(arg) == table(arg)
+        for kind, func in [('legacy', legacy), ('table', table)]:
+            timer = timeit.Timer(lambda: [func(arg) for arg in args])
+            best = min(timer.repeat(repeat=3, number=REPEAT))
+            calls = REPEAT*len(args)
+            print("{} {:>6}: {:8.3f} us/call, {:10.0f} calls/s".format(
+                name, kind, 1e6*best/calls, calls/best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the Monte Carlo equity of pocket aces.
+
+Runs 100k trials against 1 to 9 random opponents preflop and on the flop,
+and once more with a precision of 0.5% to show the early stop. Finally runs
+1M trials against five opponents, two of them holding pocket pairs, once in
+a single process and once sharded over an :obj:`~.EquityService` with a
+worker per CPU. The exact equity on the turn and river is enumerated once
+with empty caches and once more from the cache.
+
+Run with ``python benchmarks/bench_equity.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import time
+import multiprocessing
+
+import numpy as np
+from twisted.internet import reactor
+
+from pokerthproto import poker
+from pokerthproto.equity import (monteCarloEquity, exactEquity, EquityService,
+                                 COMBOS, boardCache, equityCache)
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+TRIALS = 100000
+SERVICE_TRIALS = 1000000
+
+
+def measure(f, *args, **kwargs):
+    start = time.time()
+    result = f(*args, **kwargs)
+    return time.time() - start, result
+
+
+def main():
+    poker._evaluatorTables()
+    for board in ([], ['2c', '7d', '9s']):
+        for numOpponents in (1, 3, 5, 9):
+            elapsed, result = measure(monteCarloEquity, ['Ah', 'Ad'], board,
+                                      numOpponents, trials=TRIALS, seed=42)
+            print("board {!r:<20} {} opponents: equity {:.3f} +- {:.3f} "
+                  "in {:.3f} s".format(board, numOpponents, result.equity,
+                                       1.96*result.stdError, elapsed))
+    elapsed, result = measure(monteCarloEquity, ['Ah', 'Ad'], numOpponents=3,
+                              trials=TRIALS, precision=0.005, seed=42)
+    print("precision 0.005, 3 opponents: equity {:.3f} after {} trials in "
+          "{:.3f} s".format(result.equity, result.trials, elapsed))
+    for board in (['2c', '7d', '9s', 'Kd'], ['2c', '7d', '9s', 'Kd', '3h']):
+        for numOpponents in (1, 2):
+            boardCache.clear()
+            equityCache.clear()
+            elapsed, result = measure(exactEquity, ['Ah', 'Ad'], board,
+                                      numOpponents)
+            cached, _ = measure(exactEquity, ['Ah', 'Ad'], board,
+                                numOpponents)
+            print("exact, board {!r:<32} {} opponents: equity {:.4f} of {:,} "
+                  "showdowns in {:.4f} s, cached {:.6f} s".format(
+                      board, numOpponents, result.equity, result.trials,
+                      elapsed, cached))
+    pairs = np.zeros(len(COMBOS))
+    for i, (card1, card2) in enumerate(COMBOS.tolist()):
+        if card1 % 13 == card2 % 13:
+            pairs[i] = 1.
+    ranges = [pairs, pairs, None, None, None]
+    elapsed, result = measure(monteCarloEquity, ['Ah', 'Kh'], ranges=ranges,
+                              trials=SERVICE_TRIALS, seed=42)
+    print("single process, ranges: equity {:.3f} in {:.2f} s".format(
+        result.equity, elapsed))
+    numWorkers = multiprocessing.cpu_count()
+    service = EquityService(numWorkers)
+    results = []
+    start = time.time()
+    d = service.compute(['Ah', 'Kh'], ranges=ranges, trials=SERVICE_TRIALS,
+                        seed=42)
+    d.addBoth(results.append)
+    d.addBoth(lambda _: reactor.stop())
+    reactor.run()
+    elapsed = time.time() - start
+    service.close()
+    print("{} workers, ranges: equity {:.3f} in {:.2f} s".format(
+        numWorkers, results[0].equity, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of ranking hands of seven cards.
+
+Ranks random hands with the brute force :obj:`~.bestHand`, the table driven
+:obj:`~.evaluate` and its vectorized variant :obj:`~.evaluateMany` and
+cross-checks the results. Finally all 2,598,960 hands of five cards are
+ranked to compare the frequencies of the hand categories to the known ones.
+
+Run with ``python benchmarks/bench_evaluator.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import time
+import random
+from itertools import chain, combinations
+
+import numpy as np
+
+from pokerthproto import poker
+from pokerthproto.poker import HandCategory
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_HANDS = 1000000
+NUM_REFERENCE = 20000
+
+# number of hands of five cards by category
+FREQUENCIES = {
+    HandCategory.HIGH_CARD: 1302540,
+    HandCategory.ONE_PAIR: 1098240,
+    HandCategory.TWO_PAIR: 123552,
+    HandCategory.THREE_OF_A_KIND: 54912,
+    HandCategory.STRAIGHT: 10200,
+    HandCategory.FLUSH: 5108,
+    HandCategory.FULL_HOUSE: 3744,
+    HandCategory.FOUR_OF_A_KIND: 624,
+    HandCategory.STRAIGHT_FLUSH: 40}
+
+
+def measure(f, *args):
+    start = time.time()
+    result = f(*args)
+    return time.time() - start, result
+
+
+def main():
+    random.seed(42)
+    buildTime, _ = measure(poker._evaluatorTables)
+    print("tables built in {:.2f} s".format(buildTime))
+    hands = np.array([random.sample(range(52), 7)
+                      for _ in range(NUM_HANDS)])
+    reference = hands[:NUM_REFERENCE].tolist()
+    refTime, expected = measure(
+        lambda: [poker.bestHand(h)[0] for h in reference])
+    print("bestHand:     {:>10,.0f} hands/s".format(NUM_REFERENCE/refTime))
+    lists = hands.tolist()
+    pyTime, ranks = measure(lambda: [poker.evaluate(h) for h in lists])
+    print("evaluate:     {:>10,.0f} hands/s".format(NUM_HANDS/pyTime))
+    npTime, npRanks = measure(poker.evaluateMany, hands)
+    print("evaluateMany: {:>10,.0f} hands/s".format(NUM_HANDS/npTime))
+    assert ranks[:NUM_REFERENCE] == expected
+    assert npRanks.tolist() == ranks
+    fives = np.fromiter(chain.from_iterable(combinations(range(52), 5)),
+                        dtype=np.int8).reshape(-1, 5)
+    categories = poker.evaluateMany(fives) >> 20
+    assert np.bincount(categories).tolist() == \
+        [FREQUENCIES[c] for c in sorted(FREQUENCIES)]
+    print("frequencies of all hands of five cards match")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the frame reassembly in :obj:`PokerTHProtocol`.
+
+10k ``PlayersActionDoneMessage`` frames are split at random points into
+chunks and fed to the former string based reassembly as well as to the
+:obj:`~.transport.FrameDecoder`.
+
+Run with ``python benchmarks/bench_framing.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import random
+import timeit
+
+from pokerthproto import pokerth_pb2
+from pokerthproto import transport
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_FRAMES = 10000
+NUM_CHUNKS = 200
+
+
+class LegacyDecoder(object):
+    """
+    String based frame reassembly as it was used in :obj:`PokerTHProtocol`
+    """
+    _buffer = ''
+    _msgSize = None
+
+    def feed(self, data):
+        self._buffer += data
+        bufData = []
+        while True:
+            if self._msgSize is None:
+                if len(self._buffer) >= 4:
+                    self._msgSize = transport.readSizeBytes(self._buffer[:4])
+                    self._buffer = self._buffer[4:]
+                else:
+                    break
+            if len(self._buffer) >= self._msgSize:
+                bufData.append(self._buffer[:self._msgSize])
+                self._buffer = self._buffer[self._msgSize:]
+                self._msgSize = None
+            else:
+                break
+        return bufData
+
+
+def makeStream(numFrames):
+    frames = []
+    for i in range(numFrames):
+        msg = pokerth_pb2.PlayersActionDoneMessage()
+        msg.gameId = 1
+        msg.playerId = i % 10 + 1
+        msg.gameState = pokerth_pb2.netStatePreflop
+        msg.playerAction = pokerth_pb2.netActionCall
+        msg.totalPlayerBet = 20
+        msg.playerMoney = 3000 - i % 100
+        msg.highestSet = 20
+        msg.minimumRaise = 20
+        frames.append(transport.pack(transport.envelop(msg)))
+    return b''.join(frames)
+
+
+def makeChunks(stream, numChunks, seed=42):
+    rnd = random.Random(seed)
+    cuts = sorted(rnd.sample(range(1, len(stream)), numChunks - 1))
+    return [stream[start:stop]
+            for start, stop in zip([0] + cuts, cuts + [len(stream)])]
+
+
+def consume(decoder, chunks):
+    n = 0
+    for chunk in chunks:
+        for _ in decoder.feed(chunk):
+            n += 1
+    assert n == NUM_FRAMES
+
+
+def main():
+    stream = makeStream(NUM_FRAMES)
+    print("{} frames, {} bytes".format(NUM_FRAMES, len(stream)))
+    for numChunks in (NUM_CHUNKS, 10, 1):
+        chunks = makeChunks(stream, numChunks)
+        for name, cls in [('legacy', LegacyDecoder),
+                          ('FrameDecoder', transport.FrameDecoder)]:
+            timer = timeit.Timer(lambda: consume(cls(), chunks))
+            best = min(timer.repeat(repeat=3, number=1))
+            print("{:>4} chunks {:>12}: {:8.2f} ms, {:10.0f} frames/s".format(
+                numChunks, name, 1e3*best, NUM_FRAMES/best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of finding a hand in a capture file with and without an index.
+
+A recorded game is repeated for many connections in one zlib compressed
+capture. The last hand of the last connection is looked up by decoding all
+records up to it and by seeking to it with the index.
+
+Run with ``python benchmarks/bench_index.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import os
+import time
+import shutil
+import tempfile
+
+from pokerthproto import logger
+from pokerthproto import transport
+from pokerthproto.capture import CaptureWriter, CaptureReader
+from pokerthproto.index import (IndexBuilder, CaptureIndex, buildIndex,
+                                indexPath, HAND_START)
+
+from tests.test_replay import recordGame
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_CONNECTIONS = 200
+
+
+def scan(path, connId):
+    """
+    Decodes all records up to the last hand of a connection
+    """
+    hands = []
+    for record in CaptureReader(path):
+        msg = transport.develop(transport.unpack(record.frame))
+        if record.connId == connId and \
+                transport.getMsgType(type(msg)) == HAND_START:
+            hands.append(record)
+    return hands[-1]
+
+
+def seek(path, connId):
+    with CaptureIndex(indexPath(path)) as index:
+        hand = [h for h in index.findHands(1) if h.connId == connId][-1]
+        return index.readHand(CaptureReader(path), hand)[0]
+
+
+def writeIndexed(path, records):
+    with CaptureWriter(path, compression='zlib',
+                       index=IndexBuilder(indexPath(path))) as writer:
+        for connId in range(1, NUM_CONNECTIONS + 1):
+            for r in records:
+                writer.write(r.direction, connId, r.frame, r.timestamp)
+
+
+
+def measure(f, *args):
+    start = time.time()
+    result = f(*args)
+    return time.time() - start, result
+
+
+def main():
+    logger.setLevel(logger.Level.WARNING)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'game.cap')
+        recordGame(path, numPlayers=10)
+        records = list(CaptureReader(path))
+        path = os.path.join(tmpdir, 'games.cap')
+        writeTime, _ = measure(writeIndexed, path, records)
+        print("{} records in {:.1f} MB, captured with index in {:.2f} s"
+              .format(NUM_CONNECTIONS*len(records),
+                      os.path.getsize(path)/1e6, writeTime))
+        buildTime, _ = measure(buildIndex, path)
+        print("index of {:.1f} kB built afterwards in {:.2f} s".format(
+            os.path.getsize(indexPath(path))/1e3, buildTime))
+        scanTime, scanned = measure(scan, path, NUM_CONNECTIONS)
+        seekTime, sought = measure(seek, path, NUM_CONNECTIONS)
+        assert scanned == sought
+        print("last hand found by scanning in {:.3f} s, by the index in "
+              "{:.3f} s".format(scanTime, seekTime))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
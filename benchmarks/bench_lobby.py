@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the lookups of players and games in a busy lobby.
+
+Fills a lobby with 10k players and 1k games and looks players and games up
+like the handlers of :obj:`~.ClientProtocol` do, once with the dict indexes
+of :obj:`~.Lobby` and once with the former scans over lists.
+
+Run with ``python benchmarks/bench_lobby.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import time
+import random
+
+from pokerthproto.lobby import Lobby, LobbyError, GameInfo
+from pokerthproto.player import Player
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_PLAYERS = 10000
+NUM_GAMES = 1000
+NUM_LOOKUPS = 2000
+
+
+class ListLobby(Lobby):
+    """
+    Former lobby scanning lists on every lookup
+    """
+    def __init__(self):
+        self._playerList = []
+        self._gameInfoList = []
+
+    @property
+    def gameInfos(self):
+        return self._gameInfoList
+
+    def addGameInfo(self, gameInfo):
+        if gameInfo not in self._gameInfoList:
+            self._gameInfoList.append(gameInfo)
+        else:
+            raise LobbyError("Game is already in our list of games")
+
+    @property
+    def players(self):
+        return self._playerList
+
+    def addPlayer(self, playerId):
+        player = Player(playerId)
+        if player not in self._playerList:
+            self._playerList.append(player)
+        else:
+            raise LobbyError("Player with id {} already listed".format(
+                playerId))
+
+    def delPlayer(self, playerId):
+        self._playerList.remove(Player(playerId))
+
+    def getPlayer(self, playerId):
+        players = [p for p in self._playerList if p.playerId == playerId]
+        if len(players) == 1:
+            return players[0]
+        else:
+            raise LobbyError("Player with id {} not listed".format(playerId))
+
+    def getGameInfoId(self, gameName):
+        ids = [g.gameId for g in self._gameInfoList if g.gameName == gameName]
+        if len(ids) == 1:
+            return ids[0]
+        else:
+            raise LobbyError("No game of name {} found".format(gameName))
+
+    def getGameInfo(self, gameId):
+        gameInfos = [g for g in self._gameInfoList if g.gameId == gameId]
+        if len(gameInfos) == 1:
+            return gameInfos[0]
+        else:
+            raise LobbyError("Game with id {} not listed".format(gameId))
+
+
+def fill(lobby):
+    for playerId in range(1, NUM_PLAYERS + 1):
+        lobby.addPlayer(playerId)
+    for gameId in range(1, NUM_GAMES + 1):
+        gameInfo = GameInfo('Game {}'.format(gameId))
+        gameInfo.gameId = gameId
+        lobby.addGameInfo(gameInfo)
+
+
+def lookup(lobby, rand):
+    for _ in range(NUM_LOOKUPS):
+        playerId = rand.randint(1, NUM_PLAYERS)
+        gameId = rand.randint(1, NUM_GAMES)
+        # like gameListPlayerJoinedReceived and gameListPlayerLeftReceived
+        lobby.addPlayerToGame(playerId, gameId)
+        lobby.delPlayerFromGame(playerId, gameId)
+        lobby.getGameInfoId('Game {}'.format(gameId))
+
+
+def measure(f, *args):
+    start = time.time()
+    f(*args)
+    return time.time() - start
+
+
+def main():
+    for name, cls in [('list scans', ListLobby), ('dict indexes', Lobby)]:
+        lobby = cls()
+        fillTime = measure(fill, lobby)
+        lookupTime = measure(lookup, lobby, random.Random(42))
+        print("{:>12}: fill {:7.3f} s, {:8.2f} us per join and leave".format(
+            name, fillTime, 1e6*lookupTime/NUM_LOOKUPS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the logging overhead when dispatching messages in
+:obj:`PokerTHProtocol.dataReceived`.
+
+Compares a protocol without any logging calls to the regular protocol with
+logging turned off, at the default level and with everything enabled.
+
+Run with ``python benchmarks/bench_logging.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import timeit
+
+from twisted.test import proto_helpers
+
+from pokerthproto import pokerth_pb2
+from pokerthproto import transport
+from pokerthproto import logger
+from pokerthproto.logger import Level
+from pokerthproto.protocol import PokerTHProtocol
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_FRAMES = 10000
+
+
+class NullProtocol(PokerTHProtocol):
+
+    def playersActionDoneReceived(self, msg):
+        pass
+
+
+class NoLogProtocol(NullProtocol):
+
+    def dataReceived(self, data):
+        handlers = self._handlers
+        for buffer in self._getBufferedData(data):
+            envelope = transport.unpack(buffer)
+            msg = transport.develop(envelope)
+            handlers[envelope.messageType](msg)
+
+
+def makeData(numFrames):
+    msg = pokerth_pb2.PlayersActionDoneMessage()
+    msg.gameId = 1
+    msg.playerId = 2
+    msg.gameState = pokerth_pb2.netStatePreflop
+    msg.playerAction = pokerth_pb2.netActionCall
+    msg.totalPlayerBet = 20
+    msg.playerMoney = 2980
+    msg.highestSet = 20
+    msg.minimumRaise = 20
+    return numFrames*transport.pack(transport.envelop(msg))
+
+
+def run(cls, data):
+    proto = cls()
+    proto.makeConnection(proto_helpers.StringTransport())
+    proto.dataReceived(data)
+
+
+def measure(name, cls, data):
+    best = min(timeit.Timer(lambda: run(cls, data)).repeat(repeat=5,
+                                                           number=1))
+    print("{:>24}: {:8.2f} ms, {:6.2f} us/msg".format(
+        name, 1e3*best, 1e6*best/NUM_FRAMES))
+    return best
+
+
+def main():
+    data = makeData(NUM_FRAMES)
+    print("{} frames".format(NUM_FRAMES))
+    try:
+        baseline = measure('no logging calls', NoLogProtocol, data)
+        logger.setLevel(Level.OFF)
+        off = measure('logging off', NullProtocol, data)
+        logger.setLevel(Level.INFO)
+        measure('default level (INFO)', NullProtocol, data)
+        logger.setLevel(Level.DEBUG)
+        measure('DEBUG, no observer', NullProtocol, data)
+    finally:
+        logger.setLevel(Level.INFO)
+    print("overhead with logging off: {:.2f} us/msg ({:+.1f}%)".format(
+        1e6*(off - baseline)/NUM_FRAMES, 100*(off/baseline - 1)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the overhead of the latency instrumentation in
+:obj:`PokerTHProtocol.dataReceived`.
+
+Run with ``python benchmarks/bench_metrics.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import timeit
+
+from twisted.test import proto_helpers
+
+from pokerthproto import pokerth_pb2
+from pokerthproto import transport
+from pokerthproto.metrics import MessageMetrics
+from pokerthproto.protocol import PokerTHProtocol
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_FRAMES = 10000
+
+
+class NullProtocol(PokerTHProtocol):
+
+    def playersActionDoneReceived(self, msg):
+        pass
+
+
+def makeData(numFrames):
+    msg = pokerth_pb2.PlayersActionDoneMessage()
+    msg.gameId = 1
+    msg.playerId = 2
+    msg.gameState = pokerth_pb2.netStatePreflop
+    msg.playerAction = pokerth_pb2.netActionCall
+    msg.totalPlayerBet = 20
+    msg.playerMoney = 2980
+    msg.highestSet = 20
+    msg.minimumRaise = 20
+    return numFrames*transport.pack(transport.envelop(msg))
+
+
+def run(metrics, data):
+    proto = NullProtocol()
+    proto.metrics = metrics
+    proto.makeConnection(proto_helpers.StringTransport())
+    proto.dataReceived(data)
+
+
+def measure(name, metrics, data):
+    best = min(timeit.Timer(lambda: run(metrics, data)).repeat(repeat=5,
+                                                               number=1))
+    print("{:>24}: {:8.2f} ms, {:6.2f} us/msg".format(
+        name, 1e3*best, 1e6*best/NUM_FRAMES))
+    return best
+
+
+def main():
+    data = makeData(NUM_FRAMES)
+    print("{} frames".format(NUM_FRAMES))
+    off = measure('metrics off', None, data)
+    on = measure('metrics on', MessageMetrics(), data)
+    print("overhead: {:.2f} us/msg ({:+.1f}%)".format(
+        1e6*(on - off)/NUM_FRAMES, 100*(on/off - 1)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of preflop equities looked up in precomputed tables.
+
+Builds tables with few trials, loads them and looks up the equity of random
+pocket cards against three opponents, once from the tables and once by
+:obj:`~.monteCarloEquity` with a precision of 1%.
+
+Run with ``python benchmarks/bench_preflop.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import os
+import time
+import random
+import shutil
+import tempfile
+
+from pokerthproto import poker
+from pokerthproto.equity import monteCarloEquity
+from pokerthproto.preflop import buildTables, PreflopTables
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_LOOKUPS = 100000
+NUM_ESTIMATES = 20
+
+
+def measure(f, *args, **kwargs):
+    start = time.time()
+    result = f(*args, **kwargs)
+    return time.time() - start, result
+
+
+def main():
+    random.seed(42)
+    poker._evaluatorTables()
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'preflop.tbl')
+        buildTime, _ = measure(buildTables, path, trials=2000,
+                               handTrials=20, seed=42)
+        print("tables of {:.1f} MB built in {:.0f} s".format(
+            os.path.getsize(path)/1e6, buildTime))
+        loadTime, tables = measure(PreflopTables, path)
+        print("tables loaded in {:.2f} ms".format(1e3*loadTime))
+        hands = [random.sample(range(52), 4) for _ in range(NUM_LOOKUPS)]
+        lookupTime, _ = measure(
+            lambda: [tables.equity(h[:2], 3) for h in hands])
+        print("equity:     {:>9,.0f} lookups/s".format(
+            NUM_LOOKUPS/lookupTime))
+        lookupTime, _ = measure(
+            lambda: [tables.handVsHand(h[:2], h[2:]) for h in hands])
+        print("handVsHand: {:>9,.0f} lookups/s".format(
+            NUM_LOOKUPS/lookupTime))
+        mcTime, _ = measure(
+            lambda: [monteCarloEquity(h[:2], numOpponents=3, precision=0.01)
+                     for h in hands[:NUM_ESTIMATES]])
+        print("Monte Carlo: {:.1f} ms per estimate".format(
+            1e3*mcTime/NUM_ESTIMATES))
+        tables.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
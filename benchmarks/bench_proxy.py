@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the round trip latency the proxy adds.
+
+A client sends a frame to an echo server and waits for the answer, directly
+and through the proxy with forwarding only, with frames decoded and logged
+off the path by a :obj:`~.FrameMonitor` and with the former inline decoding
+of every frame before forwarding it.
+
+Run with ``python benchmarks/bench_proxy.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import time
+
+from twisted.internet import reactor, defer
+from twisted.internet.protocol import Protocol, Factory, ClientFactory
+
+from pokerthproto import pokerth_pb2
+from pokerthproto import transport
+from pokerthproto import proxy
+from pokerthproto import capture
+from pokerthproto import logger
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_ROUND_TRIPS = 5000
+
+
+class EchoProtocol(Protocol):
+
+    def dataReceived(self, data):
+        self.transport.write(data)
+
+
+class PingProtocol(Protocol):
+
+    def connectionMade(self):
+        self.received = 0
+        self.latencies = []
+        self.frame = makeFrame()
+        self.done = self.factory.done
+        self.ping()
+
+    def ping(self):
+        self.sent = time.time()
+        self.transport.write(self.frame)
+
+    def dataReceived(self, data):
+        self.received += len(data)
+        if self.received < len(self.frame):
+            return
+        self.received = 0
+        self.latencies.append(time.time() - self.sent)
+        if len(self.latencies) < NUM_ROUND_TRIPS:
+            self.ping()
+        else:
+            self.transport.loseConnection()
+            self.done.callback(self.latencies)
+
+
+class PingFactory(ClientFactory):
+    protocol = PingProtocol
+
+    def __init__(self):
+        self.done = defer.Deferred()
+
+
+class InlineProxyProtocol(proxy.ProxyProtocol):
+    """
+    Former proxy decoding and logging every frame before forwarding it
+    """
+    def dataReceived(self, data):
+        for buffer in self._getBufferedData(data):
+            proxy.logFrame(capture.Direction.FROM_CLIENT, self.connId, buffer)
+        proxy.ProxyProtocol.dataReceived(self, data)
+
+
+class InlineClientProtocol(proxy.ClientProtocol):
+
+    def dataReceived(self, data):
+        for buffer in self._getBufferedData(data):
+            proxy.logFrame(capture.Direction.FROM_SERVER, self.factory.connId,
+                           buffer)
+        proxy.ClientProtocol.dataReceived(self, data)
+
+
+class InlineClientProtocolFactory(proxy.ClientProtocolFactory):
+    protocol = InlineClientProtocol
+
+
+def makeFrame():
+    msg = pokerth_pb2.PlayersActionDoneMessage()
+    msg.gameId = 1
+    msg.playerId = 2
+    msg.gameState = pokerth_pb2.netStatePreflop
+    msg.playerAction = pokerth_pb2.netActionCall
+    msg.totalPlayerBet = 20
+    msg.playerMoney = 2980
+    msg.highestSet = 20
+    msg.minimumRaise = 20
+    return transport.pack(transport.envelop(msg))
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    mean = sum(latencies)/len(latencies)
+    p99 = latencies[int(0.99*len(latencies))]
+    print("{:>28}: mean {:6.1f} us, p99 {:6.1f} us".format(
+        name, 1e6*mean, 1e6*p99))
+    return mean
+
+
+@defer.inlineCallbacks
+def measure(name, port):
+    factory = PingFactory()
+    reactor.connectTCP('127.0.0.1', port, factory)
+    latencies = yield factory.done
+    defer.returnValue(report(name, latencies))
+
+
+@defer.inlineCallbacks
+def main():
+    echoPort = reactor.listenTCP(0, Factory.forProtocol(EchoProtocol),
+                                 interface='127.0.0.1').getHost().port
+    direct = yield measure('direct', echoPort)
+    setups = [('proxy, forwarding only', proxy.ProxyProtocol, None),
+              ('proxy, decoding in process', proxy.ProxyProtocol,
+               proxy.FrameMonitor()),
+              ('proxy, decoding in thread', proxy.ProxyProtocol,
+               proxy.FrameMonitor(process=False)),
+              ('proxy, inline decoding', InlineProxyProtocol, None)]
+    for name, protocol, monitor in setups:
+        factory = proxy.ProxyProtocolFactory('127.0.0.1', echoPort,
+                                             monitor)
+        factory.protocol = protocol
+        if protocol is InlineProxyProtocol:
+            factory.clientFactory = InlineClientProtocolFactory
+        port = reactor.listenTCP(0, factory, interface='127.0.0.1')
+        mean = yield measure(name, port.getHost().port)
+        print("{:>28}  added {:6.1f} us".format('', 1e6*(mean - direct)))
+        yield port.stopListening()
+        if monitor is not None:
+            print("{:>28}  {} frames, {} dropped".format(
+                '', monitor.seen, monitor.dropped))
+    reactor.stop()
+
+
+if __name__ == '__main__':
+    logger.setLevel(logger.Level.INFO)
+    reactor.callWhenRunning(main)
+    reactor.run()
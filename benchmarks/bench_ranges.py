@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of narrowing ranges at a table of ten players.
+
+Nine opponents act on every street of a hand and a :obj:`~.RangeTracker`
+updates their ranges after each action. Prints the time per update with the
+strengths of the street cached and the time of range against range equities
+heads-up on the river and multiway on the flop.
+
+Run with ``python benchmarks/bench_ranges.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import time
+
+from pokerthproto import game
+from pokerthproto import player
+from pokerthproto import poker
+from pokerthproto.poker import Action, Round
+from pokerthproto.ranges import RangeTracker, StrengthModel, rangeEquity
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_PLAYERS = 10
+NUM_HANDS = 100
+STREETS = [(Round.PREFLOP, None), (Round.FLOP, ['2c', '7d', '9s']),
+           (Round.TURN, ['Kd']), (Round.RIVER, ['3h'])]
+ACTIONS = [Action.CHECK, Action.CALL, Action.BET, Action.RAISE]
+
+
+def playHand(pgame, tracker):
+    """
+    Lets every opponent act on every street and returns the number of
+    updates and the time spent in them.
+    """
+    pgame.startNewHand()
+    pgame.pocketCards = ['Ah', 'Ad']
+    pgame.addRound(Round.BIG_BLIND)
+    elapsed, numUpdates = 0., 0
+    for street, cards in STREETS:
+        pgame.addRound(street, cards)
+        for playerId in range(2, NUM_PLAYERS + 1):
+            kind = ACTIONS[playerId % len(ACTIONS)]
+            pgame.addAction(playerId, kind, 10*playerId)
+            action = pgame.currRoundInfo.actions[-1]
+            start = time.time()
+            tracker.observe(action, pgame)
+            elapsed += time.time() - start
+            numUpdates += 1
+    return numUpdates, elapsed
+
+
+def main():
+    pgame = game.Game(1, 1)
+    for playerId in range(1, NUM_PLAYERS + 1):
+        pgame.addPlayer(player.Player(playerId))
+        pgame.getPlayer(playerId).money = 10000
+        pgame.getPlayer(playerId).seat = playerId - 1
+    pgame.dealer = pgame.getPlayer(1)
+    tracker = RangeTracker(StrengthModel())
+    playHand(pgame, tracker)  # build the tables and fill the caches
+    numUpdates, elapsed = 0, 0.
+    for _ in range(NUM_HANDS):
+        n, t = playHand(pgame, tracker)
+        numUpdates += n
+        elapsed += t
+    print("{} players: {:.3f} ms per update, {:.2f} ms per round of "
+          "actions".format(NUM_PLAYERS, 1000*elapsed/numUpdates,
+                           1000*elapsed/numUpdates*(NUM_PLAYERS - 1)))
+    ranges = [tracker.getRange(pgame, i) for i in range(2, NUM_PLAYERS + 1)]
+    board = poker.CardSet(['2c', '7d', '9s', 'Kd', '3h'])
+    start = time.time()
+    result = rangeEquity(ranges[0], ranges[1:2], board)
+    print("river heads-up, range vs range: equity {:.3f} exact in {:.1f} "
+          "ms".format(result.equity, 1000*(time.time() - start)))
+    start = time.time()
+    result = rangeEquity(ranges[0], ranges[1:4], ['2c', '7d', '9s'],
+                         precision=0.005, seed=42)
+    print("flop, range vs 3 ranges: equity {:.3f} +- 0.005 after {} trials "
+          "in {:.1f} ms".format(result.equity, result.trials,
+                                1000*(time.time() - start)))
+
+
+if __name__ == '__main__':
+    main()
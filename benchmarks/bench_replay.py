@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of dispatching and state updates of a client by replaying a
+recorded game.
+
+A game of a client against the local stand-in server is recorded once and
+replayed as fast as possible with and without metrics.
+
+Run with ``python benchmarks/bench_replay.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import os
+import shutil
+import tempfile
+
+from pokerthproto import logger
+from pokerthproto.capture import CaptureReader
+from pokerthproto.metrics import MessageMetrics
+from pokerthproto.replay import Replay
+
+from tests.test_replay import recordGame
+from tests.test_server import PyClientProtocolFactory
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_REPLAYS = 20
+
+
+def replay(records, metrics=None):
+    factory = PyClientProtocolFactory('PyClient1', numPlayers=10)
+    proto = factory.buildProtocol(None)
+    proto.metrics = metrics
+    result = Replay(proto).run(records)
+    assert factory.winner is not None
+    return result
+
+
+def main():
+    logger.setLevel(logger.Level.WARNING)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'client.cap')
+        recordGame(path, numPlayers=10)
+        records = list(CaptureReader(path))
+    finally:
+        shutil.rmtree(tmpdir)
+    print("{} records of a game with 10 players".format(len(records)))
+    replay(records)  # warm up
+    for name, metrics in [('plain', None), ('metrics', MessageMetrics())]:
+        results = [replay(records, metrics) for _ in range(NUM_REPLAYS)]
+        received = sum(r.received for r in results)
+        elapsed = sum(r.elapsed for r in results)
+        print("{:>8}: {:.0f} msg/s, {:.1f} us/msg".format(
+            name, received/elapsed, 1e6*elapsed/received))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of complete games of a :obj:`ClientProtocol` against the local
+stand-in server of :obj:`pokerthproto.server`.
+
+Games are played in memory with a virtual clock and finally once over a
+loopback TCP connection with the real reactor.
+
+Run with ``python benchmarks/bench_server.py``.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import time
+
+from twisted.internet import reactor, task
+from twisted.test import iosim
+
+from pokerthproto import pokerth_pb2
+from pokerthproto.server import ServerProtocolFactory
+from pokerthproto.lobby import GameInfo
+from pokerthproto.poker import Action
+from pokerthproto.protocol import ClientProtocol, ClientProtocolFactory
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+NUM_GAMES = 20
+NUM_PLAYERS = 6
+
+
+class BenchClientProtocol(ClientProtocol):
+
+    def handleInsideLobby(self, lobbyInfo):
+        gameInfo = GameInfo('Bench Game')
+        gameInfo._maxNumPlayers = NUM_PLAYERS
+        self.sendJoinNewGame(gameInfo)
+
+    def joinGameAckReceived(self, msg):
+        ClientProtocol.joinGameAckReceived(self, msg)
+        self.factory.start = time.time()
+        self.sendStartEvent(msg.gameId,
+                            pokerth_pb2.StartEventMessage.startEvent,
+                            fillWithBots=True)
+
+    def handleMyTurn(self, gameInfo):
+        if gameInfo.highestSet > gameInfo.myBet:
+            action = Action.CALL
+        else:
+            action = Action.CHECK
+        self.sendMyAction(action, 0)
+
+    def handleEndOfHand(self, gameInfo):
+        self.factory.hands += 1
+        self.factory.end = time.time()
+
+    def handleEndOfGame(self, gameInfo, winner):
+        self.factory.done = True
+        if self.factory.onDone is not None:
+            self.factory.onDone()
+
+
+class BenchClientProtocolFactory(ClientProtocolFactory):
+    protocol = BenchClientProtocol
+
+    def __init__(self, nickName, onDone=None):
+        ClientProtocolFactory.__init__(self, nickName)
+        self.onDone = onDone
+        self.hands = 0
+        self.done = False
+        # the client waits a second before entering the lobby and after the
+        # end of the game, thus only the time of the hands is measured
+        self.start = None
+        self.end = None
+
+
+def playInMemory(seed):
+    clock = task.Clock()
+    server = ServerProtocolFactory(seed=seed)
+    server.clock = clock
+    factory = BenchClientProtocolFactory('Bench')
+    serverProto = server.buildProtocol(None)
+    clientProto = factory.buildProtocol(None)
+    clientProto.clock = clock
+    pump = iosim.connect(serverProto, iosim.makeFakeServer(serverProto),
+                         clientProto, iosim.makeFakeClient(clientProto))
+    while not factory.done:
+        pump.flush()
+        clock.advance(1)
+    return factory.hands, factory.end - factory.start
+
+
+def playLoopback(seed):
+    factory = BenchClientProtocolFactory('Bench', onDone=reactor.stop)
+    port = reactor.listenTCP(0, ServerProtocolFactory(seed=seed),
+                             interface='127.0.0.1')
+    reactor.connectTCP('127.0.0.1', port.getHost().port, factory)
+    reactor.run()
+    return factory.hands, factory.end - factory.start
+
+
+def main():
+    results = [playInMemory(seed) for seed in range(NUM_GAMES)]
+    hands = sum(r[0] for r in results)
+    elapsed = sum(r[1] for r in results)
+    print("in memory: {} games, {} hands in {:.2f} s, {:.0f} hands/s".format(
+        NUM_GAMES, hands, elapsed, hands/elapsed))
+    hands, elapsed = playLoopback(seed=0)
+    print("loopback TCP: 1 game, {} hands in {:.2f} s, {:.0f} hands/s".format(
+        hands, elapsed, hands/elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+#!/bin/bash
+twistd -y ./pokerth_local_server.tac -n --pidfile=pokerth_local_server.pid
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel analysis of capture files in a pool of processes.
+
+The frames received on every connection of a capture are dispatched to a
+passive :obj:`~.ClientProtocol` that reconstructs the :obj:`~.Game` state
+without sending anything. At the end of each hand a user supplied
+:obj:`~.HandReducer` folds the hand into a partial result. The work is split
+into tasks of whole capture files or, if a sidecar index exists, of the
+connections of a file, and the partial results of the tasks are merged, e.g.::
+
+    class CountHands(HandReducer):
+
+        def initial(self):
+            return 0
+
+        def reduce(self, result, hand):
+            return result + 1
+
+        def merge(self, result, other):
+            return result + other
+
+    numHands = analyze(['monday.cap', 'tuesday.cap'], CountHands())
+
+Reducers are pickled to the worker processes, thus their classes have to be
+defined in a module.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+import traceback
+import multiprocessing
+from collections import namedtuple
+
+from . import transport
+from . import logger
+from .capture import CaptureReader, Direction, _iterRecords
+from .index import CaptureIndex, indexPath
+from .lobby import Lobby
+from .protocol import ClientProtocol
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+INBOUND = (Direction.RECEIVED, Direction.FROM_SERVER)
+
+Hand = namedtuple('Hand', ['path', 'connId', 'handNum', 'game'])
+Task = namedtuple('Task', ['path', 'connIds', 'offsets'])
+
+
+class AnalysisError(Exception):
+    """
+    Raised if a task failed in a worker process
+    """
+    pass
+
+
+class HandReducer(object):
+    """
+    Folds hands into a result. Overwrite all methods.
+    """
+
+    def initial(self):
+        """
+        :return: result of no hands
+        """
+        raise NotImplementedError
+
+    def reduce(self, result, hand):
+        """
+        Adds a hand to a result.
+
+        :param result: result so far
+        :param hand: hand (:obj:`~.Hand`) with the :obj:`~.Game` state at the
+                     end of the hand, the game keeps changing afterwards
+        :return: new result
+        """
+        raise NotImplementedError
+
+    def merge(self, result, other):
+        """
+        Merges the results of two tasks.
+
+        :param result: result of a task
+        :param other: result of another task
+        :return: merged result
+        """
+        raise NotImplementedError
+
+
+class _Factory(object):
+    """
+    Replaces a :obj:`~.ClientProtocolFactory` without a reactor
+    """
+    def __init__(self):
+        self.nickName = ''
+        self.playerId = None
+        self.sessionId = None
+        self.game = None
+        self.lobby = Lobby()
+
+
+class _NullClock(object):
+    """
+    Clock that never runs delayed calls like entering the lobby
+    """
+    def callLater(self, delay, f, *args, **kwargs):
+        pass
+
+
+class AnalysisProtocol(ClientProtocol):
+    """
+    Client that only follows the received messages of a connection.
+
+    :param onHand: function called with the :obj:`~.Game` at the end of each
+                   hand
+    """
+    clock = _NullClock()
+
+    def __init__(self, onHand):
+        ClientProtocol.__init__(self)
+        self.factory = _Factory()
+        self.onHand = onHand
+        self._lastHand = None
+
+    def feed(self, frame):
+        """
+        Dispatches a received frame.
+
+        :param frame: frame without size prefix
+        """
+        envelope = transport.unpack(frame)
+        self._handlers[envelope.messageType](transport.develop(envelope))
+
+    def _sendMessage(self, msg, flush=False):
+        pass
+
+    def handleOthersTurn(self, playerInfo, gameInfo):
+        pass
+
+    def handleMyTurn(self, gameInfo):
+        pass
+
+    def handleEndOfHand(self, gameInfo):
+        # cards shown after the end of the hand end it once again
+        hand = (gameInfo.gameId, gameInfo.handNum)
+        if hand != self._lastHand:
+            self._lastHand = hand
+            self.onHand(gameInfo)
+
+    def handleEndOfGame(self, gameInfo, winner):
+        pass
+
+    def unhandledMessageReceived(self, msg):
+        pass
+
+
+def _iterTask(task):
+    """
+    Iterates over the inbound records of a task.
+    """
+    reader = CaptureReader(task.path)
+    if task.offsets is None:
+        records = iter(reader)
+    else:
+        records = (record for offset in task.offsets
+                   for record in _iterRecords(reader.readBlockData(offset)))
+    connIds = task.connIds
+    for record in records:
+        if record.direction in INBOUND and \
+                (connIds is None or record.connId in connIds):
+            yield record
+
+
+def runTask(reducer, task):
+    """
+    Folds all hands of a task.
+
+    A connection whose messages cannot be dispatched is skipped from then
+    on, the hands before are kept.
+
+    :param reducer: reducer (:obj:`~.HandReducer`)
+    :param task: task (:obj:`~.Task`)
+    :return: result of the reducer
+    """
+    result = reducer.initial()
+    protos = {}
+    broken = set()
+    finished = []  # hands ended by the last frame
+    for record in _iterTask(task):
+        connId = record.connId
+        if connId in broken:
+            continue
+        proto = protos.get(connId)
+        if proto is None:
+            # Game.handNum starts at 1 and is incremented at the start of each
+            # hand, thus it is one ahead of the numbers of the index counting
+            # the hands of a game from 1
+            proto = protos[connId] = AnalysisProtocol(
+                lambda game, connId=connId: finished.append(
+                    Hand(task.path, connId, game.handNum - 1, game)))
+        try:
+            proto.feed(record.frame)
+        except Exception as e:
+            logger.game.error("Analysis of connection {} in {} failed: {!r}",
+                              connId, task.path, e)
+            broken.add(connId)
+            del protos[connId]
+        for hand in finished:
+            result = reducer.reduce(result, hand)
+        del finished[:]
+    return result
+
+
+def _runTask(args):
+    """
+    Runs a task in a worker and returns exceptions as text since tracebacks
+    cannot be pickled.
+    """
+    try:
+        return True, runTask(*args)
+    except Exception:
+        return False, ''.join(traceback.format_exception(*sys.exc_info()))
+
+
+def planTasks(paths, numTasks):
+    """
+    Splits capture files into tasks.
+
+    Files without index are a task of their own. The connections of a file
+    with an index are distributed over ``numTasks`` tasks of about the same
+    number of blocks to read.
+
+    :param paths: paths of capture files
+    :param numTasks: number of tasks per indexed file
+    :return: list of tasks (:obj:`~.Task`)
+    """
+    tasks = []
+    for path in paths:
+        if not os.path.exists(indexPath(path)):
+            tasks.append(Task(path, None, None))
+            continue
+        with CaptureIndex(indexPath(path)) as index:
+            conns = sorted(index.conns,
+                           key=lambda c: c.firstBlock - c.lastBlock)
+            offsets = [index.block(i).offset for i in range(index.numBlocks)]
+        groups = [[0, set(), set()] for _ in range(min(numTasks, len(conns)))]
+        # largest connections first, each to the group with the least blocks
+        for conn in conns:
+            group = min(groups, key=lambda g: g[0])
+            group[0] += conn.lastBlock - conn.firstBlock + 1
+            group[1].add(conn.connId)
+            group[2].update(range(conn.firstBlock, conn.lastBlock + 1))
+        for _, connIds, blocks in groups:
+            tasks.append(Task(path, connIds,
+                              [offsets[i] for i in sorted(blocks)]))
+    return tasks
+
+
+def analyze(paths, reducer, numWorkers=None, tasksPerWorker=4):
+    """
+    Analyzes capture files in a pool of processes.
+
+    :param paths: paths of capture files
+    :param reducer: reducer (:obj:`~.HandReducer`)
+    :param numWorkers: number of processes, number of CPUs if omitted, no
+                       pool at all if 0
+    :param tasksPerWorker: number of tasks per worker an indexed file is
+                           split into to balance the load
+    :return: merged result of all tasks
+    """
+    if numWorkers is None:
+        numWorkers = multiprocessing.cpu_count()
+    tasks = planTasks(paths, max(numWorkers, 1)*tasksPerWorker)
+    args = [(reducer, task) for task in tasks]
+    if numWorkers == 0:
+        results = [(True, runTask(*arg)) for arg in args]
+    else:
+        pool = multiprocessing.Pool(numWorkers)
+        try:
+            results = list(pool.imap(_runTask, args))
+        finally:
+            pool.close()
+            pool.join()
+    merged = reducer.initial()
+    for ok, value in results:
+        if not ok:
+            raise AnalysisError(value)
+        merged = reducer.merge(merged, value)
+    return merged
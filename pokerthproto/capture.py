@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+Compact binary capture files of PokerTH frames.
+
+A capture file starts with a header followed by blocks of records::
+
+    header: magic 'PTHCAP', version (uint16), wall clock time and monotonic
+            time at the creation (2 x double)
+    block:  codec (uint8), raw length and stored length (2 x uint32) and
+            the records, compressed with the codec
+    record: monotonic timestamp (double), direction (uint8), connection id
+            (uint32), length (uint32) and the frame without its size prefix
+
+All numbers are in network byte order. Records are gathered in memory and
+written block by block, thus the blocks can be compressed with zlib or, if
+available, lzma. A :obj:`~.CaptureReader` streams the blocks of a file or
+reads them through :obj:`mmap` without loading the whole file.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+import time
+import zlib
+import mmap
+import struct
+import ctypes
+import ctypes.util
+from collections import namedtuple
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+MAGIC = b'PTHCAP'
+VERSION = 1
+HEADER = struct.Struct('!6sHdd')
+BLOCK = struct.Struct('!BII')
+RECORD = struct.Struct('!dBII')
+
+
+class CaptureError(Exception):
+    pass
+
+
+class Direction(object):
+    """
+    Enum of the directions of a captured frame
+    """
+    RECEIVED = 0  # received by the capturing protocol
+    SENT = 1  # sent by the capturing protocol
+    FROM_CLIENT = 2  # passing a proxy from the client to the server
+    FROM_SERVER = 3  # passing a proxy from the server to the client
+
+
+class Codec(object):
+    """
+    Enum of the compression codecs of a block
+    """
+    NONE = 0
+    ZLIB = 1
+    LZMA = 2
+
+    names = {None: NONE, 'zlib': ZLIB, 'lzma': LZMA}
+
+
+Record = namedtuple('Record', ['timestamp', 'direction', 'connId', 'frame'])
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _getMonotonic():
+    """
+    Returns a function of the monotonic clock of Linux or :obj:`time.time`
+    as fallback on other platforms.
+    """
+    if not sys.platform.startswith('linux'):
+        return time.time
+    try:
+        librt = ctypes.CDLL(ctypes.util.find_library('rt'), use_errno=True)
+        clock_gettime = librt.clock_gettime
+    except (OSError, AttributeError):
+        return time.time
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+    timespec = _Timespec()
+    ref = ctypes.byref(timespec)
+    CLOCK_MONOTONIC = 1
+
+    def monotonic():
+        clock_gettime(CLOCK_MONOTONIC, ref)
+        return timespec.tv_sec + timespec.tv_nsec*1e-9
+    return monotonic
+
+monotonic = _getMonotonic()
+
+
+def _compress(codec, data, level):
+    if codec == Codec.ZLIB:
+        return zlib.compress(data, level)
+    if codec == Codec.LZMA:
+        return lzma.compress(data, preset=level)
+    return data
+
+
+def _decompress(codec, data):
+    if codec == Codec.NONE:
+        return data
+    if codec == Codec.ZLIB:
+        return zlib.decompress(data)
+    if codec == Codec.LZMA:
+        if lzma is None:
+            raise CaptureError("Reading lzma blocks requires the lzma module")
+        return lzma.decompress(data)
+    raise CaptureError("Unknown codec {}".format(codec))
+
+
+class CaptureWriter(object):
+    """
+    Appends frames to a capture file.
+
+    :param path: path of the capture file, truncated if it exists
+    :param compression: :obj:`None`, ``'zlib'`` or ``'lzma'``
+    :param level: compression level
+    :param blockSize: size of the records in bytes gathered to a block
+    :param clock: function returning a monotonic timestamp in seconds
+    :param index: builder (:obj:`~.IndexBuilder`) of an index of the capture
+    """
+    def __init__(self, path, compression=None, level=1, blockSize=1 << 16,
+                 clock=monotonic, index=None):
+        if compression not in Codec.names:
+            raise CaptureError("Unknown compression {}".format(compression))
+        if compression == 'lzma' and lzma is None:
+            raise CaptureError("Compression with lzma requires the lzma "
+                               "module")
+        self.codec = Codec.names[compression]
+        self.level = level
+        self.blockSize = blockSize
+        self.clock = clock
+        self.index = index
+        self._block = bytearray()
+        self._file = open(path, 'wb', 1 << 20)
+        self._file.write(HEADER.pack(MAGIC, VERSION, time.time(), clock()))
+        self.numRecords = 0
+
+    def write(self, direction, connId, frame, timestamp=None):
+        """
+        Adds a frame to the capture.
+
+        :param direction: direction of :obj:`~.Direction`
+        :param connId: id of the connection
+        :param frame: frame without size prefix as string or
+                      :obj:`memoryview`
+        :param timestamp: monotonic timestamp, now if omitted
+        """
+        if timestamp is None:
+            timestamp = self.clock()
+        block = self._block
+        if self.index is not None:
+            self.index.add(len(block), timestamp, direction, connId, frame)
+        block += RECORD.pack(timestamp, direction, connId, len(frame))
+        block += frame
+        self.numRecords += 1
+        if len(block) >= self.blockSize:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all gathered records as a block.
+        """
+        if not self._block:
+            return
+        raw = bytes(self._block)
+        data = _compress(self.codec, raw, self.level)
+        if self.index is not None:
+            self.index.endBlock(self._file.tell())
+        self._file.write(BLOCK.pack(self.codec, len(raw), len(data)))
+        self._file.write(data)
+        self._file.flush()
+        self._block = bytearray()
+
+    def close(self):
+        """
+        Writes the last block and closes the file.
+        """
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+        if self.index is not None:
+            self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _iterRecords(data, start=0, end=None):
+    """
+    Parses the records of a decompressed block.
+
+    :param data: decompressed block
+    :param start: position of the first record in the block
+    :param end: position after the last record, end of the block if omitted
+    """
+    offset = start
+    end = len(data) if end is None else end
+    unpack_from, size = RECORD.unpack_from, RECORD.size
+    # bypasses the slow keyword handling of the namedtuple constructor
+    new = tuple.__new__
+    while offset < end:
+        timestamp, direction, connId, length = unpack_from(data, offset)
+        start = offset + size
+        offset = start + length
+        yield new(Record, (timestamp, direction, connId, data[start:offset]))
+
+
+class CaptureReader(object):
+    """
+    Reads the records of a capture file.
+
+    :param path: path of the capture file
+    :param useMmap: boolean to map the file into memory instead of reading
+                    it block by block
+    """
+    def __init__(self, path, useMmap=False):
+        self.path = path
+        self.useMmap = useMmap
+        with open(path, 'rb') as fh:
+            header = fh.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise CaptureError("{} is no capture file".format(path))
+        magic, version, self.wallStart, self.monoStart = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise CaptureError("{} is no capture file".format(path))
+        if version != VERSION:
+            raise CaptureError("Unsupported version {}".format(version))
+
+    def toWallTime(self, timestamp):
+        """
+        Converts a monotonic timestamp of a record to wall clock time.
+
+        :param timestamp: timestamp of a record
+        :return: seconds since the epoch
+        """
+        return self.wallStart + timestamp - self.monoStart
+
+    def blocks(self):
+        """
+        Iterates over the blocks of the file.
+
+        :return: generator of tuples of the offset and the decompressed data
+                 of each block
+        """
+        if self.useMmap:
+            return self._mmapBlocks()
+        return self._streamBlocks()
+
+    def _streamBlocks(self):
+        with open(self.path, 'rb', 1 << 20) as fh:
+            offset = HEADER.size
+            fh.seek(offset)
+            while True:
+                header = fh.read(BLOCK.size)
+                if not header:
+                    break
+                if len(header) < BLOCK.size:
+                    raise CaptureError("Truncated block at {}".format(offset))
+                codec, rawLength, length = BLOCK.unpack(header)
+                data = fh.read(length)
+                if len(data) < length:
+                    raise CaptureError("Truncated block at {}".format(offset))
+                yield offset, _decompress(codec, data)
+                offset += BLOCK.size + length
+
+    def _mmapBlocks(self):
+        size = os.path.getsize(self.path)
+        if size <= HEADER.size:
+            return
+        with open(self.path, 'rb') as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            offset = HEADER.size
+            while offset < size:
+                if offset + BLOCK.size > size:
+                    raise CaptureError("Truncated block at {}".format(offset))
+                codec, rawLength, length = BLOCK.unpack_from(mm, offset)
+                start = offset + BLOCK.size
+                if start + length > size:
+                    raise CaptureError("Truncated block at {}".format(offset))
+                yield offset, _decompress(codec, mm[start:start + length])
+                offset = start + length
+        finally:
+            mm.close()
+
+    def __iter__(self):
+        for _, data in self.blocks():
+            for record in _iterRecords(data):
+                yield record
+
+    def readBlockData(self, offset):
+        """
+        Reads and decompresses a single block.
+
+        :param offset: offset of the block in the file
+        :return: decompressed records of the block as string
+        """
+        with open(self.path, 'rb') as fh:
+            fh.seek(offset)
+            codec, rawLength, length = BLOCK.unpack(fh.read(BLOCK.size))
+            return _decompress(codec, fh.read(length))
+
+    def readBlock(self, offset):
+        """
+        Reads the records of a single block.
+
+        :param offset: offset of the block in the file
+        :return: list of records (:obj:`~.Record`)
+        """
+        return list(_iterRecords(self.readBlockData(offset)))
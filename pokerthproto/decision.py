@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Deadline-aware execution of poker strategies off the reactor thread.
+
+A strategy is a function taking a :obj:`~.Game` and returning a tuple of an
+:obj:`~.Action` and a bet relative to the highest set bet. It runs in a pool
+of threads or processes while the reactor keeps serving all other sessions.
+If the strategy does not decide before the action timeout of the game comes
+near, a safe action is taken instead, i.e. a check if possible, otherwise the
+configured fallback action, e.g.::
+
+    def strategy(game):
+        return Action.CALL, 0
+
+    class PyClientProtocol(DecisionClientProtocol):
+        pass
+
+    factory = PyClientProtocolFactory('PyClient1')
+    factory.strategy = strategy
+    factory.executor = DecisionExecutor(processes=True)
+
+For a pool of processes the strategy has to be a function of a module since
+it is pickled together with a copy of the game.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import sys
+import copy
+import traceback
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+from twisted.internet import reactor, defer
+from twisted.python import failure
+
+from . import logger
+from .poker import Action
+from .protocol import ClientProtocol
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+class DecisionError(Exception):
+    """
+    Raised in the reactor if a strategy raised an exception in the pool
+    """
+    pass
+
+
+def _callStrategy(strategy, game):
+    """
+    Calls a strategy in a worker and returns exceptions as text since
+    tracebacks cannot be pickled.
+    """
+    try:
+        return True, strategy(game)
+    except Exception:
+        return False, ''.join(traceback.format_exception(*sys.exc_info()))
+
+
+def safeAction(game, fallback=Action.FOLD):
+    """
+    Safe action if no decision was taken in time.
+
+    :param game: game (:obj:`~.Game`)
+    :param fallback: action of :obj:`~.Action` if a check is not possible
+    :return: tuple of action and relative bet
+    """
+    if game.highestSet <= game.myBet:
+        return Action.CHECK, 0
+    return fallback, 0
+
+
+class DecisionExecutor(object):
+    """
+    Runs strategies in a pool of threads or processes with a deadline.
+
+    :param numWorkers: number of workers, number of CPUs if omitted
+    :param processes: boolean to use processes instead of threads
+    :param margin: seconds before the action timeout to give up on the
+                   strategy and take the safe action
+    :param fallback: action of :obj:`~.Action` taken if a check is not
+                     possible when the deadline passes
+    :param reactor: reactor to deliver the results to
+    """
+    def __init__(self, numWorkers=None, processes=False, margin=2.,
+                 fallback=Action.FOLD, reactor=reactor):
+        if processes:
+            self._pool = multiprocessing.Pool(numWorkers)
+        else:
+            self._pool = ThreadPool(numWorkers)
+        self.processes = processes
+        self.margin = margin
+        self.fallback = fallback
+        self.reactor = reactor
+        self.pending = 0  # decisions waiting for their strategy
+        self.timeouts = 0  # decisions taken by the deadline
+
+    def decide(self, strategy, game, timeout):
+        """
+        Runs a strategy on a copy of the game.
+
+        :param strategy: function taking a :obj:`~.Game` and returning a
+                         tuple of an :obj:`~.Action` and a relative bet
+        :param game: game (:obj:`~.Game`)
+        :param timeout: seconds until the server acts for the player
+        :return: :obj:`~.Deferred` firing in the reactor with the tuple of the
+                 strategy or the safe action when the deadline passed
+        """
+        d = defer.Deferred()
+        safe = safeAction(game, self.fallback)
+        # the reactor keeps changing the game while the strategy runs and a
+        # process pool pickles its tasks later in a thread of its own
+        snapshot = copy.deepcopy(game)
+        deadline = self.reactor.callLater(max(timeout - self.margin, 0.),
+                                          self._expire, d, safe)
+
+        def deliver(result):
+            if not deadline.active():
+                return  # too late, the safe action was already taken
+            self.pending -= 1
+            deadline.cancel()
+            ok, value = result
+            if ok:
+                d.callback(value)
+            else:
+                d.errback(failure.Failure(DecisionError(value)))
+
+        def callback(result):
+            self.reactor.callFromThread(deliver, result)
+
+        self.pending += 1
+        try:
+            self._pool.apply_async(_callStrategy, (strategy, snapshot),
+                                   callback=callback)
+        except Exception:
+            self.pending -= 1
+            deadline.cancel()
+            d.errback()
+        return d
+
+    def _expire(self, d, safe):
+        # a strategy lost by the pool never delivers, so stop waiting here
+        self.pending -= 1
+        self.timeouts += 1
+        logger.game.warning("No decision before the deadline, taking {}",
+                            safe)
+        d.callback(safe)
+
+    def close(self):
+        """
+        Stops all workers after the running strategies finished.
+        """
+        self._pool.close()
+        self._pool.join()
+
+
+class DecisionClientProtocol(ClientProtocol):
+    """
+    Client taking its decisions with the ``strategy`` and ``executor`` of its
+    factory.
+    """
+
+    def handleMyTurn(self, gameInfo):
+        factory = self.factory
+        timeout = factory.lobby.getGameInfo(
+            gameInfo.gameId).playerActionTimeout
+        turn = (gameInfo.gameId, gameInfo.handNum, gameInfo.currRound)
+        d = factory.executor.decide(factory.strategy, gameInfo, timeout)
+        d.addCallbacks(self._sendDecision, self._decisionFailed,
+                       callbackArgs=(turn,), errbackArgs=(turn,))
+
+    def _sendDecision(self, decision, turn):
+        gameInfo = self.factory.game
+        if not self.connected or \
+                turn != (gameInfo.gameId, gameInfo.handNum,
+                         gameInfo.currRound):
+            return
+        action, bet = decision
+        self.sendMyAction(action, bet)
+
+    def _decisionFailed(self, reason, turn):
+        logger.game.error("Strategy failed:\n{}", reason.getErrorMessage())
+        gameInfo = self.factory.game
+        safe = safeAction(gameInfo, self.factory.executor.fallback)
+        self._sendDecision(safe, turn)
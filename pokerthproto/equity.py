@@ -0,0 +1,591 @@
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo equity of pocket cards against random opponents with NumPy.
+
+The cards left in the deck are sampled in batches of trials, each completing
+the board and dealing two cards to every opponent. All showdowns of a batch
+are ranked at once by :obj:`~.evaluateMany`. The equity is the share of the
+pots won, ties split evenly. Sampling stops early once the confidence interval
+of the equity is narrow enough, e.g.::
+
+    class PyClientProtocol(ClientProtocol):
+
+        def handleMyTurn(self, game):
+            result = gameEquity(game, precision=0.01)
+            if result.equity > 0.6:
+                self.sendMyAction(Action.RAISE, game.minimumRaise)
+
+This module requires NumPy.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import sys
+import math
+import traceback
+import multiprocessing
+from itertools import combinations
+from collections import namedtuple, OrderedDict
+
+import numpy as np
+from twisted.internet import reactor, defer
+from twisted.python import failure
+
+from .poker import CardSet, FULL_DECK, evaluateMany, canonicalIndex
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+Equity = namedtuple('Equity', ['equity', 'win', 'tie', 'stdError', 'trials'])
+
+# all pocket cards as pairs of integers of cardToInt, see comboIndex
+COMBOS = np.array(list(combinations(range(52), 2)), dtype=np.intp)
+
+
+class EquityError(Exception):
+    """
+    Raised if the cards of a spot cannot be dealt
+    """
+    pass
+
+
+def zScore(confidence):
+    """
+    Quantile of the standard normal distribution for a two-sided confidence
+    interval.
+
+    :param confidence: confidence level like 0.95
+    :return: z score like 1.96
+    """
+    assert 0 < confidence < 1
+    lo, hi = 0., 10.
+    for _ in range(60):
+        mid = (lo + hi)/2
+        if math.erf(mid/math.sqrt(2)) < confidence:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi)/2
+
+
+def comboIndex(card1, card2):
+    """
+    Index of two cards in :obj:`COMBOS`, e.g. of a range.
+
+    :param card1: card as integer of :obj:`~.cardToInt`
+    :param card2: another card as integer
+    :return: index between 0 and 1325
+    """
+    i, j = min(card1, card2), max(card1, card2)
+    assert 0 <= i < j <= 51
+    return i*(103 - i)//2 + j - i - 1
+
+
+def drawCards(rng, cards, numTrials, numCards, exclude=None):
+    """
+    Draws cards without replacement in random order for many trials.
+
+    :param rng: random state (:obj:`numpy.random.RandomState`)
+    :param cards: array of the cards left in the deck
+    :param numTrials: number of trials
+    :param numCards: number of cards to draw in each trial
+    :param exclude: array of shape (numTrials, any) of cards of ``cards``
+                    not to draw in each trial
+    :return: array of shape (numTrials, numCards)
+    """
+    keys = rng.random_sample((numTrials, len(cards)))
+    if exclude is not None:
+        positions = np.zeros(52, dtype=np.intp)
+        positions[cards] = np.arange(len(cards))
+        keys[np.arange(numTrials)[:, np.newaxis], positions[exclude]] = 2.
+    if numCards < len(cards):
+        # the smallest keys choose the cards, sorting them shuffles the cards
+        idx = np.argpartition(keys, numCards - 1, axis=1)[:, :numCards]
+        order = np.argsort(np.take_along_axis(keys, idx, axis=1), axis=1)
+        idx = np.take_along_axis(idx, order, axis=1)
+    else:
+        idx = np.argsort(keys, axis=1)
+    return cards[idx]
+
+
+def drawCombos(rng, cumWeights, numTrials):
+    """
+    Draws pocket cards of opponents by the weights of their ranges and drops
+    the trials where two opponents got the same card.
+
+    :param rng: random state (:obj:`numpy.random.RandomState`)
+    :param cumWeights: list of cumulative weights of :obj:`COMBOS`, one for
+                       each opponent
+    :param numTrials: number of trials
+    :return: array of shape (number of valid trials, 2*number of opponents)
+    """
+    hands = np.hstack([
+        COMBOS[np.searchsorted(cum, rng.random_sample(numTrials)*cum[-1],
+                               side='right')] for cum in cumWeights])
+    cards = np.sort(hands, axis=1)
+    valid = (cards[:, 1:] != cards[:, :-1]).all(axis=1)
+    return hands[valid]
+
+
+def showdownShares(hero, opponents):
+    """
+    Share of the pot of the hero in many showdowns.
+
+    :param hero: array of the ranks of the hero
+    :param opponents: array of shape (number of opponents, number of
+                      showdowns) of the ranks of the opponents
+    :return: array of shares between 0 and 1
+    """
+    best = opponents.max(axis=0)
+    numTied = (opponents == hero).sum(axis=0)
+    return np.where(hero > best, 1.,
+                    np.where(hero == best, 1./(1 + numTied), 0.))
+
+
+def monteCarloEquity(pocketCards, board=(), numOpponents=1, dead=(),
+                     ranges=None, trials=100000, precision=None,
+                     confidence=0.95, batchSize=10000, seed=None):
+    """
+    Estimates the equity of pocket cards against random opponents or
+    opponents holding cards of a range.
+
+    :param pocketCards: two cards as accepted by :obj:`~.CardSet`
+    :param board: zero to five board cards
+    :param numOpponents: number of opponents
+    :param dead: cards not in the deck anymore, e.g. shown by others
+    :param ranges: list with the weights of the :obj:`COMBOS` for each
+                   opponent or :obj:`None` for a random opponent, replaces
+                   ``numOpponents``
+    :param trials: maximum number of trials
+    :param precision: half width of the confidence interval to stop at, run
+                      all trials if omitted
+    :param confidence: confidence level of the interval
+    :param batchSize: number of trials ranked at once
+    :param seed: seed of the random numbers or a
+                 :obj:`numpy.random.RandomState`
+    :return: equity (:obj:`~.Equity`)
+    """
+    pocket, board = CardSet(pocketCards), CardSet(board)
+    if ranges is None:
+        ranges = [None]*numOpponents
+    if len(pocket) != 2 or len(board) > 5 or not ranges:
+        raise EquityError("Cannot deal {} and board {} to {} opponents"
+                          .format(pocket, board, len(ranges)))
+    known = pocket | board | dead
+    remaining = np.array((FULL_DECK - known).toInts())
+    numBoard = 5 - len(board)
+    numRandom = sum(1 for r in ranges if r is None)
+    numCards = numBoard + 2*numRandom
+    if numCards + 2*(len(ranges) - numRandom) > len(remaining):
+        raise EquityError("Not enough cards left for {} opponents".format(
+            len(ranges)))
+    # remove the combos of the ranges holding known cards
+    blocked = np.zeros(52, dtype=bool)
+    blocked[known.toInts()] = True
+    alive = ~blocked[COMBOS].any(axis=1)
+    cumWeights = []
+    for weights in ranges:
+        if weights is None:
+            continue
+        cum = np.cumsum(np.where(alive, weights, 0.))
+        if not cum[-1] > 0:
+            raise EquityError("Range without any combos left")
+        cumWeights.append(cum)
+    if isinstance(seed, np.random.RandomState):
+        rng = seed
+    else:
+        rng = np.random.RandomState(seed)
+    z = zScore(confidence)
+    pocket = np.array(pocket.toInts())
+    board = np.array(board.toInts(), dtype=np.intp)
+    total = totalSq = 0.
+    wins = ties = n = 0
+    stdError = float('inf')
+    while n < trials:
+        size = min(batchSize, trials - n)
+        if cumWeights:
+            # a full batch of combos since colliding ones are dropped
+            combos = drawCombos(rng, cumWeights, batchSize)
+            if not len(combos):
+                raise EquityError("Ranges of the opponents collide")
+            combos = combos[:size]
+            size = len(combos)
+            drawn = drawCards(rng, remaining, size, numCards, exclude=combos)
+            hands = np.hstack([drawn[:, numBoard:], combos])
+        else:
+            drawn = drawCards(rng, remaining, size, numCards)
+            hands = drawn[:, numBoard:]
+        boards = np.hstack([np.tile(board, (size, 1)), drawn[:, :numBoard]])
+        hero = evaluateMany(np.hstack([np.tile(pocket, (size, 1)), boards]))
+        opponents = np.array([
+            evaluateMany(np.hstack([hands[:, i:i + 2], boards]))
+            for i in range(0, hands.shape[1], 2)])
+        shares = showdownShares(hero, opponents)
+        best = opponents.max(axis=0)
+        wins += int((hero > best).sum())
+        ties += int((hero == best).sum())
+        total += shares.sum()
+        totalSq += (shares**2).sum()
+        n += size
+        variance = max(totalSq/n - (total/n)**2, 0.)
+        stdError = math.sqrt(variance/n)
+        if precision is not None and z*stdError <= precision:
+            break
+    return Equity(total/n, wins/n, ties/n, stdError, n)
+
+
+def mergeEquities(results):
+    """
+    Merges the equities of independent runs of the same spot.
+
+    :param results: iterable of equities (:obj:`~.Equity`)
+    :return: equity (:obj:`~.Equity`) of all trials
+    """
+    results = list(results)
+    n = sum(r.trials for r in results)
+    equity = sum(r.equity*r.trials for r in results)/n
+    win = sum(r.win*r.trials for r in results)/n
+    tie = sum(r.tie*r.trials for r in results)/n
+    # sum of the squared shares of each run from its mean and variance
+    totalSq = sum((r.stdError**2*r.trials + r.equity**2)*r.trials
+                  for r in results)
+    variance = max(totalSq/n - equity**2, 0.)
+    return Equity(equity, win, tie, math.sqrt(variance/n), n)
+
+
+class LRUCache(object):
+    """
+    Mapping keeping the most recently used items.
+
+    :param maxSize: maximum number of items
+    """
+    def __init__(self, maxSize=1024):
+        self.maxSize = maxSize
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Looks an item up and marks it as used.
+
+        :param key: key of the item
+        :param default: returned if the key is unknown
+        :return: value of the item
+        """
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._items[key] = value
+        return value
+
+    def put(self, key, value):
+        """
+        Adds an item and drops the least recently used one if full.
+
+        :param key: key of the item
+        :param value: value of the item
+        """
+        self._items.pop(key, None)
+        self._items[key] = value
+        if len(self._items) > self.maxSize:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+# ranks of all combos by the mask of a complete board
+boardCache = LRUCache(4096)
+# exact equities by pocket cards, board, dead cards and number of opponents
+equityCache = LRUCache(1024)
+_pairs = []
+
+
+def _disjointPairs():
+    """
+    Indices of all pairs of :obj:`COMBOS` without a common card
+    """
+    if not _pairs:
+        first, second = np.triu_indices(len(COMBOS), 1)
+        valid = (COMBOS[first][:, :, np.newaxis] !=
+                 COMBOS[second][:, np.newaxis, :]).all(axis=(1, 2))
+        _pairs.append((first[valid], second[valid]))
+    return _pairs[0]
+
+
+def comboRanks(board):
+    """
+    Ranks of all :obj:`COMBOS` together with a complete board, cached in
+    :obj:`boardCache`.
+
+    :param board: five cards (:obj:`~.CardSet`)
+    :return: array of ranks of :obj:`~.evaluate`, meaningless for combos
+             holding a board card
+    """
+    ranks = boardCache.get(board.mask)
+    if ranks is None:
+        cards = np.tile(np.array(board.toInts(), dtype=np.intp),
+                        (len(COMBOS), 1))
+        ranks = evaluateMany(np.hstack([COMBOS, cards]))
+        boardCache.put(board.mask, ranks)
+    return ranks
+
+
+def exactEquity(pocketCards, board, numOpponents=1, dead=(),
+                maxShowdowns=50000000):
+    """
+    Computes the equity of pocket cards against random opponents by
+    enumerating all runouts of the board and all holdings of the opponents.
+
+    Results are cached in :obj:`equityCache`, keyed by the
+    :obj:`~.canonicalIndex` of the pocket and board cards if no cards are
+    dead, thus all permutations of the suits share an entry. The ranks of all
+    pocket cards on a complete board are cached in :obj:`boardCache`, keyed
+    by the mask of the board.
+
+    :param pocketCards: two cards as accepted by :obj:`~.CardSet`
+    :param board: three to five board cards
+    :param numOpponents: number of opponents, one or two
+    :param dead: cards not in the deck anymore, e.g. shown by others
+    :param maxShowdowns: maximum number of showdowns to enumerate
+    :return: equity (:obj:`~.Equity`) with the number of showdowns as
+             trials
+    """
+    pocket, board, dead = CardSet(pocketCards), CardSet(board), CardSet(dead)
+    if len(pocket) != 2 or not 3 <= len(board) <= 5 or \
+            not pocket.isdisjoint(board) or numOpponents not in (1, 2):
+        raise EquityError("Cannot enumerate {} and board {} against {} "
+                          "opponents".format(pocket, board, numOpponents))
+    if dead:
+        key = (pocket.mask, board.mask, dead.mask, numOpponents)
+    else:
+        key = (len(board), canonicalIndex(pocket, board), numOpponents)
+    result = equityCache.get(key)
+    if result is not None:
+        return result
+    known = pocket | board | dead
+    remaining = (FULL_DECK - known).toInts()
+    numRunouts = int(round(np.prod([len(remaining) - i for i in
+                                    range(5 - len(board))]) /
+                           math.factorial(5 - len(board))))
+    numLeft = len(remaining) - (5 - len(board))
+    numHoldings = numLeft*(numLeft - 1)//2
+    if numOpponents == 2:
+        numHoldings = numHoldings*(numLeft - 2)*(numLeft - 3)//4
+    if numRunouts*numHoldings > maxShowdowns:
+        raise EquityError("Too many showdowns to enumerate")
+    blocked = np.zeros(52, dtype=bool)
+    blocked[known.toInts()] = True
+    alive = ~blocked[COMBOS].any(axis=1)
+    if numOpponents == 2:
+        first, second = _disjointPairs()
+        both = alive[first] & alive[second]
+        first, second = first[both], second[both]
+    hero = comboIndex(*pocket.toInts())
+    total = 0.
+    wins = ties = n = 0
+    for runout in combinations(remaining, 5 - len(board)):
+        ranks = comboRanks(board | runout)
+        mine = ranks[hero]
+        hit = np.zeros(52, dtype=bool)
+        hit[list(runout)] = True
+        live = alive & ~hit[COMBOS].any(axis=1)
+        if numOpponents == 1:
+            opponents = ranks[live][np.newaxis, :]
+        else:
+            valid = live[first] & live[second]
+            opponents = np.array([ranks[first[valid]],
+                                  ranks[second[valid]]])
+        shares = showdownShares(mine, opponents)
+        best = opponents.max(axis=0)
+        wins += int((mine > best).sum())
+        ties += int((mine == best).sum())
+        total += shares.sum()
+        n += len(shares)
+    result = Equity(total/n, wins/n, ties/n, 0., n)
+    equityCache.put(key, result)
+    return result
+
+
+def _runShard(kwargs):
+    """
+    Runs a shard in a worker and returns exceptions as text since tracebacks
+    cannot be pickled.
+    """
+    try:
+        return True, monteCarloEquity(**kwargs)
+    except Exception:
+        return False, ''.join(traceback.format_exception(*sys.exc_info()))
+
+
+class EquityService(object):
+    """
+    Shards the trials of :obj:`monteCarloEquity` over a pool of processes
+    and delivers the merged equity in the reactor.
+
+    Shard ``i`` of a computation with a seed draws its random numbers from
+    the seed ``[seed, i]``, thus the result does not depend on the worker a
+    shard runs in.
+
+    :param numWorkers: number of processes, number of CPUs if omitted
+    :param numShards: number of shards of a computation, number of workers
+                      if omitted
+    :param reactor: reactor to deliver the results to
+    """
+    def __init__(self, numWorkers=None, numShards=None, reactor=reactor):
+        if numWorkers is None:
+            numWorkers = multiprocessing.cpu_count()
+        self._pool = multiprocessing.Pool(numWorkers)
+        self.numShards = numWorkers if numShards is None else numShards
+        self.reactor = reactor
+        self.pending = 0  # shards still running
+
+    def shards(self, pocketCards, board=(), numOpponents=1, dead=(),
+               ranges=None, trials=100000, precision=None, seed=None,
+               **kwargs):
+        """
+        Splits a computation into the arguments of :obj:`monteCarloEquity`
+        for each shard.
+
+        :return: list of keyword arguments
+        """
+        numShards = min(self.numShards, trials)
+        shards = []
+        for i in range(numShards):
+            shard = dict(kwargs, pocketCards=CardSet(pocketCards).toInts(),
+                         board=CardSet(board).toInts(),
+                         numOpponents=numOpponents,
+                         dead=CardSet(dead).toInts(), ranges=ranges,
+                         trials=trials//numShards + (i < trials % numShards),
+                         seed=None if seed is None else [seed, i])
+            if precision is not None:
+                # the interval of the merged shards is narrower
+                shard['precision'] = precision*math.sqrt(numShards)
+            shards.append(shard)
+        return shards
+
+    def compute(self, *args, **kwargs):
+        """
+        Computes an equity in the pool.
+
+        Takes the arguments of :obj:`monteCarloEquity` except ``seed`` being
+        an integer.
+
+        :return: :obj:`~.Deferred` firing in the reactor with the merged
+                 equity (:obj:`~.Equity`)
+        """
+        d = defer.Deferred()
+        shards = self.shards(*args, **kwargs)
+        results = [None]*len(shards)
+        missing = [len(shards)]
+
+        def deliver(i, result):
+            self.pending -= 1
+            if d.called:
+                return  # another shard failed
+            ok, value = result
+            if not ok:
+                d.errback(failure.Failure(EquityError(value)))
+                return
+            results[i] = value
+            missing[0] -= 1
+            if not missing[0]:
+                d.callback(mergeEquities(results))
+
+        for i, shard in enumerate(shards):
+            self.pending += 1
+            try:
+                self._pool.apply_async(
+                    _runShard, (shard,),
+                    callback=lambda result, i=i: self.reactor.callFromThread(
+                        deliver, i, result))
+            except Exception:
+                # the shards submitted so far still deliver
+                self.pending -= 1
+                d.errback()
+                break
+        return d
+
+    def close(self):
+        """
+        Stops all workers after the running shards finished.
+        """
+        self._pool.close()
+        self._pool.join()
+
+
+def opponentsInHand(game):
+    """
+    Opponents still in the hand, i.e. neither folded nor out of money
+    without a bet in the hand.
+
+    :param game: game (:obj:`~.Game`)
+    :return: list of players (:obj:`~.Player`)
+    """
+    return [p for p in game.players
+            if p.playerId != game.myPlayerId and
+            p.playerId not in game.folded and
+            (p.money != 0 or game.handBets.get(p.playerId, 0) > 0)]
+
+
+def activeOpponents(game):
+    """
+    Number of :obj:`opponentsInHand`.
+
+    :param game: game (:obj:`~.Game`)
+    :return: number of opponents
+    """
+    return len(opponentsInHand(game))
+
+
+def gameEquity(game, numOpponents=None, exact=None, **kwargs):
+    """
+    Estimates my equity in the current hand of a game.
+
+    Opponents in the hand that showed their cards hold exactly these cards,
+    the cards shown by others are dead. Without any opponents left the pot is
+    mine.
+
+    :param game: game (:obj:`~.Game`)
+    :param numOpponents: number of opponents, :obj:`activeOpponents` if
+                         omitted
+    :param exact: boolean to enumerate with :obj:`exactEquity`, on the turn
+                  and river against up to two opponents without shown cards
+                  if omitted
+    :param kwargs: further arguments of :obj:`monteCarloEquity`
+    :return: equity (:obj:`~.Equity`)
+    """
+    opponents = opponentsInHand(game)
+    if numOpponents is None:
+        numOpponents = len(opponents)
+    if not numOpponents:
+        return Equity(1., 1., 0., 0., 0)
+    dead = game.othersCardSet
+    ranges = []
+    for opponent in opponents:
+        cards = game.othersCards.get(opponent.playerId)
+        if cards is None or len(ranges) == numOpponents:
+            continue
+        cards = CardSet(cards)
+        dead -= cards
+        weights = np.zeros(len(COMBOS))
+        weights[comboIndex(*cards.toInts())] = 1.
+        ranges.append(weights)
+    board = game.boardCardSet
+    if exact is None:
+        exact = len(board) >= 4 and numOpponents in (1, 2) and not ranges
+    if exact:
+        if ranges:
+            raise EquityError("Cannot enumerate against shown cards")
+        return exactEquity(game.pocketCardSet, board, numOpponents,
+                           dead=dead)
+    ranges += [None]*(numOpponents - len(ranges))
+    return monteCarloEquity(game.pocketCardSet, board, dead=dead,
+                            ranges=ranges, **kwargs)
@@ -5,11 +5,15 @@ All functionality related to a poker game and its representation.
 
 from __future__ import print_function, absolute_import, division
 
-from .poker import poker_rounds, Round, Action, deck
+from collections import namedtuple
+
+from .poker import poker_rounds, Round, Action, CardSet
 
 __author__ = 'Florian Wilhelm'
 __copyright__ = 'Florian Wilhelm'
 
+SidePot = namedtuple('SidePot', ['amount', 'playerIds'])
+
 
 class ActionInfo(object):
     """
@@ -45,12 +49,17 @@ class RoundInfo(object):
     Information about the poker round.
 
     :param gameState: name of the poker round (:obj:`~.Round`)
-    :param cards: board card of the round as defined in :obj:`~.deck`
+    :param cards: board card of the round as defined in :obj:`~.deck` or as
+                  :obj:`~.CardSet`, whose cards are kept in sorted order
+                  instead of the order of the deal
     """
 
     def __init__(self, gameState, cards=None):
         assert gameState in poker_rounds
         self._gameState = gameState
+        self._cardSet = cards if isinstance(cards, CardSet) else None
+        if isinstance(cards, CardSet):
+            cards = cards.toStrings()
         self._cards = cards if cards else []
         self._actions = []
 
@@ -74,9 +83,17 @@ class RoundInfo(object):
     def cards(self):
         return self._cards
 
+    @property
+    def cardSet(self):
+        if self._cardSet is None:
+            self._cardSet = CardSet(self._cards)
+        return self._cardSet
+
     def __eq__(self, other):
         if isinstance(other, RoundInfo):
-            return self.__dict__ == other.__dict__
+            # without the card set cached on first access
+            return (self._gameState, self._cards, self._actions) == \
+                (other._gameState, other._cards, other._actions)
         return NotImplemented
 
     def __unicode__(self):
@@ -106,16 +123,26 @@ class Game(object):
         self._gameId = gameId
         self._myPlayerId = myPlayerId
         self._players = []
+        self._playersById = {}
         self._dealer = None
         self._rounds = []
         self._pocketCards = None
-        self._boardCards = []
+        self._pocketCardSet = CardSet()
         self._smallBlind = None
         self._highestSet = 0
         self._minimumRaise = 0
         self._handNum = 1
         self._wins = {}
         self._othersCards = {}
+        self._roundBets = {}
+        self._handBets = {}
+        self._pot = 0
+        self._folded = set()
+        self._allIn = set()
+
+    @property
+    def myPlayerId(self):
+        return self._myPlayerId
 
     @property
     def wins(self):
@@ -131,6 +158,18 @@ class Game(object):
     def addOthersCards(self, playerId, cards):
         self._othersCards[playerId] = cards
 
+    @property
+    def othersCardSet(self):
+        """
+        Cards of other players shown in the current hand
+
+        :return: set of cards (:obj:`~.CardSet`)
+        """
+        result = CardSet()
+        for cards in self._othersCards.values():
+            result |= cards
+        return result
+
     @property
     def seats(self):
         seats = sorted([(p.seat, p) for p in self.players])
@@ -174,10 +213,28 @@ class Game(object):
 
     @pocketCards.setter
     def pocketCards(self, cards):
+        cardSet = CardSet(cards)
+        if isinstance(cards, CardSet):
+            cards = cards.toStrings()
         assert len(cards) == 2
-        for card in cards:
-            assert card in deck
         self._pocketCards = cards
+        self._pocketCardSet = cardSet
+
+    @property
+    def pocketCardSet(self):
+        return self._pocketCardSet
+
+    @property
+    def boardCardSet(self):
+        """
+        Board cards of all poker rounds of the current hand
+
+        :return: set of cards (:obj:`~.CardSet`)
+        """
+        result = CardSet()
+        for poker_round in self._rounds:
+            result |= poker_round.cardSet
+        return result
 
     @property
     def dealer(self):
@@ -192,14 +249,16 @@ class Game(object):
         return self._players
 
     def addPlayer(self, player):
-        if player not in self._players:
+        if player.playerId not in self._playersById:
             self._players.append(player)
+            self._playersById[player.playerId] = player
         else:
             raise GameError("Player with id {} already listed".format(
                 player.playerId))
 
     def delPlayer(self, player):
         self._players.remove(player)
+        del self._playersById[player.playerId]
 
     def getPlayer(self, id):
         """
@@ -208,10 +267,9 @@ class Game(object):
         :param id: id of the player
         :return: player
         """
-        player = [p for p in self._players if p.playerId == id]
-        if len(player) == 1:
-            return player[0]
-        else:
+        try:
+            return self._playersById[id]
+        except KeyError:
             raise GameError("Player with id {} not found.".format(id))
 
     @property
@@ -249,6 +307,9 @@ class Game(object):
         elif position == len(self._rounds):
             poker_round = RoundInfo(gameState=name, cards=cards)
             self._rounds.append(poker_round)
+            # blinds and preflop are a single betting round
+            if position > poker_rounds.index(Round.PREFLOP):
+                self._roundBets = {}
         elif position > len(self._rounds):
             raise GameError("Trying to add a poker round at wrong position.")
 
@@ -276,11 +337,7 @@ class Game(object):
         :param id: id of the player
         :return: test if player exists
         """
-        try:
-            self.getPlayer(id)
-        except GameError:
-            return False
-        return True
+        return id in self._playersById
 
     def addAction(self, playerId, kind, money=None):
         """
@@ -290,12 +347,26 @@ class Game(object):
         :param kind: type of the action of :obj:`~.Action`
         :param money: stake of the action if available
         """
-        if not self.existPlayer(playerId) and not kind == Action.FOLD:
-            raise GameError("Adding an action of player wiht id {} that "
-                            "is not in game.".format(playerId))
-        player = self.getPlayer(playerId)
+        player = self._playersById.get(playerId)
+        if player is None:
+            if not kind == Action.FOLD:
+                raise GameError("Adding an action of player wiht id {} that "
+                                "is not in game.".format(playerId))
+            player = self.getPlayer(playerId)
         action = ActionInfo(player=player, kind=kind, money=money)
         self.currRoundInfo.actions.append(action)
+        if kind == Action.FOLD:
+            self._folded.add(playerId)
+        elif kind == Action.ALLIN:
+            self._allIn.add(playerId)
+        if money is None:
+            return
+        # money is the total bet of the player in the betting round
+        delta = money - self._roundBets.get(playerId, 0)
+        if delta > 0:
+            self._roundBets[playerId] = money
+            self._handBets[playerId] = self._handBets.get(playerId, 0) + delta
+            self._pot += delta
 
     def getActions(self, playerId=None, rounds=None):
         """
@@ -320,18 +391,97 @@ class Game(object):
 
     @property
     def myBet(self):
-        if self.currRound == Round.PREFLOP:
-            rounds = poker_rounds[:3]
-        elif self.currRound == Round.SMALL_BLIND \
+        if self.currRound == Round.SMALL_BLIND \
                 or self.currRound == Round.BIG_BLIND:
             raise GameError("myBet cannot be called while posting blinds.")
-        else:
-            rounds = [self.currRound]
-        myActions = self.getActions(self._myPlayerId, rounds=rounds)
-        if myActions:
-            return myActions[-1].money
-        else:
-            return 0
+        return self._roundBets.get(self._myPlayerId, 0)
+
+    @property
+    def roundBets(self):
+        """
+        Money set by each player in the current betting round where posting
+        the blinds belongs to the preflop
+
+        :return: dictionary of money by player id
+        """
+        return self._roundBets
+
+    @property
+    def handBets(self):
+        """
+        Money set by each player in the current hand
+
+        :return: dictionary of money by player id
+        """
+        return self._handBets
+
+    @property
+    def pot(self):
+        return self._pot
+
+    @property
+    def folded(self):
+        return self._folded
+
+    @property
+    def toCall(self):
+        """
+        Money I need to set in order to call, limited by my money if known
+
+        :return: money to call
+        """
+        toCall = max(self._highestSet -
+                     self._roundBets.get(self._myPlayerId, 0), 0)
+        me = self._playersById.get(self._myPlayerId)
+        if me is not None and me.money is not None:
+            toCall = min(toCall, me.money)
+        return toCall
+
+    def isAllIn(self, playerId):
+        """
+        Checks if a player has set all the money in the current hand
+
+        :param playerId: id of the player
+        :return: test if player is all in
+        """
+        if playerId in self._allIn:
+            return True
+        player = self._playersById.get(playerId)
+        return player is not None and player.money == 0 and \
+            self._handBets.get(playerId, 0) > 0
+
+    @property
+    def sidePots(self):
+        """
+        Main pot and side pots resulting from the players being all in.
+
+        Each all in level of the players still in the hand closes a pot that
+        only the players who set at least as much can win. Players who are
+        not all in are eligible for every pot.
+
+        :return: list of pots (:obj:`~.SidePot`) starting with the main pot
+        """
+        bets = self._handBets
+        if not bets:
+            return []
+        contenders = [p.playerId for p in self._players
+                      if p.playerId not in self._folded]
+        allIn = set(id for id in contenders if self.isAllIn(id))
+        levels = sorted(set(bets.get(id, 0) for id in allIn))
+        top = max(bets.values())
+        if not levels or levels[-1] < top:
+            levels.append(top)
+        pots = []
+        last = 0
+        for level in levels:
+            amount = sum(min(bet, level) - min(bet, last)
+                         for bet in bets.values())
+            if amount > 0:
+                playerIds = [id for id in contenders if id not in allIn or
+                             bets.get(id, 0) >= level]
+                pots.append(SidePot(amount, playerIds))
+            last = level
+        return pots
 
     def startNewHand(self):
         self._rounds = [RoundInfo(gameState=Round.SMALL_BLIND)]
@@ -341,3 +491,8 @@ class Game(object):
         self._handNum += 1
         self._wins = {}
         self._othersCards = {}
+        self._roundBets = {}
+        self._handBets = {}
+        self._pot = 0
+        self._folded = set()
+        self._allIn = set()
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+Sidecar index of capture files for random access to hands.
+
+The index is built while capturing by passing an :obj:`~.IndexBuilder` to the
+:obj:`~.CaptureWriter` or afterwards in one streaming pass with
+:obj:`~.buildIndex`. It consists of fixed size entries that are read through
+:obj:`mmap`::
+
+    header: magic 'PTHIDX', version (uint16), number of blocks, hands and
+            connections (3 x uint32)
+    block:  offset in the capture file (uint64), timestamps of the first and
+            last record (2 x double) and a bit mask of the message types in
+            the block (2 x uint64)
+    hand:   game id, hand number, connection id, block and position of the
+            HandStartMessage, block and position after the EndOfHand*Message
+            (7 x uint32) and timestamps of the first and last message
+            (2 x double)
+    conn:   connection id, first and last block with records of the
+            connection (3 x uint32)
+
+Hands are sorted by game id, hand number and connection id, connections by
+their id. The hand number
+counts the hands of a game of a connection starting at 1. Positions refer to
+the decompressed block. A hand is read without decoding anything else, e.g.::
+
+    index = CaptureIndex(indexPath('proxy.cap'))
+    reader = CaptureReader('proxy.cap')
+    for hand in index.findHands(17, 4312):
+        for record in index.readHand(reader, hand):
+            msg = transport.develop(transport.unpack(record.frame))
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import mmap
+import bisect
+import struct
+from collections import namedtuple
+
+from . import transport
+from . import pokerth_pb2
+from .capture import (CaptureReader, CaptureError, Direction, RECORD,
+                      _iterRecords)
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+MAGIC = b'PTHIDX'
+VERSION = 2
+HEADER = struct.Struct('!6sHIII')
+BLOCK = struct.Struct('!QddQQ')
+HAND = struct.Struct('!IIIIIIIdd')
+CONN = struct.Struct('!III')
+
+BlockEntry = namedtuple('BlockEntry', ['offset', 'firstTimestamp',
+                                       'lastTimestamp', 'typeMask'])
+HandEntry = namedtuple('HandEntry', [
+    'gameId', 'handNum', 'connId', 'startBlock', 'startPos', 'endBlock',
+    'endPos', 'startTimestamp', 'endTimestamp'])
+ConnEntry = namedtuple('ConnEntry', ['connId', 'firstBlock', 'lastBlock'])
+
+_Type = pokerth_pb2.PokerTHMessage
+HAND_START = _Type.Type_HandStartMessage
+HAND_ENDS = (_Type.Type_EndOfHandShowCardsMessage,
+             _Type.Type_EndOfHandHideCardsMessage)
+INBOUND = (Direction.RECEIVED, Direction.FROM_SERVER)
+
+
+def indexPath(path):
+    """
+    Path of the sidecar index of a capture file.
+
+    :param path: path of the capture file
+    :return: path of the index
+    """
+    return path + '.idx'
+
+
+def readMsgType(frame):
+    """
+    Reads the message type of a frame without decoding the envelope.
+
+    :param frame: frame without size prefix as string or :obj:`memoryview`
+    :return: message type as integer
+    """
+    # the type is the first field of the envelope, encoded as varint
+    if frame[0] != b'\x08':
+        return transport.unpack(frame).messageType
+    result, shift, i = 0, 0, 1
+    while True:
+        byte = ord(frame[i])
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result
+        shift += 7
+        i += 1
+
+
+class IndexBuilder(object):
+    """
+    Builds an index from the records of a capture in the order of the file.
+
+    :param path: path to write the index to when closed, e.g. given by
+                 :obj:`~.indexPath`
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.blocks = []
+        self.hands = []
+        self.conns = {}  # first and last block by connection
+        self._open = {}  # unfinished hands by connection and game id
+        self._handNums = {}  # number of hands by connection and game id
+        self._last = {}  # position after the last record by connection
+        self._first = None
+        self._lastTimestamp = None
+        self._mask = 0
+
+    def add(self, pos, timestamp, direction, connId, frame):
+        """
+        Adds a record of the current block.
+
+        :param pos: position of the record in the decompressed block
+        :param timestamp: timestamp of the record
+        :param direction: direction of :obj:`~.Direction`
+        :param connId: id of the connection
+        :param frame: frame without size prefix
+        """
+        block = len(self.blocks)
+        if self._first is None:
+            self._first = timestamp
+        self._lastTimestamp = timestamp
+        kind = readMsgType(frame)
+        self._mask |= 1 << kind
+        end = pos + RECORD.size + len(frame)
+        previous = self._last.get(connId)
+        self._last[connId] = (block, end, timestamp)
+        if previous is None:
+            self.conns[connId] = [block, block]
+        else:
+            self.conns[connId][1] = block
+        if direction not in INBOUND or \
+                (kind != HAND_START and kind not in HAND_ENDS):
+            return
+        gameId = transport.develop(transport.unpack(frame)).gameId
+        key = (connId, gameId)
+        if kind == HAND_START:
+            if key in self._open:  # the previous hand did not end
+                self._finish(key, *previous)
+            handNum = self._handNums.get(key, 0) + 1
+            self._handNums[key] = handNum
+            self._open[key] = [gameId, handNum, connId, block, pos,
+                               block, end, timestamp, timestamp]
+        else:
+            self._finish(key, block, end, timestamp)
+
+    def _finish(self, key, block, end, timestamp):
+        hand = self._open.pop(key, None)
+        if hand is not None:
+            hand[5:7] = [block, end]
+            hand[8] = timestamp
+            self.hands.append(HandEntry(*hand))
+
+    def endBlock(self, offset):
+        """
+        Finishes the current block.
+
+        :param offset: offset of the block in the capture file
+        """
+        self.blocks.append(BlockEntry(offset, self._first,
+                                      self._lastTimestamp, self._mask))
+        self._first = self._lastTimestamp = None
+        self._mask = 0
+
+    def addBlock(self, offset, data):
+        """
+        Adds all records of a block read from a capture file.
+
+        :param offset: offset of the block in the capture file
+        :param data: decompressed block
+        """
+        unpack_from, size = RECORD.unpack_from, RECORD.size
+        pos, end = 0, len(data)
+        while pos < end:
+            timestamp, direction, connId, length = unpack_from(data, pos)
+            start = pos + size
+            self.add(pos, timestamp, direction, connId,
+                     data[start:start + length])
+            pos = start + length
+        self.endBlock(offset)
+
+    def close(self):
+        """
+        Adds unfinished hands ending with the last record of their connection
+        and writes the index if a path was given.
+        """
+        for key in list(self._open):
+            self._finish(key, *self._last[key[0]])
+        self.hands.sort(key=lambda h: (h.gameId, h.handNum, h.connId))
+        if self.path is not None:
+            self.write(self.path)
+
+    def write(self, path):
+        """
+        Writes the index.
+
+        :param path: path of the index file
+        """
+        with open(path, 'wb', 1 << 20) as fh:
+            fh.write(HEADER.pack(MAGIC, VERSION, len(self.blocks),
+                                 len(self.hands), len(self.conns)))
+            for block in self.blocks:
+                mask = block.typeMask
+                fh.write(BLOCK.pack(block.offset, block.firstTimestamp,
+                                    block.lastTimestamp,
+                                    mask & (2**64 - 1), mask >> 64))
+            for hand in self.hands:
+                fh.write(HAND.pack(*hand))
+            for connId, (first, last) in sorted(self.conns.items()):
+                fh.write(CONN.pack(connId, first, last))
+
+
+def buildIndex(path, output=None):
+    """
+    Builds the index of a capture file in one streaming pass.
+
+    :param path: path of the capture file
+    :param output: path of the index, :obj:`~.indexPath` of the capture file
+                   if omitted
+    :return: path of the index
+    """
+    output = indexPath(path) if output is None else output
+    builder = IndexBuilder(output)
+    for offset, data in CaptureReader(path).blocks():
+        builder.addBlock(offset, data)
+    builder.close()
+    return output
+
+
+class _Column(object):
+    """
+    Sequence of a key of the entries in the index for :obj:`bisect`
+    """
+    def __init__(self, index, key):
+        self._index = index
+        self._key = key
+
+    def __len__(self):
+        return self._index.numHands
+
+    def __getitem__(self, i):
+        return self._key(self._index.hand(i))
+
+
+class CaptureIndex(object):
+    """
+    Index of a capture file mapped into memory.
+
+    :param path: path of the index file
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            raise CaptureError("{} is no index file".format(path))
+        magic, version, self.numBlocks, self.numHands, self.numConns = \
+            HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise CaptureError("{} is no index file".format(path))
+        if version != VERSION:
+            raise CaptureError("Unsupported version {}".format(version))
+        self._hands = HEADER.size + self.numBlocks*BLOCK.size
+        self._conns = self._hands + self.numHands*HAND.size
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def block(self, i):
+        """
+        :param i: number of the block
+        :return: entry of the block (:obj:`~.BlockEntry`)
+        """
+        offset, first, last, low, high = BLOCK.unpack_from(
+            self._mmap, HEADER.size + i*BLOCK.size)
+        return BlockEntry(offset, first, last, low | high << 64)
+
+    def hand(self, i):
+        """
+        :param i: number of the hand in the order of the index
+        :return: entry of the hand (:obj:`~.HandEntry`)
+        """
+        return HandEntry(*HAND.unpack_from(self._mmap,
+                                           self._hands + i*HAND.size))
+
+    @property
+    def hands(self):
+        return (self.hand(i) for i in range(self.numHands))
+
+    def conn(self, i):
+        """
+        :param i: number of the connection in the order of the index
+        :return: entry of the connection (:obj:`~.ConnEntry`)
+        """
+        return ConnEntry(*CONN.unpack_from(self._mmap,
+                                           self._conns + i*CONN.size))
+
+    @property
+    def conns(self):
+        return (self.conn(i) for i in range(self.numConns))
+
+    def findHands(self, gameId, handNum=None):
+        """
+        Finds the hands of a game by binary search.
+
+        :param gameId: id of the game
+        :param handNum: number of the hand, all hands of the game if omitted
+        :return: list of hand entries (:obj:`~.HandEntry`), one for each
+                 connection that took part in the hand
+        """
+        if handNum is None:
+            keys = _Column(self, lambda h: h.gameId)
+            key = gameId
+        else:
+            keys = _Column(self, lambda h: (h.gameId, h.handNum))
+            key = (gameId, handNum)
+        lo = bisect.bisect_left(keys, key)
+        hi = bisect.bisect_right(keys, key, lo)
+        return [self.hand(i) for i in range(lo, hi)]
+
+    def findBlocks(self, msgType=None, start=None, end=None):
+        """
+        Finds the blocks containing a message type or records within a time
+        range.
+
+        :param msgType: message type, e.g. by :obj:`~.getMsgType`
+        :param start: minimum timestamp
+        :param end: maximum timestamp
+        :return: list of block numbers
+        """
+        result = []
+        for i in range(self.numBlocks):
+            block = self.block(i)
+            if msgType is not None and not block.typeMask >> msgType & 1:
+                continue
+            if start is not None and block.lastTimestamp < start:
+                continue
+            if end is not None and block.firstTimestamp > end:
+                continue
+            result.append(i)
+        return result
+
+    def readHand(self, reader, hand):
+        """
+        Reads the records of a hand from the HandStartMessage to the
+        EndOfHand*Message, decompressing only the blocks of the hand.
+
+        :param reader: reader (:obj:`~.CaptureReader`) of the capture file
+        :param hand: entry of the hand (:obj:`~.HandEntry`)
+        :return: list of records (:obj:`~.Record`) of the connection
+        """
+        records = []
+        for i in range(hand.startBlock, hand.endBlock + 1):
+            data = reader.readBlockData(self.block(i).offset)
+            start = hand.startPos if i == hand.startBlock else 0
+            end = hand.endPos if i == hand.endBlock else None
+            records.extend(r for r in _iterRecords(data, start, end)
+                           if r.connId == hand.connId)
+        return records
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+Load generator running many client sessions concurrently in one reactor.
+
+Every session is a :obj:`~.LoadClientProtocol` with a factory of its own since
+a :obj:`~.ClientProtocolFactory` holds exactly one session. Sessions log in
+during a ramp-up period and are grouped into games that are filled up with
+computer players. They check or call after a random think time and play one
+game after the other until the load generator is stopped.
+
+Start it from the command line against a running server or a local one::
+
+    pokerth_loadgen --local --sessions 500 --ramp-up 10 --duration 60
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import sys
+import random
+import argparse
+
+from twisted.internet import reactor, defer
+
+from . import pokerth_pb2
+from . import logger
+from .metrics import Histogram
+from .lobby import GameInfo, LobbyError
+from .poker import Action
+from .protocol import ClientProtocol, ClientProtocolFactory
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+class LoadStats(object):
+    """
+    Statistics of a load generator run.
+
+    :param clock: provider of :obj:`seconds`, e.g. the reactor
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self.start = clock.seconds()
+        self.end = None
+        self.lastConnection = None
+        self.connections = 0
+        self.failures = 0
+        self.sent = 0
+        self.received = 0
+        self.hands = 0
+        self.games = 0
+        self.latencies = Histogram()
+
+    def connectionMade(self):
+        self.connections += 1
+        self.lastConnection = self.clock.seconds()
+
+    def percentile(self, p):
+        """
+        Percentile of the action-response latencies within the precision of
+        the histogram.
+
+        :param p: percentile between 0 and 100
+        :return: latency in seconds or :obj:`None` without any actions
+        """
+        return self.latencies.percentile(p)
+
+    def report(self):
+        """
+        Summary of the statistics.
+
+        :return: dictionary of rates and latency percentiles
+        """
+        end = self.end if self.end is not None else self.clock.seconds()
+        duration = end - self.start
+        rampUp = (self.lastConnection or end) - self.start
+        return dict(duration=duration,
+                    connections=self.connections,
+                    failures=self.failures,
+                    connectionsPerSec=self.connections/rampUp if rampUp
+                    else float(self.connections),
+                    messagesPerSec=(self.sent + self.received)/duration
+                    if duration else 0.,
+                    sent=self.sent,
+                    received=self.received,
+                    hands=self.hands,
+                    games=self.games,
+                    actions=self.latencies.count,
+                    latencies={p: self.percentile(p)
+                               for p in (50, 90, 99, 99.9, 100)})
+
+    def __str__(self):
+        report = self.report()
+        lines = ["duration: {duration:.2f} s",
+                 "connections: {connections} ({failures} failed), "
+                 "{connectionsPerSec:.1f}/s",
+                 "messages: {sent} sent, {received} received, "
+                 "{messagesPerSec:.1f}/s",
+                 "hands: {hands}, games: {games}, actions: {actions}"]
+        text = "\n".join(lines).format(**report)
+        for p, latency in sorted(report['latencies'].items()):
+            if latency is not None:
+                text += "\naction latency p{:g}: {:.2f} ms".format(
+                    p, 1e3*latency)
+        return text
+
+
+class LoadClientProtocol(ClientProtocol):
+
+    def connectionMade(self):
+        ClientProtocol.connectionMade(self)
+        self.factory.generator.stats.connectionMade()
+        self._actionSent = None
+
+    def _getBufferedData(self, data):
+        stats = self.factory.generator.stats
+        for buffer in ClientProtocol._getBufferedData(self, data):
+            stats.received += 1
+            yield buffer
+
+    def _sendMessage(self, msg, flush=False):
+        self.factory.generator.stats.sent += 1
+        ClientProtocol._sendMessage(self, msg, flush)
+
+    def handleInsideLobby(self, lobbyInfo):
+        factory = self.factory
+        if not factory.generator.running:
+            return
+        if factory.isAdmin:
+            gameInfo = GameInfo(factory.gameName)
+            gameInfo._maxNumPlayers = factory.generator.maxNumPlayers
+            self.sendJoinNewGame(gameInfo)
+        else:
+            try:
+                gameId = lobbyInfo.getGameInfoId(factory.gameName)
+            except LobbyError:
+                self.clock.callLater(1, self.handleInsideLobby, lobbyInfo)
+            else:
+                self.sendJoinExistingGame(gameId)
+
+    def joinGameAckReceived(self, msg):
+        ClientProtocol.joinGameAckReceived(self, msg)
+        self._startIfReady()
+
+    def gamePlayerJoinedReceived(self, msg):
+        ClientProtocol.gamePlayerJoinedReceived(self, msg)
+        self._startIfReady()
+
+    def _startIfReady(self):
+        factory = self.factory
+        if factory.isAdmin and \
+                len(factory.game.players) == factory.numHumans:
+            self.sendStartEvent(factory.game.gameId,
+                                pokerth_pb2.StartEventMessage.startEvent,
+                                fillWithBots=True)
+
+    def handleMyTurn(self, gameInfo):
+        thinkTime = self.factory.generator.thinkTime()
+        turn = (gameInfo.gameId, gameInfo.handNum, gameInfo.currRound)
+        self.clock.callLater(thinkTime, self._act, turn)
+
+    def _act(self, turn):
+        gameInfo = self.factory.game
+        if not self.connected or \
+                turn != (gameInfo.gameId, gameInfo.handNum,
+                         gameInfo.currRound):
+            return
+        if gameInfo.highestSet > gameInfo.myBet:
+            action = Action.CALL
+        else:
+            action = Action.CHECK
+        self._actionSent = self.clock.seconds()
+        self.sendMyAction(action, 0)
+
+    def playersActionDoneReceived(self, msg):
+        ClientProtocol.playersActionDoneReceived(self, msg)
+        if msg.playerId == self.factory.playerId and \
+                self._actionSent is not None:
+            latency = self.clock.seconds() - self._actionSent
+            self.factory.generator.stats.latencies.record(latency)
+            self._actionSent = None
+
+    def handleEndOfHand(self, gameInfo):
+        self.factory.generator.stats.hands += 1
+
+    def handleEndOfGame(self, gameInfo, winner):
+        self.factory.generator.stats.games += 1
+        self.factory.round += 1
+        self.handleInsideLobby(self.factory.lobby)
+
+    def handleOthersTurn(self, playerInfo, gameInfo):
+        pass
+
+    def handleChat(self, chatType, text, lobbyInfo, gameInfo=None,
+                   playerInfo=None):
+        pass
+
+
+class LoadClientProtocolFactory(ClientProtocolFactory):
+    """
+    Factory of a single session of the load generator.
+
+    :param nickName: nickname of the session
+    :param generator: load generator (:obj:`~.LoadGenerator`)
+    :param group: number of the group of sessions playing together
+    :param isAdmin: boolean if the session creates and starts the games
+    :param numHumans: number of sessions in the group
+    """
+    protocol = LoadClientProtocol
+
+    def __init__(self, nickName, generator, group, isAdmin, numHumans):
+        ClientProtocolFactory.__init__(self, nickName)
+        self.generator = generator
+        self.group = group
+        self.isAdmin = isAdmin
+        self.numHumans = numHumans
+        self.round = 0
+        self.proto = None
+
+    @property
+    def gameName(self):
+        return "Load Game {}.{}".format(self.group, self.round)
+
+    def buildProtocol(self, addr):
+        proto = ClientProtocolFactory.buildProtocol(self, addr)
+        proto.clock = self.generator.clock
+        self.proto = proto
+        return proto
+
+    def clientConnectionFailed(self, connector, reason):
+        logger.wire.warning("Connection of {} failed: {}", self.nickName,
+                            reason.getErrorMessage())
+        self.generator.stats.failures += 1
+
+
+class LoadGenerator(object):
+    """
+    Drives many client sessions against a server in one reactor.
+
+    :param connect: function connecting a factory to the server, e.g.
+                    ``lambda f: reactor.connectTCP('localhost', 7234, f)``
+    :param numSessions: number of concurrent sessions
+    :param rampUp: seconds over which the logins of the sessions are spread
+    :param thinkTime: range (min, max) of seconds before taking an action
+    :param humansPerGame: number of sessions per game
+    :param maxNumPlayers: number of players per game including computer
+                          players
+    :param seed: seed of the random generator for think times
+    :param clock: provider of :obj:`callLater` and :obj:`seconds`
+    """
+    def __init__(self, connect, numSessions, rampUp=0., thinkTime=(0., 0.),
+                 humansPerGame=1, maxNumPlayers=10, seed=None, clock=reactor):
+        if numSessions < 1:
+            raise ValueError("{} is no number of sessions".format(numSessions))
+        if humansPerGame < 1:
+            raise ValueError("{} is no number of sessions per game".format(
+                humansPerGame))
+        self._connect = connect
+        self.numSessions = numSessions
+        self.rampUp = rampUp
+        self.thinkTimeRange = thinkTime
+        self.humansPerGame = humansPerGame
+        self.maxNumPlayers = max(maxNumPlayers, humansPerGame)
+        self.clock = clock
+        self.running = False
+        self.factories = []
+        self.stats = None
+        self._rng = random.Random(seed)
+        self._calls = []
+
+    def thinkTime(self):
+        low, high = self.thinkTimeRange
+        return self._rng.uniform(low, high) if high > low else low
+
+    def start(self):
+        """
+        Starts the ramp-up of all sessions.
+        """
+        self.running = True
+        self.stats = LoadStats(self.clock)
+        interval = self.rampUp/self.numSessions
+        for i in range(self.numSessions):
+            group, member = divmod(i, self.humansPerGame)
+            numHumans = min(self.humansPerGame,
+                            self.numSessions - group*self.humansPerGame)
+            factory = LoadClientProtocolFactory('LoadBot{}'.format(i + 1),
+                                                self, group, member == 0,
+                                                numHumans)
+            self.factories.append(factory)
+            self._calls.append(self.clock.callLater(i*interval,
+                                                    self._connect, factory))
+
+    def stop(self):
+        """
+        Stops all sessions.
+
+        :return: statistics of the run (:obj:`~.LoadStats`)
+        """
+        self.running = False
+        for call in self._calls:
+            if call.active():
+                call.cancel()
+        self._calls = []
+        self.stats.end = self.clock.seconds()
+        for factory in self.factories:
+            if factory.proto is not None and factory.proto.transport:
+                factory.proto.transport.loseConnection()
+        return self.stats
+
+    def run(self, duration):
+        """
+        Runs the load generator for some time.
+
+        :param duration: seconds to run after the start
+        :return: :obj:`~.Deferred` firing with the statistics
+        """
+        self.start()
+        d = defer.Deferred()
+        self.clock.callLater(duration, lambda: d.callback(self.stop()))
+        return d
+
+
+def positiveInt(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("{} is not positive".format(value))
+    return number
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description="Load generator for PokerTH servers")
+    parser.add_argument('--host', default='localhost',
+                        help="host of the server")
+    parser.add_argument('--port', type=int, default=7234,
+                        help="port of the server")
+    parser.add_argument('--local', action='store_true',
+                        help="start a local stand-in server on the port")
+    parser.add_argument('--sessions', type=positiveInt, default=100,
+                        help="number of concurrent sessions")
+    parser.add_argument('--ramp-up', type=float, default=10.,
+                        help="seconds to log in all sessions")
+    parser.add_argument('--think-time', type=float, nargs=2,
+                        default=(0., 1.), metavar=('MIN', 'MAX'),
+                        help="range of seconds before an action")
+    parser.add_argument('--humans-per-game', type=positiveInt, default=1,
+                        help="number of sessions per game")
+    parser.add_argument('--players-per-game', type=positiveInt, default=10,
+                        help="number of players per game")
+    parser.add_argument('--duration', type=float, default=60.,
+                        help="seconds to run")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed of the random generators")
+    return parser.parse_args(args)
+
+
+def main(args):
+    args = parse_args(args)
+    logger.setLevel(logger.Level.WARNING)
+    if args.local:
+        from .server import ServerProtocolFactory
+        reactor.listenTCP(args.port, ServerProtocolFactory(seed=args.seed),
+                          interface=args.host)
+    generator = LoadGenerator(
+        lambda f: reactor.connectTCP(args.host, args.port, f),
+        args.sessions, rampUp=args.ramp_up, thinkTime=args.think_time,
+        humansPerGame=args.humans_per_game,
+        maxNumPlayers=args.players_per_game, seed=args.seed)
+
+    def report(stats):
+        print(stats)
+        reactor.stop()
+
+    reactor.callWhenRunning(
+        lambda: generator.run(args.duration).addCallback(report))
+    reactor.run()
+
+
+def run():
+    main(sys.argv[1:])
+
+
+if __name__ == '__main__':
+    run()
@@ -6,6 +6,8 @@ players etc. is presented.
 
 from __future__ import print_function, absolute_import, division
 
+from collections import OrderedDict
+
 from . import pokerth_pb2
 from .player import Player
 
@@ -200,56 +202,83 @@ class LobbyError(Exception):
 
 
 class Lobby(object):
+    """
+    Players and games of the lobby.
+
+    Players and games are indexed by their ids and games additionally by
+    their names, thus all lookups take constant time. The index of a game is
+    built from its id and name when it is added.
+    """
 
     def __init__(self):
-        self._players = []
-        self._gameInfos = []
+        self._players = OrderedDict()  # players by id
+        self._gameInfos = OrderedDict()  # games by id
+        self._gameIdsByName = {}  # ids of the games by name
 
     @property
     def gameInfos(self):
-        return self._gameInfos
+        return self._gameInfos.values()
 
     def addGameInfo(self, gameInfo):
-        if gameInfo not in self._gameInfos:
-            self._gameInfos.append(gameInfo)
+        if gameInfo.gameId not in self._gameInfos:
+            self._gameInfos[gameInfo.gameId] = gameInfo
+            self._gameIdsByName.setdefault(gameInfo.gameName, []).append(
+                gameInfo.gameId)
         else:
             raise LobbyError("Game is already in our list of games")
 
+    def delGameInfo(self, gameId):
+        """
+        Removes a game from the games and the index of their names.
+
+        :param gameId: id of the game, :obj:`~.LobbyError` if not listed
+        """
+        gameInfo = self.getGameInfo(gameId)
+        del self._gameInfos[gameId]
+        ids = self._gameIdsByName[gameInfo.gameName]
+        ids.remove(gameId)
+        if not ids:
+            del self._gameIdsByName[gameInfo.gameName]
+
     @property
     def players(self):
-        return self._players
+        return self._players.values()
 
     def addPlayer(self, playerId):
-        player = Player(playerId)
-        if player not in self._players:
-            self._players.append(player)
+        if playerId not in self._players:
+            self._players[playerId] = Player(playerId)
         else:
             raise LobbyError("Player with id {} already listed".format(
                 playerId))
 
     def delPlayer(self, playerId):
-        player = Player(playerId)
-        self._players.remove(player)
+        """
+        Removes a player from the lobby.
+
+        :param playerId: id of the player, :obj:`~.LobbyError` if not listed
+        """
+        try:
+            del self._players[playerId]
+        except KeyError:
+            raise LobbyError("Player with id {} not listed".format(playerId))
 
     def getPlayer(self, playerId):
-        players = [p for p in self._players if p.playerId == playerId]
-        if len(players) == 1:
-            return players[0]
-        else:
+        try:
+            return self._players[playerId]
+        except KeyError:
             raise LobbyError("Player with id {} not listed".format(playerId))
 
     def getGameInfoId(self, gameName):
-        ids = [g.gameId for g in self._gameInfos if g.gameName == gameName]
+        ids = self._gameIdsByName.get(gameName, [])
         if len(ids) == 1:
             return ids[0]
         else:
             raise LobbyError("No game of name {} found".format(gameName))
 
     def getGameInfo(self, gameId):
-        gameInfos = [g for g in self._gameInfos if g.gameId == gameId]
-        if len(gameInfos) == 1:
-            return gameInfos[0]
-        else:
+        try:
+            return self._gameInfos[gameId]
+        except KeyError:
             raise LobbyError("Game with id {} not listed".format(gameId))
 
     def setPlayerInfo(self, playerId, infoData):
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Level-gated logging with one logger per category on top of Twisted's log.
+
+Messages are only formatted if their level is enabled for the category, thus
+arguments like protobuf messages or raw frames should be passed as arguments
+instead of being formatted by the caller, e.g.::
+
+    logger.dispatch.debug("{0.DESCRIPTOR.name} received", msg)
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import logging
+import binascii
+
+from twisted.python import log
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+class Level(object):
+    """
+    Enum of log levels compatible to the levels of :obj:`logging`
+    """
+    DEBUG = logging.DEBUG
+    INFO = logging.INFO
+    WARNING = logging.WARNING
+    ERROR = logging.ERROR
+    OFF = logging.CRITICAL + 10
+
+
+class Category(object):
+    """
+    Enum of log categories
+    """
+    WIRE = 'wire'  # connections and raw frames
+    DISPATCH = 'dispatch'  # received and sent messages
+    GAME = 'game'  # events of a poker game
+    LOBBY = 'lobby'  # events inside the lobby
+
+
+class Logger(object):
+    """
+    Logger of a category that only formats and emits messages of enabled
+    levels.
+
+    :param category: category of the logger (:obj:`~.Category`)
+    :param level: minimum level (:obj:`~.Level`) to emit
+    """
+    def __init__(self, category, level=Level.INFO):
+        self._category = category
+        self.level = level
+
+    @property
+    def category(self):
+        return self._category
+
+    def isEnabledFor(self, level):
+        return level >= self.level
+
+    def _emit(self, level, fmt, args, kwargs):
+        text = fmt.format(*args, **kwargs) if args or kwargs else fmt
+        log.msg(text, system=self._category, logLevel=level)
+
+    def log(self, level, fmt, *args, **kwargs):
+        """
+        Logs a message if the level is enabled.
+
+        :param level: level of the message (:obj:`~.Level`)
+        :param fmt: format string of the message
+        :param args: positional arguments of the format string
+        :param kwargs: keyword arguments of the format string
+        """
+        if level >= self.level:
+            self._emit(level, fmt, args, kwargs)
+
+    def debug(self, fmt, *args, **kwargs):
+        if self.level <= Level.DEBUG:
+            self._emit(Level.DEBUG, fmt, args, kwargs)
+
+    def info(self, fmt, *args, **kwargs):
+        if self.level <= Level.INFO:
+            self._emit(Level.INFO, fmt, args, kwargs)
+
+    def warning(self, fmt, *args, **kwargs):
+        if self.level <= Level.WARNING:
+            self._emit(Level.WARNING, fmt, args, kwargs)
+
+    def error(self, fmt, *args, **kwargs):
+        if self.level <= Level.ERROR:
+            self._emit(Level.ERROR, fmt, args, kwargs)
+
+
+class Hex(object):
+    """
+    Hex representation of data that is only computed when formatted.
+
+    :param data: data as string or :obj:`memoryview`
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __str__(self):
+        return binascii.hexlify(self._data)
+
+
+wire = Logger(Category.WIRE)
+dispatch = Logger(Category.DISPATCH)
+game = Logger(Category.GAME)
+lobby = Logger(Category.LOBBY)
+
+_loggers = {logger.category: logger for logger in (wire, dispatch, game,
+                                                    lobby)}
+
+
+def getLogger(category):
+    """
+    Retrieves the logger of a category.
+
+    :param category: category of :obj:`~.Category`
+    :return: logger (:obj:`~.Logger`)
+    """
+    return _loggers[category]
+
+
+def setLevel(level, *categories):
+    """
+    Sets the minimum level to emit for some or all categories.
+
+    :param level: level of :obj:`~.Level`
+    :param categories: categories of :obj:`~.Category`, all if omitted
+    """
+    categories = categories if categories else _loggers.keys()
+    for category in categories:
+        _loggers[category].level = level
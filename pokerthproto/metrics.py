@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Latency instrumentation of the message dispatch with HDR-style histograms.
+
+Assign a :obj:`~.MessageMetrics` instance to the ``metrics`` attribute of a
+protocol class or instance to record for every received message the time
+from the arrival of its frame until it is decoded, until its handler finished
+and until the first message is sent in response, e.g.::
+
+    metrics = MessageMetrics()
+    ClientProtocol.metrics = metrics
+    metrics.dumpOnShutdown()
+
+A sent message is attributed to the last received message of the same
+connection if no other message was sent in between. Thus the response time of
+a ``PlayersTurnMessage`` also covers a delayed ``MyActionRequestMessage`` of
+:obj:`~.ClientProtocol.handleMyTurn`.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import sys
+import math
+import timeit
+
+from twisted.internet import reactor
+
+from . import pokerth_pb2
+from .transport import getMsgType
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+class Stage(object):
+    """
+    Enum of the measured stages of a received message
+    """
+    DECODE = 'decode'  # frame arrival until decoded
+    HANDLER = 'handler'  # decoded until the handler finished
+    TOTAL = 'total'  # frame arrival until the handler finished
+    RESPONSE = 'response'  # frame arrival until the first sent message
+
+    ALL = (DECODE, HANDLER, TOTAL, RESPONSE)
+
+
+class Histogram(object):
+    """
+    Histogram of latencies with logarithmic buckets of linear sub-buckets
+    like an HDR histogram.
+
+    Values are counted as integers of a unit with a relative error below
+    ``10**-significantDigits``, independent of the magnitude of the value.
+
+    :param significantDigits: number of significant decimal digits
+    :param unit: resolution of the values in seconds
+    """
+    def __init__(self, significantDigits=2, unit=1e-6):
+        self.unit = unit
+        subBucketCount = 2*10**significantDigits
+        self._subBucketBits = int(math.ceil(math.log(subBucketCount, 2)))
+        self._subBucketCount = 1 << self._subBucketBits
+        self._subHalfCount = self._subBucketCount >> 1
+        self._scale = 1/unit
+        self._counts = []
+        self.count = 0
+        self.total = 0
+        self._min = sys.maxsize
+        self._max = -1
+
+    @property
+    def min(self):
+        """
+        Smallest value in units or :obj:`None` if empty
+        """
+        return self._min if self.count else None
+
+    @property
+    def max(self):
+        """
+        Largest value in units or :obj:`None` if empty
+        """
+        return self._max if self.count else None
+
+    def _getIndex(self, value):
+        if value < self._subBucketCount:
+            return value
+        shift = value.bit_length() - self._subBucketBits
+        return self._subHalfCount*shift + (value >> shift)
+
+    def _getHighestValue(self, index):
+        if index < self._subBucketCount:
+            return index
+        shift = index//self._subHalfCount - 1
+        sub = index - self._subHalfCount*shift
+        return ((sub + 1) << shift) - 1
+
+    def record(self, seconds):
+        """
+        Counts a latency.
+
+        :param seconds: latency in seconds
+        """
+        value = int(seconds*self._scale)
+        if value < 0:
+            value = 0
+        if value < self._subBucketCount:
+            index = value
+        else:
+            index = self._getIndex(value)
+        try:
+            self._counts[index] += 1
+        except IndexError:
+            self._counts.extend([0]*(index + 1 - len(self._counts)))
+            self._counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value < self._min:
+            self._min = value
+        if value > self._max:
+            self._max = value
+
+    def merge(self, other):
+        """
+        Adds the counts of another histogram of the same precision.
+
+        :param other: histogram (:obj:`~.Histogram`)
+        """
+        assert other._subBucketBits == self._subBucketBits
+        assert other.unit == self.unit
+        if len(other._counts) > len(self._counts):
+            self._counts.extend([0]*(len(other._counts) - len(self._counts)))
+        for index, count in enumerate(other._counts):
+            self._counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+
+    @property
+    def mean(self):
+        """
+        Mean latency in seconds or :obj:`None` if empty
+        """
+        if not self.count:
+            return None
+        return self.total/self.count*self.unit
+
+    def percentile(self, p):
+        """
+        Latency at a percentile, i.e. the highest value equivalent to the
+        bucket of the value at that rank.
+
+        :param p: percentile between 0 and 100
+        :return: latency in seconds or :obj:`None` if empty
+        """
+        if not self.count:
+            return None
+        rank = max(int(p/100*self.count + 0.5), 1)
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                value = min(self._getHighestValue(index), self._max)
+                return value*self.unit
+        return self._max*self.unit
+
+
+class MessageMetrics(object):
+    """
+    Latency histograms of received messages per message type and stage.
+
+    :param timer: function returning the current time in seconds
+    :param significantDigits: precision of the histograms
+    """
+    def __init__(self, timer=timeit.default_timer, significantDigits=2):
+        self.timer = timer
+        self.significantDigits = significantDigits
+        self._histograms = {}
+        # histograms of the decode, handler and total stage per message type
+        self._receivedHistograms = {}
+
+    def _getHistogram(self, msgType, stage):
+        key = (msgType, stage)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = Histogram(self.significantDigits)
+            self._histograms[key] = histogram
+        return histogram
+
+    def recordReceived(self, msgType, arrival, decoded, handled):
+        """
+        Records the stages of a received message.
+
+        :param msgType: message type number of the envelope
+        :param arrival: time of the frame arrival
+        :param decoded: time when the message was decoded
+        :param handled: time when the handler finished
+        """
+        histograms = self._receivedHistograms.get(msgType)
+        if histograms is None:
+            histograms = [self._getHistogram(msgType, stage) for stage in
+                          (Stage.DECODE, Stage.HANDLER, Stage.TOTAL)]
+            self._receivedHistograms[msgType] = histograms
+        decode, handler, total = histograms
+        decode.record(decoded - arrival)
+        handler.record(handled - decoded)
+        total.record(handled - arrival)
+
+    def recordResponse(self, msgType, arrival, sent):
+        """
+        Records the first message sent after a received message.
+
+        :param msgType: message type number of the received message
+        :param arrival: time of the frame arrival
+        :param sent: time when the response was sent
+        """
+        self._getHistogram(msgType, Stage.RESPONSE).record(sent - arrival)
+
+    def getHistogram(self, msgClass, stage=Stage.TOTAL):
+        """
+        Retrieves the histogram of a message type and stage.
+
+        :param msgClass: class of a PokerTH message
+        :param stage: stage of :obj:`~.Stage`
+        :return: histogram (:obj:`~.Histogram`) or :obj:`None` if nothing
+                 was recorded
+        """
+        return self._histograms.get((getMsgType(msgClass), stage))
+
+    def summary(self, percentiles=(50, 90, 99, 100)):
+        """
+        Summary of all histograms.
+
+        :param percentiles: percentiles to report
+        :return: list of tuples (message name, stage, count, mean,
+                 latencies at percentiles) in seconds
+        """
+        names = {v: k.split('_', 1)[1] for k, v in
+                 pokerth_pb2.PokerTHMessage.PokerTHMessageType.items()}
+        rows = []
+        for (msgType, stage), histogram in sorted(
+                self._histograms.items(),
+                key=lambda item: (item[0][0], Stage.ALL.index(item[0][1]))):
+            rows.append((names[msgType], stage, histogram.count,
+                         histogram.mean,
+                         [histogram.percentile(p) for p in percentiles]))
+        return rows
+
+    def dump(self, out=None, percentiles=(50, 90, 99, 100)):
+        """
+        Writes a table of all histograms in milliseconds.
+
+        :param out: file-like object, :obj:`sys.stdout` if omitted
+        :param percentiles: percentiles to report
+        """
+        out = sys.stdout if out is None else out
+        header = ["{:>9}".format('p{:g}'.format(p)) for p in percentiles]
+        print("{:<32} {:<8} {:>8} {:>9} {}".format(
+            'message', 'stage', 'count', 'mean', ' '.join(header)), file=out)
+        for name, stage, count, mean, values in self.summary(percentiles):
+            values = ' '.join("{:9.3f}".format(1e3*v) for v in values)
+            print("{:<32} {:<8} {:>8} {:9.3f} {}".format(
+                name, stage, count, 1e3*mean, values), file=out)
+
+    def dumpOnShutdown(self, out=None, reactor=reactor):
+        """
+        Dumps all histograms when the reactor shuts down.
+
+        :param out: file-like object, :obj:`sys.stdout` if omitted
+        :param reactor: reactor to watch
+        """
+        reactor.addSystemEventTrigger('before', 'shutdown', self.dump, out)
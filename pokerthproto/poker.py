@@ -5,6 +5,15 @@ All data structures related to poker like poker actions, cards, rounds etc.
 
 from __future__ import print_function, absolute_import, division
 
+import bisect
+from itertools import combinations
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from . import pokerth_pb2
 
 __author__ = 'Florian Wilhelm'
@@ -69,3 +78,591 @@ def intToCard(i):
     """
     assert 0 <= i <= 51
     return ranks[i % 13] + suits[i // 13]
+
+
+# cards in the order of cardToInt and the other way around
+_intCards = [intToCard(i) for i in range(52)]
+_cardInts = dict((card, i) for i, card in enumerate(_intCards))
+
+
+def _toInt(card):
+    if isinstance(card, basestring):
+        try:
+            return _cardInts[card]
+        except KeyError:
+            raise ValueError("{} is no poker card".format(card))
+    if not 0 <= card <= 51:
+        raise ValueError("{} is no poker card".format(card))
+    return int(card)
+
+
+class CardSet(object):
+    """
+    Immutable set of poker cards backed by a 52 bit integer where bit ``i``
+    stands for the card ``i`` of :obj:`cardToInt`.
+
+    :param cards: iterable of poker cards like 2d, Th or of integers of
+                  :obj:`cardToInt` as in the protobuf messages
+    """
+    __slots__ = ('_mask',)
+
+    def __init__(self, cards=()):
+        if isinstance(cards, CardSet):
+            self._mask = cards._mask
+            return
+        mask = 0
+        for card in cards:
+            mask |= 1 << _toInt(card)
+        self._mask = mask
+
+    @classmethod
+    def fromMask(cls, mask):
+        """
+        Creates a card set from its bit mask.
+
+        :param mask: integer with bit ``i`` set for card ``i``
+        :return: card set
+        """
+        assert 0 <= mask < 1 << 52
+        cardSet = cls.__new__(cls)
+        cardSet._mask = mask
+        return cardSet
+
+    @property
+    def mask(self):
+        return self._mask
+
+    def __contains__(self, card):
+        return self._mask >> _toInt(card) & 1 == 1
+
+    def __len__(self):
+        return bin(self._mask).count('1')
+
+    def __nonzero__(self):
+        return self._mask != 0
+
+    def __iter__(self):
+        mask = self._mask
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def __or__(self, other):
+        return CardSet.fromMask(self._mask | CardSet(other)._mask)
+
+    def __and__(self, other):
+        return CardSet.fromMask(self._mask & CardSet(other)._mask)
+
+    def __sub__(self, other):
+        return CardSet.fromMask(self._mask & ~CardSet(other)._mask)
+
+    def isdisjoint(self, other):
+        return not self._mask & CardSet(other)._mask
+
+    def __eq__(self, other):
+        if isinstance(other, CardSet):
+            return self._mask == other._mask
+        return NotImplemented
+
+    def __ne__(self, other):
+        if isinstance(other, CardSet):
+            return self._mask != other._mask
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._mask)
+
+    def toInts(self):
+        """
+        :return: list of integers of :obj:`cardToInt` in ascending order
+        """
+        return list(self)
+
+    def toStrings(self):
+        """
+        :return: list of poker cards like 2d, Th in the order of
+                 :obj:`toInts`
+        """
+        return [_intCards[i] for i in self]
+
+    def __repr__(self):
+        return "CardSet({!r})".format(self.toStrings())
+
+
+# all cards of the deck, e.g. to draw from with ``FULL_DECK - deadCards``
+FULL_DECK = CardSet.fromMask((1 << 52) - 1)
+
+
+class HandCategory(object):
+    """
+    Enum of poker hand categories in ascending order
+    """
+    HIGH_CARD = 0
+    ONE_PAIR = 1
+    TWO_PAIR = 2
+    THREE_OF_A_KIND = 3
+    STRAIGHT = 4
+    FLUSH = 5
+    FULL_HOUSE = 6
+    FOUR_OF_A_KIND = 7
+    STRAIGHT_FLUSH = 8
+
+
+def rankHand(cards):
+    """
+    Ranks a poker hand of five cards.
+
+    The rank holds the :obj:`~.HandCategory` followed by the card ranks that
+    decide within the category, four bits each.
+
+    :param cards: five cards as integers of :obj:`cardToInt`
+    :return: integer rank, the higher the better
+    """
+    assert len(cards) == 5
+    counts = Counter(c % 13 for c in cards)
+    groups = sorted(((n, r) for r, n in counts.items()), reverse=True)
+    shape = [n for n, _ in groups]
+    values = [r for _, r in groups]
+    flush = len(set(c // 13 for c in cards)) == 1
+    straight = len(values) == 5 and values[0] - values[4] == 4
+    if values == [12, 3, 2, 1, 0]:  # Ace plays low
+        straight, values = True, [3, 2, 1, 0, -1]
+    if straight and flush:
+        category = HandCategory.STRAIGHT_FLUSH
+    elif shape == [4, 1]:
+        category = HandCategory.FOUR_OF_A_KIND
+    elif shape == [3, 2]:
+        category = HandCategory.FULL_HOUSE
+    elif flush:
+        category = HandCategory.FLUSH
+    elif straight:
+        category = HandCategory.STRAIGHT
+    elif shape == [3, 1, 1]:
+        category = HandCategory.THREE_OF_A_KIND
+    elif shape == [2, 2, 1]:
+        category = HandCategory.TWO_PAIR
+    elif shape == [2, 1, 1, 1]:
+        category = HandCategory.ONE_PAIR
+    else:
+        category = HandCategory.HIGH_CARD
+    return _encode(category, values)
+
+
+def _encode(category, values):
+    rank = category
+    for value in (values + [0]*5)[:5]:
+        rank = 16*rank + value + 1
+    return rank
+
+
+def bestHand(cards):
+    """
+    Finds the best poker hand of five out of five to seven cards.
+
+    :param cards: cards as integers of :obj:`cardToInt`
+    :return: tuple of the rank of :obj:`rankHand` and the positions of the
+             five cards in ``cards``
+    """
+    assert 5 <= len(cards) <= 7
+    return max((rankHand([cards[i] for i in positions]), positions)
+               for positions in combinations(range(len(cards)), 5))
+
+
+def handCategory(rank):
+    """
+    Extracts the category from a rank of :obj:`rankHand`.
+
+    :param rank: integer rank
+    :return: category of :obj:`~.HandCategory`
+    """
+    return rank >> 20
+
+
+# rank masks of all straights from the highest down to the wheel
+_STRAIGHTS = [(0x1f << (top - 4), list(range(top, top - 5, -1)))
+              for top in range(12, 3, -1)] + [(0x100f, [3, 2, 1, 0, -1])]
+
+
+def _straightValues(mask):
+    for straight, values in _STRAIGHTS:
+        if mask & straight == straight:
+            return values
+
+
+def _rankFlush(mask):
+    """
+    Ranks the best hand of five or more cards of a single suit.
+
+    :param mask: bit mask of the card ranks
+    :return: integer rank of :obj:`rankHand`
+    """
+    values = _straightValues(mask)
+    if values is not None:
+        return _encode(HandCategory.STRAIGHT_FLUSH, values)
+    values = [r for r in range(12, -1, -1) if mask >> r & 1]
+    return _encode(HandCategory.FLUSH, values[:5])
+
+
+def _rankCounts(counts):
+    """
+    Ranks the best hand of five to seven cards that do not make a flush.
+
+    :param counts: list of the number of cards of each rank
+    :return: integer rank of :obj:`rankHand`
+    """
+    desc = [r for r in range(12, -1, -1) if counts[r]]
+    quads = [r for r in desc if counts[r] == 4]
+    trips = [r for r in desc if counts[r] == 3]
+    pairs = [r for r in desc if counts[r] == 2]
+
+    def kickers(used, n):
+        return [r for r in desc if r not in used][:n]
+
+    if quads:
+        return _encode(HandCategory.FOUR_OF_A_KIND,
+                       quads[:1] + kickers(quads[:1], 1))
+    if trips and len(trips) + len(pairs) >= 2:
+        return _encode(HandCategory.FULL_HOUSE,
+                       [trips[0], max(trips[1:] + pairs)])
+    values = _straightValues(sum(1 << r for r in desc))
+    if values is not None:
+        return _encode(HandCategory.STRAIGHT, values)
+    if trips:
+        return _encode(HandCategory.THREE_OF_A_KIND,
+                       trips[:1] + kickers(trips[:1], 2))
+    if len(pairs) >= 2:
+        return _encode(HandCategory.TWO_PAIR,
+                       pairs[:2] + kickers(pairs[:2], 1))
+    if pairs:
+        return _encode(HandCategory.ONE_PAIR,
+                       pairs[:1] + kickers(pairs[:1], 3))
+    return _encode(HandCategory.HIGH_CARD, desc[:5])
+
+
+def _rankMultisets(n, rank=12):
+    """
+    Generates the numbers of cards of the ranks up to ``rank`` for all
+    multisets of ``n`` card ranks.
+    """
+    if rank < 0:
+        if n == 0:
+            yield []
+        return
+    for count in range(min(n, 4) + 1):
+        for counts in _rankMultisets(n - count, rank - 1):
+            yield counts + [count]
+
+
+class _EvaluatorTables(object):
+    """
+    Lookup tables of :obj:`evaluate` built on first use.
+
+    A card is keyed by ``5**rank`` in the low 32 bits and by the number of
+    cards of its suit, three bits each, in the high bits. The sum of the
+    keys of up to seven cards identifies the multiset of ranks and the suit
+    of a flush if any.
+    """
+    def __init__(self):
+        self.cardKeys = [(1 << (32 + 3*(c // 13))) + 5**(c % 13)
+                         for c in range(52)]
+        self.ranks = {}
+        for n in (5, 6, 7):
+            for counts in _rankMultisets(n):
+                key = sum(count*5**r for r, count in enumerate(counts))
+                self.ranks[key] = _rankCounts(counts)
+        self.flushes = [_rankFlush(mask) if bin(mask).count('1') >= 5 else 0
+                        for mask in range(1 << 13)]
+        self.flushSuits = [-1]*(1 << 12)
+        for suitCounts in range(1 << 12):
+            for suit in range(4):
+                if suitCounts >> 3*suit & 7 >= 5:
+                    self.flushSuits[suitCounts] = suit
+        if np is not None:
+            self.npCardKeys = np.array(self.cardKeys, dtype=np.int64)
+            self.npCardBits = np.array(
+                [1 << (16*(c // 13) + c % 13) for c in range(52)],
+                dtype=np.int64)
+            keys = sorted(self.ranks)
+            self.npKeys = np.array(keys, dtype=np.int64)
+            self.npRanks = np.array([self.ranks[k] for k in keys],
+                                    dtype=np.int32)
+            self.npFlushes = np.array(self.flushes, dtype=np.int32)
+            self.npFlushSuits = np.array(self.flushSuits, dtype=np.int64)
+
+
+_tables = []
+
+
+def _evaluatorTables():
+    if not _tables:
+        _tables.append(_EvaluatorTables())
+    return _tables[0]
+
+
+def evaluate(cards):
+    """
+    Ranks the best poker hand of five out of five to seven cards by table
+    lookups.
+
+    The tables take about a second to build on first use.
+
+    :param cards: cards as integers of :obj:`cardToInt`
+    :return: integer rank of :obj:`rankHand`, the same as of :obj:`bestHand`
+    """
+    tables = _evaluatorTables()
+    cardKeys = tables.cardKeys
+    key = 0
+    for card in cards:
+        key += cardKeys[card]
+    suit = tables.flushSuits[key >> 32]
+    if suit < 0:
+        return tables.ranks[key & 0xffffffff]
+    mask = 0
+    for card in cards:
+        if card // 13 == suit:
+            mask |= 1 << card % 13
+    return tables.flushes[mask]
+
+
+def evaluateMany(cards):
+    """
+    Ranks many poker hands at once like :obj:`evaluate` with NumPy.
+
+    :param cards: array of shape (number of hands, 5 to 7) of cards as
+                  integers of :obj:`cardToInt`
+    :return: array of integer ranks
+    """
+    if np is None:
+        raise ImportError("evaluateMany requires NumPy")
+    tables = _evaluatorTables()
+    cards = np.asarray(cards, dtype=np.intp)
+    assert cards.ndim == 2 and 5 <= cards.shape[1] <= 7
+    keys = tables.npCardKeys[cards].sum(axis=1)
+    result = tables.npRanks[np.searchsorted(tables.npKeys,
+                                            keys & 0xffffffff)]
+    suits = tables.npFlushSuits[keys >> 32]
+    flush = np.flatnonzero(suits >= 0)
+    if len(flush):
+        bits = tables.npCardBits[cards[flush]].sum(axis=1)
+        masks = bits >> 16*suits[flush] & 0x1fff
+        result[flush] = tables.npFlushes[masks]
+    return result
+
+
+def _choose(n, k):
+    result = 1
+    for i in range(k):
+        result = result*(n - i)//(i + 1)
+    return result
+
+
+# binomial coefficients of up to 13 ranks
+_BINOMIAL = [[_choose(n, k) for k in range(14)] for n in range(14)]
+# index of each set of ranks, given as mask, among the sets of its size
+_COLEX = [sum(_BINOMIAL[r][k + 1] for k, r in
+              enumerate(i for i in range(13) if mask >> i & 1))
+          for mask in range(1 << 13)]
+
+
+def _unrankColex(index, k, n=13):
+    """
+    Finds the ``k`` distinct numbers below ``n`` with the colexicographic
+    rank ``index``, the highest first.
+    """
+    result = []
+    for k in range(k, 0, -1):
+        if k == 1:
+            result.append(index)
+            break
+        n -= 1
+        while _choose(n, k) > index:
+            n -= 1
+        result.append(n)
+        index -= _choose(n, k)
+    return result
+
+
+def _suitIndex(holeMask, boardMask):
+    """
+    Indexes the ranks of the pocket and board cards of one suit.
+    """
+    # positions of the board ranks among the ranks not in the pocket
+    compressed, pos = 0, 0
+    for rank in range(13):
+        if holeMask >> rank & 1:
+            continue
+        if boardMask >> rank & 1:
+            compressed |= 1 << pos
+        pos += 1
+    numHole = bin(holeMask).count('1')
+    return _COLEX[holeMask]*_BINOMIAL[13 - numHole][
+        bin(boardMask).count('1')] + _COLEX[compressed]
+
+
+def _suitRanks(index, numHole, numBoard):
+    """
+    Inverse of :obj:`_suitIndex` returning lists of pocket and board ranks.
+    """
+    holeIndex, boardIndex = divmod(index, _BINOMIAL[13 - numHole][numBoard])
+    hole = _unrankColex(holeIndex, numHole)
+    free = [rank for rank in range(13) if rank not in hole]
+    return hole, [free[pos] for pos in _unrankColex(boardIndex, numBoard, 13 -
+                                                     numHole)]
+
+
+def _splits(n, parts=4):
+    """
+    Generates all ways to split ``n`` cards over the suits.
+    """
+    if parts == 1:
+        yield [n]
+        return
+    for first in range(n + 1):
+        for rest in _splits(n - first, parts - 1):
+            yield [first] + rest
+
+
+class _IsomorphismTables(object):
+    """
+    Tables of :obj:`canonicalIndex` for a number of board cards.
+
+    Each suit holds some of the pocket and board cards. The configuration is
+    the list of these numbers of the four suits in descending order. The
+    indices of a configuration start at its offset and combine the multisets
+    of the rank indices of the suits with equal numbers of cards.
+    """
+    def __init__(self, numBoard):
+        configs = set()
+        for holes in _splits(2):
+            for boards in _splits(numBoard):
+                configs.add(tuple(sorted(zip(holes, boards), reverse=True)))
+        self.configs = sorted(configs, reverse=True)
+        self.configIndex = dict((c, i) for i, c in enumerate(self.configs))
+        self.groups = []
+        self.offsets = []
+        size = 0
+        for config in self.configs:
+            groups = []
+            for numHole, numBoard in config:
+                if groups and groups[-1][:2] == [numHole, numBoard]:
+                    groups[-1][2] += 1
+                else:
+                    groups.append([numHole, numBoard, 1])
+            for group in groups:
+                numHole, numBoard, numSuits = group
+                suitSize = _BINOMIAL[13][numHole] * \
+                    _BINOMIAL[13 - numHole][numBoard]
+                group.extend([suitSize,
+                              _choose(suitSize + numSuits - 1, numSuits)])
+            self.groups.append(groups)
+            self.offsets.append(size)
+            numConfig = 1
+            for group in groups:
+                numConfig *= group[4]
+            size += numConfig
+        self.size = size
+
+
+_isoTables = {}
+
+
+def _isomorphismTables(numBoard):
+    if numBoard not in (0, 3, 4, 5):
+        raise ValueError("{} is no number of board cards".format(numBoard))
+    if numBoard not in _isoTables:
+        _isoTables[numBoard] = _IsomorphismTables(numBoard)
+    return _isoTables[numBoard]
+
+
+def canonicalIndex(pocketCards, board=()):
+    """
+    Indexes pocket cards and board cards up to permutations of the suits.
+
+    Hands like ``As Kd`` on ``Qh Jh 2c`` and ``Ah Ks`` on ``Qd Jd 2c`` are
+    strategically the same and get the same index, e.g. as key of a cache.
+    The order of the board cards does not matter.
+
+    :param pocketCards: two cards as accepted by :obj:`CardSet`
+    :param board: zero, three, four or five board cards
+    :return: integer between 0 and :obj:`numCanonical` of the street
+    """
+    hole = [_toInt(card) for card in pocketCards]
+    board = [_toInt(card) for card in board]
+    if len(hole) != 2 or len(set(hole + board)) != len(hole) + len(board):
+        raise ValueError("Pocket cards {} and board {} are no hand".format(
+            pocketCards, board))
+    tables = _isomorphismTables(len(board))
+    holeMasks, boardMasks = [0]*4, [0]*4
+    for card in hole:
+        holeMasks[card // 13] |= 1 << card % 13
+    for card in board:
+        boardMasks[card // 13] |= 1 << card % 13
+    suits = sorted((-bin(holeMasks[s]).count('1'),
+                    -bin(boardMasks[s]).count('1'),
+                    _suitIndex(holeMasks[s], boardMasks[s]))
+                   for s in range(4))
+    config = tuple((-h, -b) for h, b, _ in suits)
+    i = tables.configIndex[config]
+    index, pos = 0, 0
+    for numHole, numBoard, numSuits, _, groupSize in tables.groups[i]:
+        # multiset of the suit indices as strictly increasing numbers
+        rank = sum(_choose(suitIndex + k, k + 1) for k, (_, _, suitIndex)
+                   in enumerate(suits[pos:pos + numSuits]))
+        index = index*groupSize + rank
+        pos += numSuits
+    return tables.offsets[i] + index
+
+
+def canonicalHand(index, numBoard=0):
+    """
+    Inverse of :obj:`canonicalIndex`.
+
+    :param index: index of :obj:`canonicalIndex`
+    :param numBoard: number of board cards
+    :return: tuple of the pocket cards and the board cards of a
+             representative of the index, both as lists of integers of
+             :obj:`cardToInt` in ascending order
+    """
+    tables = _isomorphismTables(numBoard)
+    if not 0 <= index < tables.size:
+        raise ValueError("{} is no index of {} board cards".format(
+            index, numBoard))
+    i = bisect.bisect_right(tables.offsets, index) - 1
+    index -= tables.offsets[i]
+    ranks = []
+    for numHole, numBoard, numSuits, suitSize, groupSize in \
+            reversed(tables.groups[i]):
+        index, rank = divmod(index, groupSize)
+        suitIndices = [number - k for k, number in enumerate(reversed(
+            _unrankColex(rank, numSuits, suitSize + numSuits - 1)))]
+        ranks[:0] = [_suitRanks(suitIndex, numHole, numBoard)
+                     for suitIndex in suitIndices]
+    hole, board = [], []
+    for suit, (holeRanks, boardRanks) in enumerate(ranks):
+        hole.extend(13*suit + rank for rank in holeRanks)
+        board.extend(13*suit + rank for rank in boardRanks)
+    return sorted(hole), sorted(board)
+
+
+def canonicalize(pocketCards, board=()):
+    """
+    Finds the representative of pocket cards and board cards among all
+    permutations of their suits.
+
+    :param pocketCards: two cards as accepted by :obj:`CardSet`
+    :param board: zero, three, four or five board cards
+    :return: tuple of the pocket cards and the board cards as lists of
+             integers of :obj:`cardToInt`
+    """
+    board = list(board)
+    return canonicalHand(canonicalIndex(pocketCards, board), len(board))
+
+
+def numCanonical(numBoard=0):
+    """
+    :param numBoard: number of board cards
+    :return: number of hands distinct with respect to permutations of the
+             suits, e.g. 169 preflop
+    """
+    return _isomorphismTables(numBoard).size
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed preflop equities in a file mapped into memory.
+
+The tables hold the equity of each of the 169 classes of pocket cards, like
+``AKs`` or ``T9o``, against one up to nine random opponents and the equity of
+each of the 1326 pocket cards against every other. They are generated once
+by :obj:`buildTables` or the ``pokerth_preflop`` command and looked up by the
+integers of :obj:`~.cardToInt` as in the ``plainCards`` of a
+``HandStartMessage``, e.g.::
+
+    tables = PreflopTables('preflop.tbl')
+    cards = [msg.plainCards.plainCard1, msg.plainCards.plainCard2]
+    equity = tables.equity(cards, numOpponents=3)
+
+The file consists of::
+
+    header:   magic 'PTHPRE', version (uint16), maximum number of opponents
+              (uint16), trials per class and per pair of pocket cards
+              (2 x uint32)
+    classes:  169 x maximum number of opponents equities
+    matchups: 1326 x 1326 equities, zero for pocket cards sharing a card
+
+Equities are stored as little endian uint16 scaled by 65535. Matchups are
+computed once for each pair of pocket cards that is distinct with respect to
+permutations of the suits. This module requires NumPy.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import sys
+import time
+import struct
+import argparse
+from itertools import permutations
+
+import numpy as np
+
+from .poker import ranks, evaluateMany
+from .equity import COMBOS, comboIndex, monteCarloEquity
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+MAGIC = b'PTHPRE'
+VERSION = 1
+HEADER = struct.Struct('!6sHHII')
+NUM_CLASSES = 169
+SCALE = 65535
+DTYPE = np.dtype('<u2')
+
+
+class PreflopError(Exception):
+    """
+    Raised if a file holds no preflop tables
+    """
+    pass
+
+
+def handClass(card1, card2):
+    """
+    Class of pocket cards in a 13 x 13 grid of the ranks with pairs on the
+    diagonal, suited cards above and offsuit cards below.
+
+    :param card1: card as integer of :obj:`~.cardToInt`
+    :param card2: another card as integer
+    :return: index between 0 and 168
+    """
+    rank1, rank2 = card1 % 13, card2 % 13
+    high, low = max(rank1, rank2), min(rank1, rank2)
+    if card1 // 13 == card2 // 13:
+        return 13*high + low
+    return 13*low + high
+
+
+def handClassName(index):
+    """
+    :param index: class of :obj:`handClass`
+    :return: name of the class like ``AA``, ``AKs`` or ``T9o``
+    """
+    row, col = divmod(index, 13)
+    if row == col:
+        return ranks[row]*2
+    if row > col:
+        return ranks[row] + ranks[col] + 's'
+    return ranks[col] + ranks[row] + 'o'
+
+
+def classCards(index):
+    """
+    :param index: class of :obj:`handClass`
+    :return: pocket cards of the class as integers of :obj:`~.cardToInt`
+    """
+    row, col = divmod(index, 13)
+    if row == col:
+        return [row, row + 13]
+    if row > col:
+        return [row, col]
+    return [col, row + 13]
+
+
+def drawBoards(rng, known):
+    """
+    Draws five board cards for each row of known cards.
+
+    :param rng: random state (:obj:`numpy.random.RandomState`)
+    :param known: array of shape (number of boards, any) of cards not to draw
+    :return: array of shape (number of boards, 5)
+    """
+    boards = np.empty((len(known), 5), dtype=np.intp)
+    todo = np.arange(len(known))
+    while len(todo):
+        drawn = rng.randint(0, 52, (len(todo), 5))
+        cards = np.sort(drawn, axis=1)
+        valid = (cards[:, 1:] != cards[:, :-1]).all(axis=1) & \
+            ~(drawn[:, :, np.newaxis] ==
+              known[todo, np.newaxis, :]).any(axis=(1, 2))
+        boards[todo[valid]] = drawn[valid]
+        todo = todo[~valid]
+    return boards
+
+
+def matchupEquities(hands, others, trials, rng, chunkSize=1 << 20):
+    """
+    Estimates the equities of pocket cards against other pocket cards.
+
+    :param hands: array of shape (number of matchups, 2) of pocket cards
+    :param others: array of the same shape of the pocket cards against
+    :param trials: number of boards for each matchup
+    :param rng: random state (:obj:`numpy.random.RandomState`)
+    :param chunkSize: maximum number of boards ranked at once
+    :return: array of equities
+    """
+    result = np.empty(len(hands))
+    step = max(chunkSize//trials, 1)
+    for start in range(0, len(hands), step):
+        hand = np.repeat(hands[start:start + step], trials, axis=0)
+        other = np.repeat(others[start:start + step], trials, axis=0)
+        boards = drawBoards(rng, np.hstack([hand, other]))
+        mine = evaluateMany(np.hstack([hand, boards]))
+        theirs = evaluateMany(np.hstack([other, boards]))
+        shares = (mine > theirs) + 0.5*(mine == theirs)
+        result[start:start + step] = shares.reshape(-1, trials).mean(axis=1)
+    return result
+
+
+def canonicalMatchups():
+    """
+    Finds the pairs of pocket cards that are distinct with respect to
+    permutations of the suits.
+
+    :return: tuple of an array of shape (number of distinct matchups, 4) of
+             the cards of a representative of each and an array of shape
+             (1326, 1326) of the number of the distinct matchup of each pair
+             of pocket cards, -1 if they share a card
+    """
+    i, j = np.meshgrid(np.arange(len(COMBOS)), np.arange(len(COMBOS)),
+                       indexing='ij')
+    cards = np.hstack([COMBOS[i.ravel()], COMBOS[j.ravel()]])
+    valid = (cards[:, :2, np.newaxis] !=
+             cards[:, np.newaxis, 2:]).all(axis=(1, 2))
+    cards = cards[valid]
+    keys = None
+    for perm in permutations(range(4)):
+        mapping = np.array([c % 13 + 13*perm[c // 13] for c in range(52)])
+        mapped = mapping[cards]
+        hand = np.sort(mapped[:, :2], axis=1)
+        other = np.sort(mapped[:, 2:], axis=1)
+        key = ((hand[:, 0]*52 + hand[:, 1])*52 + other[:, 0])*52 + other[:, 1]
+        keys = key if keys is None else np.minimum(keys, key)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    reps = np.column_stack([unique // 52**3, unique // 52**2 % 52,
+                            unique // 52 % 52, unique % 52])
+    index = np.full(len(COMBOS)**2, -1, dtype=np.intp)
+    index[np.flatnonzero(valid)] = inverse
+    return reps, index.reshape(len(COMBOS), len(COMBOS))
+
+
+def buildTables(path, trials=20000, handTrials=1000, maxOpponents=9,
+                seed=None):
+    """
+    Computes the preflop tables by Monte Carlo and writes them.
+
+    :param path: path of the file
+    :param trials: trials for each class and number of opponents
+    :param handTrials: boards for each distinct pair of pocket cards
+    :param maxOpponents: maximum number of opponents
+    :param seed: seed of the random numbers
+    """
+    rng = np.random.RandomState(seed)
+    classes = np.empty((NUM_CLASSES, maxOpponents))
+    for index in range(NUM_CLASSES):
+        for numOpponents in range(1, maxOpponents + 1):
+            classes[index, numOpponents - 1] = monteCarloEquity(
+                classCards(index), numOpponents=numOpponents, trials=trials,
+                seed=rng).equity
+    reps, index = canonicalMatchups()
+    equities = matchupEquities(reps[:, :2], reps[:, 2:], handTrials, rng)
+    matchups = np.where(index >= 0, equities[index], 0.)
+    with open(path, 'wb') as fh:
+        fh.write(HEADER.pack(MAGIC, VERSION, maxOpponents, trials,
+                             handTrials))
+        for table in (classes, matchups):
+            fh.write(np.round(table*SCALE).astype(DTYPE).tobytes())
+
+
+class PreflopTables(object):
+    """
+    Preflop tables of a file mapped into memory.
+
+    :param path: path of the file written by :obj:`buildTables`
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            header = fh.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise PreflopError("{} holds no preflop tables".format(path))
+        magic, version, self.maxOpponents, self.trials, self.handTrials = \
+            HEADER.unpack(header)
+        if magic != MAGIC:
+            raise PreflopError("{} holds no preflop tables".format(path))
+        if version != VERSION:
+            raise PreflopError("Unsupported version {}".format(version))
+        self._classes = np.memmap(path, DTYPE, 'r', HEADER.size,
+                                  (NUM_CLASSES, self.maxOpponents))
+        self._matchups = np.memmap(
+            path, DTYPE, 'r', HEADER.size + self._classes.nbytes,
+            (len(COMBOS), len(COMBOS)))
+
+    def close(self):
+        del self._classes, self._matchups
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def equity(self, cards, numOpponents=1):
+        """
+        Equity of pocket cards against random opponents.
+
+        :param cards: two cards as integers of :obj:`~.cardToInt`
+        :param numOpponents: number of opponents
+        :return: equity
+        """
+        assert 1 <= numOpponents <= self.maxOpponents
+        card1, card2 = cards
+        return self._classes[handClass(card1, card2),
+                             numOpponents - 1]/SCALE
+
+    def classEquities(self, numOpponents=1):
+        """
+        :param numOpponents: number of opponents
+        :return: array of the equities of the classes of :obj:`handClass`
+        """
+        return self._classes[:, numOpponents - 1]/SCALE
+
+    def handVsHand(self, cards, otherCards):
+        """
+        Equity of pocket cards against other pocket cards.
+
+        :param cards: two cards as integers of :obj:`~.cardToInt`
+        :param otherCards: two other cards
+        :return: equity
+        """
+        if set(cards) & set(otherCards):
+            raise ValueError("Pocket cards {} and {} share a card".format(
+                cards, otherCards))
+        return self._matchups[comboIndex(*cards),
+                              comboIndex(*otherCards)]/SCALE
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description="Generate tables of preflop equities")
+    parser.add_argument('output', help="file of the tables")
+    parser.add_argument('--trials', type=int, default=20000,
+                        help="trials for each class and number of opponents")
+    parser.add_argument('--hand-trials', type=int, default=1000,
+                        help="boards for each pair of pocket cards")
+    parser.add_argument('--max-opponents', type=int, default=9,
+                        help="maximum number of opponents")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed of the random numbers")
+    return parser.parse_args(args)
+
+
+def main(args):
+    args = parse_args(args)
+    start = time.time()
+    buildTables(args.output, args.trials, args.hand_trials,
+                args.max_opponents, args.seed)
+    print("Tables written to {} in {:.1f} s".format(args.output,
+                                                     time.time() - start))
+
+
+def run():
+    main(sys.argv[1:])
+
+
+if __name__ == '__main__':
+    run()
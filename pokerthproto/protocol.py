@@ -5,8 +5,7 @@ current state in the communication.
 """
 from __future__ import print_function, absolute_import, division
 
-from twisted.internet import reactor
-from twisted.python import log
+from twisted.internet import reactor, defer
 from twisted.internet.protocol import Protocol, ClientFactory
 
 from . import pokerth_pb2
@@ -14,32 +13,41 @@ from . import transport
 from . import lobby
 from . import game
 from . import poker
+from . import logger
+from .capture import Direction
 
 __author__ = 'Florian Wilhelm'
 __copyright__ = 'Florian Wilhelm'
 
 
 class PokerTHProtocol(Protocol):
-    _buffer = ''
-    _msgSize = None
+    # hook names indexed by message type, filled in below the class
+    _hooks = []
+    # gather outgoing messages of a reactor turn and write them at once
+    corked = False
+    # provider of callLater, e.g. the reactor
+    clock = reactor
+    # latency histograms of received messages (:obj:`~.MessageMetrics`)
+    metrics = None
+    # writer of all received and sent frames (:obj:`~.CaptureWriter`)
+    capture = None
+    # id of the connection in the capture
+    connId = 0
+
+    def __init__(self):
+        self._decoder = transport.FrameDecoder()
+        self._handlers = [getattr(self, hook) if hook is not None else None
+                          for hook in self._hooks]
+        self._pending = []
+        self._flushCall = None
+        self._waiters = {}
+        self._queues = []
+        # message type and arrival of the last received message to attribute
+        # the next sent message to
+        self._received = None
 
     def _getBufferedData(self, data):
-        self._buffer += data
-        bufData = []
-        while True:
-            if self._msgSize is None:
-                if len(self._buffer) >= 4:
-                    self._msgSize = transport.readSizeBytes(self._buffer[:4])
-                    self._buffer = self._buffer[4:]
-                else:
-                    break
-            if len(self._buffer) >= self._msgSize:
-                bufData.append(self._buffer[:self._msgSize])
-                self._buffer = self._buffer[self._msgSize:]
-                self._msgSize = None
-            else:
-                break
-        return bufData
+        return self._decoder.feed(data)
 
     @staticmethod
     def _getHook(msg_name):
@@ -47,35 +55,147 @@ class PokerTHProtocol(Protocol):
         return hook[0].lower() + hook[1:]
 
     def unhandledMessageReceived(self, msg):
-        log.msg('Received unhandled message {}:\n{}'.format(
-            msg.__class__.__name__, msg))
+        logger.dispatch.info('Received unhandled message {0.DESCRIPTOR.name}:'
+                             '\n{0}', msg)
 
     def connectionMade(self):
-        log.msg('Connection established.')
+        logger.wire.info('Connection established.')
 
     def dataReceived(self, data):
+        handlers = self._handlers
+        debug = (logger.wire.isEnabledFor(logger.Level.DEBUG) or
+                 logger.dispatch.isEnabledFor(logger.Level.DEBUG))
+        metrics = self.metrics
+        if metrics is not None:
+            timer = metrics.timer
+            arrival = timer()
+        capture = self.capture
         for buffer in self._getBufferedData(data):
-            msg = transport.develop(transport.unpack(buffer))
-            msg_name = msg.__class__.__name__
-            hook = self._getHook(msg_name)
-            #log.msg("Data: {}".format(buffer.encode('hex')))
-            log.msg("{} received".format(msg_name))
-            #log.msg(msg, logLevel=logging.DEBUG)
-            getattr(self, hook)(msg)
-
-    def _sendMessage(self, msg):
-        envelope = transport.envelop(msg)
-        self.transport.write(transport.pack(envelope))
+            if capture is not None:
+                capture.write(Direction.RECEIVED, self.connId, buffer)
+            envelope = transport.unpack(buffer)
+            msg = transport.develop(envelope)
+            if metrics is not None:
+                decoded = timer()
+            if debug:
+                logger.wire.debug("Data: {}", logger.Hex(buffer))
+                logger.dispatch.debug("{0.DESCRIPTOR.name} received:\n{0}",
+                                      msg)
+            if metrics is None:
+                handlers[envelope.messageType](msg)
+            else:
+                msgType = envelope.messageType
+                self._received = (msgType, arrival)
+                handlers[msgType](msg)
+                metrics.recordReceived(msgType, arrival, decoded, timer())
+            if self._waiters or self._queues:
+                self._notify(envelope.messageType, msg)
+
+    def _notify(self, msgType, msg):
+        for queue in self._queues:
+            queue.put(msg)
+        for d in self._waiters.pop(msgType, []):
+            d.callback(msg)
+
+    def waitFor(self, msgClass):
+        """
+        Waits for the next message of a given type.
 
-    def connectionLost(self, reason):
-        log.msg('Connection lost due to: {}'.format(reason))
+        The returned deferred fires after the message was handled by its
+        ``*Received`` method, e.g. inside an :obj:`~.inlineCallbacks`
+        decorated method::
+
+            msg = yield self.waitFor(pokerth_pb2.JoinGameAckMessage)
+
+        :param msgClass: class of a PokerTH message
+        :return: :obj:`~.Deferred` firing with the message
+        """
+        d = defer.Deferred()
+        msgType = transport.getMsgType(msgClass)
+        self._waiters.setdefault(msgType, []).append(d)
+        return d
+
+    def addMessageQueue(self):
+        """
+        Creates a queue that receives all subsequent messages, e.g.::
+
+            queue = self.addMessageQueue()
+            while True:
+                msg = yield queue.get()
+
+        :return: :obj:`~.DeferredQueue` of messages
+        """
+        queue = defer.DeferredQueue()
+        self._queues.append(queue)
+        return queue
 
+    def removeMessageQueue(self, queue):
+        """
+        Stops passing messages to a queue of :obj:`addMessageQueue`.
+
+        :param queue: :obj:`~.DeferredQueue` of messages
+        """
+        self._queues.remove(queue)
 
-# Set default method for all possible message types
-for msg_type in pokerth_pb2.PokerTHMessage.PokerTHMessageType.keys():
+    def _sendMessage(self, msg, flush=False):
+        """
+        Sends a message or queues it in corked mode.
+
+        :param msg: PokerTH message object
+        :param flush: write all queued messages immediately in corked mode
+        """
+        data = transport.pack(transport.envelop(msg))
+        logger.dispatch.debug("{0.DESCRIPTOR.name} sent:\n{0}", msg)
+        if self._received is not None:
+            msgType, arrival = self._received
+            self._received = None
+            self.metrics.recordResponse(msgType, arrival,
+                                        self.metrics.timer())
+        if self.capture is not None:
+            self.capture.write(Direction.SENT, self.connId,
+                               memoryview(data)[4:])
+        if not self.corked:
+            self.transport.write(data)
+            return
+        self._pending.append(data)
+        if flush:
+            self.flush()
+        elif self._flushCall is None:
+            self._flushCall = self.clock.callLater(0, self.flush)
+
+    def flush(self):
+        """
+        Writes all messages queued in corked mode with a single write.
+        """
+        if self._flushCall is not None:
+            if self._flushCall.active():
+                self._flushCall.cancel()
+            self._flushCall = None
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self.transport.writeSequence(pending)
+
+    def connectionLost(self, reason):
+        if self._flushCall is not None and self._flushCall.active():
+            self._flushCall.cancel()
+        self._flushCall = None
+        self._pending = []
+        waiters, self._waiters = self._waiters, {}
+        for ds in waiters.values():
+            for d in ds:
+                d.errback(reason)
+        logger.wire.info('Connection lost due to: {}', reason)
+
+
+# Set default method for all possible message types and remember the hook
+# of each message type for the dispatch table of a protocol instance
+_msgTypes = pokerth_pb2.PokerTHMessage.PokerTHMessageType.items()
+PokerTHProtocol._hooks = [None]*(max(v for _, v in _msgTypes) + 1)
+for msg_type, msg_num in _msgTypes:
     msg_name = msg_type.split("_", 1)[1]
     hook = PokerTHProtocol._getHook(msg_name)
     setattr(PokerTHProtocol, hook, PokerTHProtocol.unhandledMessageReceived)
+    PokerTHProtocol._hooks[msg_num] = hook
 
 
 class States(object):
@@ -107,13 +227,12 @@ class ClientProtocol(PokerTHProtocol):
             raise NotImplementedError("Handle authentication!")
         assert reply.IsInitialized()
         self._sendMessage(reply)
-        log.msg("InitMessage sent")
 
     def initAckReceived(self, msg):
         self.factory.playerId = msg.yourPlayerId
         self.factory.sessionId = msg.yourSessionId
         self.state = States.LOBBY
-        reactor.callLater(1, self.handleInsideLobby, self.factory.lobby)
+        self.clock.callLater(1, self.handleInsideLobby, self.factory.lobby)
 
     def handleInsideLobby(self, lobbyInfo):
         """
@@ -130,7 +249,6 @@ class ClientProtocol(PokerTHProtocol):
         msg.gameId = gameId
         msg.autoLeave = autoLeave
         self._sendMessage(msg)
-        log.msg("JoinExistingGameMessage sent")
 
     def sendJoinNewGame(self, gameInfo, password=None, autoLeave=False):
         msg = pokerth_pb2.JoinNewGameMessage()
@@ -139,7 +257,6 @@ class ClientProtocol(PokerTHProtocol):
             msg.password = password
         msg.autoLeave = autoLeave
         self._sendMessage(msg)
-        log.msg("JoinNewGameMessage sent")
 
     def playerListReceived(self, msg):
         if msg.playerListNotification == msg.playerListNew:
@@ -147,7 +264,6 @@ class ClientProtocol(PokerTHProtocol):
             reply = pokerth_pb2.PlayerInfoRequestMessage()
             reply.playerId.append(msg.playerId)
             self._sendMessage(reply)
-            log.msg("InfoRequestMessage sent")
         else:  # msg.playerListLeft
             self.factory.lobby.delPlayer(msg.playerId)
 
@@ -192,6 +308,9 @@ class ClientProtocol(PokerTHProtocol):
         self.state = States.GAME_JOINED
 
     def gameListUpdateReceived(self, msg):
+        if msg.gameMode == pokerth_pb2.netGameClosed:
+            self.factory.lobby.delGameInfo(msg.gameId)
+            return
         gameInfo = self.factory.lobby.getGameInfo(msg.gameId)
         gameInfo.gameMode = msg.gameMode
 
@@ -202,7 +321,6 @@ class ClientProtocol(PokerTHProtocol):
             msg.startEventType = startEventType
         msg.fillWithComputerPlayers = fillWithBots
         self._sendMessage(msg)
-        log.msg("StartEventMessage sent")
 
     def startEventReceived(self, msg):
         assert self.factory.game.gameId == msg.gameId
@@ -211,7 +329,6 @@ class ClientProtocol(PokerTHProtocol):
         reply = pokerth_pb2.StartEventAckMessage()
         reply.gameId = msg.gameId
         self._sendMessage(reply)
-        log.msg("StartEventAckMessage sent")
         self.state = States.GAME_STARTED
 
     def chatReceived(self, msg):
@@ -244,7 +361,6 @@ class ClientProtocol(PokerTHProtocol):
         if playerId is not None:
             msg.targetPlayerId = playerId
         self._sendMessage(msg)
-        log.msg("ChatRequestMessage sent")
 
     def handleChat(self, chatType, text, lobbyInfo, gameInfo=None,
                    playerInfo=None):
@@ -267,8 +383,8 @@ class ClientProtocol(PokerTHProtocol):
             log_str += '{player} '
             playerInfo = playerInfo.name
         log_str += '[{type}]: {text}'
-        log.msg(log_str.format(game=gameInfo, player=playerInfo,
-                               type=chatType, text=text))
+        logger.lobby.info(log_str, game=gameInfo, player=playerInfo,
+                          type=chatType, text=text)
 
     def gameStartInitialReceived(self, msg):
         game = self.factory.game
@@ -286,7 +402,7 @@ class ClientProtocol(PokerTHProtocol):
         cards = (msg.plainCards.plainCard1, msg.plainCards.plainCard2)
         game.pocketCards = [poker.intToCard(card) for card in cards]
         # TODO: Handle Seatstates
-        log.msg("Got cards {}".format(game.pocketCards))
+        logger.game.info("Got cards {}", game.pocketCards)
 
     def playersActionDoneReceived(self, msg):
         game = self.factory.game
@@ -299,6 +415,18 @@ class ClientProtocol(PokerTHProtocol):
         game.minimumRaise = msg.minimumRaise
         player = game.getPlayer(msg.playerId)
         player.money = msg.playerMoney
+        self.handleAction(game.currRoundInfo.actions[-1], game)
+
+    def handleAction(self, actionInfo, gameInfo):
+        """
+        Handle an action of a player, including my own, after the game
+        information was updated.
+
+        :param actionInfo: action (:obj:`~.ActionInfo`) with the total bet of
+                           the player in the betting round as money
+        :param gameInfo: game information (:obj:`~.Game`)
+        """
+        pass
 
     def playersTurnReceived(self, msg):
         game = self.factory.game
@@ -329,7 +457,7 @@ class ClientProtocol(PokerTHProtocol):
         msg.gameId = game.gameId
         msg.handNum = game.handNum
         msg.gameState = game.currRound
-        self._sendMessage(msg)
+        self._sendMessage(msg, flush=True)
 
     def yourActionRejected(self, msg):
         raise RuntimeError("Wrong action taken:\n{}".format(msg))
@@ -341,7 +469,7 @@ class ClientProtocol(PokerTHProtocol):
         :param playerInfo: player information (:obj:`~.Player`)
         :param gameInfo: game information (:obj:`~.Game`)
         """
-        log.msg("Turn of player {}".format(playerInfo.name))
+        logger.game.debug("Turn of player {}", playerInfo.name)
 
     def handleMyTurn(self, gameInfo):
         """
@@ -354,6 +482,9 @@ class ClientProtocol(PokerTHProtocol):
     def dealFlopCardsReceived(self, msg):
         game = self.factory.game
         assert game.gameId == msg.gameId
+        # Blinds might have put everyone all-in without any turn in Preflop
+        if game.currRound in poker.poker_rounds[:2]:
+            game.addRound(poker.Round.PREFLOP)
         assert game.currRound == poker.Round.PREFLOP
         card1 = poker.intToCard(msg.flopCard1)
         card2 = poker.intToCard(msg.flopCard2)
@@ -424,14 +555,14 @@ class ClientProtocol(PokerTHProtocol):
 
         :param gameInfo: game information (:obj:`~.Game`)
         """
-        log.msg("End of hand {}".format(gameInfo.handNum))
+        logger.game.info("End of hand {}", gameInfo.handNum)
 
     def endOfGameReceived(self, msg):
         game = self.factory.game
         assert game.gameId == msg.gameId
         winner = game.getPlayer(msg.winnerPlayerId)
         self.state = States.GAME_JOINED
-        reactor.callLater(1, self.handleEndOfGame, game, winner)
+        self.clock.callLater(1, self.handleEndOfGame, game, winner)
 
     def handleEndOfGame(self, gameInfo, winner):
         """
@@ -442,9 +573,8 @@ class ClientProtocol(PokerTHProtocol):
         :param gameInfo: game information (:obj:`~.Game`)
         :param winner: winner of the game (:obj:`~.Player`)
         """
-        log.msg("End of game {}\n"
-                "Winner: {}".format(gameInfo.handNum,
-                                    winner.name))
+        logger.game.info("End of game {}\n"
+                         "Winner: {}", gameInfo.handNum, winner.name)
 
 
 class ClientProtocolFactory(ClientFactory):
@@ -1,61 +1,299 @@
 # -*- coding: utf-8 -*-
 """
-A PokerTH proxy that logs all messages between a PokerTH client and server.
+A PokerTH proxy forwarding all messages between a PokerTH client and server.
+
+Data is forwarded as soon as it arrives. By default the proxy does nothing
+else. Logging is opt-in with a :obj:`~.FrameMonitor` that decodes and logs the
+messages off the path in a process or thread of its own. Only the framing is
+done on the way then and if the monitor cannot keep up, frames are dropped
+instead of delaying the forwarding. Additionally, all frames can be written to
+a binary capture file with a :obj:`~.CaptureWriter`.
 """
 
 from __future__ import print_function, absolute_import, division
 
+import os
+import threading
+import multiprocessing
+from Queue import Queue, Full
+
 from twisted.internet import reactor
-from twisted.python import log
 from twisted.internet.protocol import Factory
 from twisted.internet.endpoints import TCP4ClientEndpoint
 
 from . import transport
 from . import protocol
+from . import logger
+from . import capture
 
 __author__ = 'Florian Wilhelm'
 __copyright__ = 'Florian Wilhelm'
 
+# sender of a frame passing the proxy by its direction
+SENDERS = {capture.Direction.FROM_CLIENT: 'client',
+           capture.Direction.FROM_SERVER: 'server'}
+
+
+def logFrame(direction, connId, frame):
+    """
+    Default handler of a :obj:`~.FrameMonitor` decoding and logging a frame.
+
+    :param direction: direction of :obj:`~.Direction`
+    :param connId: id of the proxied connection
+    :param frame: frame without size prefix as string
+    """
+    logger.wire.debug("Data: {}", logger.Hex(frame))
+    if logger.dispatch.isEnabledFor(logger.Level.INFO):
+        msg = transport.develop(transport.unpack(frame))
+        logger.dispatch.info("{0.DESCRIPTOR.name} from {1} {2}:\n{0}",
+                             msg, SENDERS[direction], connId)
+
+
+def _handleFrames(queue, handler, handled, niceness=0):
+    """
+    Loop of the background thread or process of a :obj:`~.FrameMonitor`.
+    """
+    if niceness:
+        os.nice(niceness)
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        try:
+            handler(*item)
+        except Exception as e:
+            logger.wire.error("Handling of frame failed: {!r}", e)
+        with handled.get_lock():
+            handled.value += 1
+
+
+class FrameMonitor(object):
+    """
+    Hands frames over to a handler running in a background process or thread.
+
+    The queue of frames is bounded. When it is full, new frames are dropped
+    and counted in ``dropped``. With ``sampleEvery`` set to n only every n-th
+    frame is queued at all.
+
+    Decoding and formatting messages is CPU bound and holds the global
+    interpreter lock, thus a thread still delays the reactor. A process takes
+    the work off the reactor at the cost of pickling the frames.
+
+    :param handler: function called with direction, connection id and frame
+    :param maxSize: maximum number of queued frames
+    :param sampleEvery: queue only every n-th frame
+    :param process: boolean to use a process instead of a thread
+    :param niceness: increment of the niceness of the process to favor the
+                     forwarding on a busy machine
+    """
+    def __init__(self, handler=logFrame, maxSize=10000, sampleEvery=1,
+                 process=True, niceness=10):
+        self.handler = handler
+        self.niceness = niceness
+        self.sampleEvery = sampleEvery
+        self.process = process
+        if process:
+            self._queue = multiprocessing.Queue(maxSize)
+        else:
+            self._queue = Queue(maxSize)
+        self._handled = multiprocessing.Value('l', 0)
+        self._worker = None
+        self._skip = 0
+        self.seen = 0
+        self.dropped = 0
+
+    @property
+    def handled(self):
+        """
+        Number of frames passed to the handler
+        """
+        return self._handled.value
+
+    def start(self):
+        """
+        Starts the background process or thread.
+        """
+        if self._worker is not None:
+            return
+        args = (self._queue, self.handler, self._handled)
+        if self.process:
+            self._worker = multiprocessing.Process(
+                target=_handleFrames, args=args + (self.niceness,),
+                name='FrameMonitor')
+        else:
+            self._worker = threading.Thread(
+                target=_handleFrames, args=args, name='FrameMonitor')
+        self._worker.daemon = True
+        self._worker.start()
+
+    def stop(self):
+        """
+        Stops the background process or thread after all queued frames were
+        handled.
+        """
+        if self._worker is None:
+            return
+        self._queue.put(None)
+        self._worker.join()
+        self._worker = None
+
+    def put(self, direction, connId, frame):
+        """
+        Queues a frame without ever blocking.
+
+        :param direction: direction of :obj:`~.Direction`
+        :param connId: id of the proxied connection
+        :param frame: frame without size prefix as :obj:`memoryview`
+        """
+        self.seen += 1
+        if self.sampleEvery > 1:
+            self._skip = (self._skip + 1) % self.sampleEvery
+            if self._skip:
+                return
+        try:
+            self._queue.put_nowait((direction, connId, frame.tobytes()))
+        except Full:
+            self.dropped += 1
+
+
+class ClientProtocol(protocol.PokerTHProtocol):
+
+    def dataReceived(self, data):
+        factory = self.factory
+        factory.sendToClient(data)
+        monitor, writer = factory.monitor, factory.capture
+        if monitor is None and writer is None:
+            return
+        for buffer in self._getBufferedData(data):
+            if writer is not None:
+                writer.write(capture.Direction.FROM_SERVER, factory.connId,
+                             buffer)
+            if monitor is not None:
+                monitor.put(capture.Direction.FROM_SERVER, factory.connId,
+                            buffer)
+
+    def connectionLost(self, reason):
+        protocol.PokerTHProtocol.connectionLost(self, reason)
+        if self.factory.loseClient is not None:
+            self.factory.loseClient()
+
+
+class ClientProtocolFactory(Factory):
+    protocol = ClientProtocol
+
+    def __init__(self, sendToClient, monitor=None, connId=None,
+                 capture=None, loseClient=None):
+        self.sendToClient = sendToClient
+        self.monitor = monitor
+        self.connId = connId
+        self.capture = capture
+        # closes the connection to the client when the server is gone
+        self.loseClient = loseClient
+
 
 class ProxyProtocol(protocol.PokerTHProtocol):
 
     def connectionMade(self):
-        log.msg("Client connection established")
-        self.point = TCP4ClientEndpoint(reactor, "localhost", 7234)
-        client_factory = ClientProtocolFactory(self.sendToClient)
-        proto = self.point.connect(client_factory)
-        proto.addCallback(self.registerServer)
+        logger.wire.info("Client connection established")
+        factory = self.factory
+        self.connId = factory.nextConnId()
+        self.client_proto = None
+        self.closed = False
+        self._early = []
+        client_factory = factory.clientFactory(self.sendToClient,
+                                               factory.monitor, self.connId,
+                                               factory.capture,
+                                               self.loseClient)
+        proto = factory.connectServer(client_factory)
+        proto.addCallbacks(self.registerServer, self.serverFailed)
 
     def registerServer(self, proto):
+        if self.closed:
+            # the client left while the server connection was made
+            proto.transport.loseConnection()
+            return
         self.client_proto = proto
+        if self._early:
+            proto.transport.writeSequence(self._early)
+            self._early = []
+
+    def serverFailed(self, reason):
+        logger.wire.error("Connection to the server failed: {}",
+                          reason.getErrorMessage())
+        self.transport.loseConnection()
 
     def sendToClient(self, data):
         self.transport.write(data)
 
+    def loseClient(self):
+        self.transport.loseConnection()
+
     def dataReceived(self, data):
+        if self.client_proto is not None:
+            self.client_proto.transport.write(data)
+        else:
+            self._early.append(data)
+        monitor, writer = self.factory.monitor, self.factory.capture
+        if monitor is None and writer is None:
+            return
         for buffer in self._getBufferedData(data):
-            msg = transport.develop(transport.unpack(buffer))
-            log.msg("Data: {}".format(buffer.encode('hex')))
-            log.msg("{} from client:\n{}".format(msg.__class__.__name__, msg))
-        self.client_proto.transport.write(data)
+            if writer is not None:
+                writer.write(capture.Direction.FROM_CLIENT, self.connId,
+                             buffer)
+            if monitor is not None:
+                monitor.put(capture.Direction.FROM_CLIENT, self.connId,
+                            buffer)
+
+    def connectionLost(self, reason):
+        protocol.PokerTHProtocol.connectionLost(self, reason)
+        self.closed = True
+        self._early = []
+        if self.client_proto is not None:
+            self.client_proto.transport.loseConnection()
 
 
 class ProxyProtocolFactory(Factory):
+    """
+    Factory of the proxy.
+
+    :param host: host of the PokerTH server
+    :param port: port of the PokerTH server
+    :param monitor: monitor (:obj:`~.FrameMonitor`) decoding and logging the
+                    frames, only forwarding if :obj:`None`
+    :param capture: writer (:obj:`~.CaptureWriter`) of all frames
+    """
     protocol = ProxyProtocol
+    # factory of the connections to the server
+    clientFactory = ClientProtocolFactory
 
+    def __init__(self, host='localhost', port=7234, monitor=None,
+                 capture=None):
+        self.host = host
+        self.port = port
+        self.monitor = monitor
+        self.capture = capture
+        self._connIds = 0
 
-class ClientProtocol(protocol.PokerTHProtocol):
+    def nextConnId(self):
+        self._connIds += 1
+        return self._connIds
 
-    def dataReceived(self, data):
-        for buffer in self._getBufferedData(data):
-            msg = transport.develop(transport.unpack(buffer))
-            log.msg("Data: {}".format(buffer.encode('hex')))
-            log.msg("{} from server:\n{}".format(msg.__class__.__name__, msg))
-        self.factory.sendToClient(data)
+    def connectServer(self, clientFactory):
+        """
+        Connects to the PokerTH server.
 
+        :param clientFactory: factory of the connection to the server
+        :return: :obj:`~.Deferred` firing with the protocol
+        """
+        point = TCP4ClientEndpoint(reactor, self.host, self.port)
+        return point.connect(clientFactory)
 
-class ClientProtocolFactory(Factory):
-    protocol = ClientProtocol
+    def startFactory(self):
+        if self.monitor is not None:
+            self.monitor.start()
 
-    def __init__(self, sendToClient):
-        self.sendToClient = sendToClient
+    def stopFactory(self):
+        if self.monitor is not None:
+            self.monitor.stop()
+        if self.capture is not None:
+            self.capture.flush()
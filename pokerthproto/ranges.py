@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+"""
+Ranges of pocket cards narrowed by the observed actions of opponents.
+
+A :obj:`Range` holds a weight for each of the 1326 :obj:`~.COMBOS` of pocket
+cards. Combos holding known cards are removed and each action of a player
+multiplies the weights with the likelihood of the action given the combo as
+estimated by an :obj:`ActionModel`, i.e. a Bayesian update. A
+:obj:`RangeTracker` keeps a range for every opponent in the current hand and
+is fed by the :obj:`~.ClientProtocol.handleAction` hook, e.g.::
+
+    class PyClientProtocol(ClientProtocol):
+
+        tracker = RangeTracker(StrengthModel())
+
+        def handleAction(self, actionInfo, gameInfo):
+            self.tracker.observe(actionInfo, gameInfo)
+
+        def handleMyTurn(self, gameInfo):
+            result = self.tracker.equity(gameInfo, precision=0.01)
+
+This module requires NumPy.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import math
+
+import numpy as np
+
+from .poker import Action, CardSet, FULL_DECK, evaluateMany
+from .equity import (COMBOS, Equity, EquityError, LRUCache, comboIndex,
+                     comboRanks, drawCards, drawCombos, showdownShares,
+                     monteCarloEquity, opponentsInHand, zScore)
+from .preflop import handClass, handClassName
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+# indices of the 51 combos holding each card
+CARD_COMBOS = np.array([[comboIndex(card, other) for other in range(52)
+                         if other != card] for card in range(52)],
+                       dtype=np.intp)
+# class of handClass of each combo
+COMBO_CLASSES = np.array([handClass(card1, card2)
+                          for card1, card2 in COMBOS.tolist()], dtype=np.intp)
+_classIndex = dict((handClassName(i), i) for i in range(169))
+_disjoint = []
+
+
+def _disjointMatrix():
+    """
+    Matrix of the pairs of :obj:`~.COMBOS` without a common card
+    """
+    if not _disjoint:
+        holding = np.zeros((len(COMBOS), 52), dtype=np.float32)
+        holding[np.arange(len(COMBOS))[:, np.newaxis], COMBOS] = 1
+        _disjoint.append(np.dot(holding, holding.T) == 0)
+    return _disjoint[0]
+
+
+class Range(object):
+    """
+    Weights of all pocket cards a player may hold.
+
+    :param weights: array of the weights of :obj:`~.COMBOS`, all combos
+                    equally likely if omitted
+    """
+    def __init__(self, weights=None):
+        if weights is None:
+            weights = np.ones(len(COMBOS))
+        self._weights = np.array(weights, dtype=float)
+        assert self._weights.shape == (len(COMBOS),)
+
+    @classmethod
+    def fromHands(cls, hands):
+        """
+        Creates a range of classes of pocket cards.
+
+        :param hands: list of classes like ``AA``, ``AKs``, ``T9o`` or ``AK``
+                      for suited and offsuit cards
+        :return: range with the weight 1 for the combos of the classes
+        """
+        classes = []
+        for hand in hands:
+            if len(hand) == 2 and hand[0] != hand[1]:
+                names = [hand + 's', hand + 'o']
+            else:
+                names = [hand]
+            for name in names:
+                if name not in _classIndex:
+                    raise ValueError("{} is no class of pocket cards".format(
+                        hand))
+                classes.append(_classIndex[name])
+        return cls(np.in1d(COMBO_CLASSES, classes).astype(float))
+
+    @property
+    def weights(self):
+        return self._weights
+
+    @property
+    def total(self):
+        return self._weights.sum()
+
+    @property
+    def numCombos(self):
+        return int(np.count_nonzero(self._weights))
+
+    def copy(self):
+        return Range(self._weights)
+
+    def weight(self, cards):
+        """
+        :param cards: two cards as accepted by :obj:`~.CardSet`
+        :return: weight of the pocket cards
+        """
+        return self._weights[comboIndex(*CardSet(cards).toInts())]
+
+    def remove(self, cards):
+        """
+        Removes the combos holding any of the cards.
+
+        :param cards: cards as accepted by :obj:`~.CardSet`, e.g. the board
+        :return: the range itself
+        """
+        self._weights[CARD_COMBOS[CardSet(cards).toInts()]] = 0.
+        return self
+
+    def hold(self, cards):
+        """
+        Collapses the range to the combo of pocket cards, e.g. shown ones.
+
+        :param cards: two cards as accepted by :obj:`~.CardSet`
+        :return: the range itself
+        """
+        index = comboIndex(*CardSet(cards).toInts())
+        self._weights[:] = 0.
+        self._weights[index] = 1.
+        return self
+
+    def normalize(self):
+        """
+        Scales the weights to sum up to 1.
+
+        :return: the range itself
+        """
+        total = self.total
+        if not total > 0:
+            raise EquityError("Range without any combos left")
+        self._weights /= total
+        return self
+
+    def update(self, likelihoods):
+        """
+        Multiplies the weights with the likelihoods of an observation given
+        each combo and normalizes them, i.e. a Bayesian update.
+
+        :param likelihoods: array of the likelihoods of :obj:`~.COMBOS`
+        :return: the range itself
+        """
+        self._weights *= likelihoods
+        return self.normalize()
+
+    def equity(self, others, board=(), dead=(), **kwargs):
+        """
+        Equity against the ranges of opponents, see :obj:`rangeEquity`.
+        """
+        return rangeEquity(self, others, board, dead, **kwargs)
+
+    def __repr__(self):
+        return "Range({} combos)".format(self.numCombos)
+
+
+def rangeEquity(hero, others, board=(), dead=(), trials=100000,
+                precision=None, confidence=0.95, batchSize=10000, seed=None):
+    """
+    Computes the equity of a range against the ranges of opponents.
+
+    Heads-up on the river all pairs of combos are enumerated, otherwise the
+    combos are drawn by their weights and the board is completed at random.
+
+    :param hero: range (:obj:`Range`)
+    :param others: list of ranges of the opponents
+    :param board: zero to five board cards
+    :param dead: cards not in the deck anymore
+    :param trials: maximum number of trials
+    :param precision: half width of the confidence interval to stop at, run
+                      all trials if omitted
+    :param confidence: confidence level of the interval
+    :param batchSize: number of trials ranked at once
+    :param seed: seed of the random numbers or a
+                 :obj:`numpy.random.RandomState`
+    :return: equity (:obj:`~.Equity`), exact with the number of pairs of
+             combos as trials or estimated
+    """
+    board = CardSet(board)
+    known = board | dead
+    if len(board) > 5 or not others:
+        raise EquityError("Cannot deal board {} to {} opponents".format(
+            board, len(others)))
+    ranges = [r.copy().remove(known) for r in [hero] + list(others)]
+    for r in ranges:
+        if not r.total > 0:
+            raise EquityError("Range without any combos left")
+    if len(board) == 5 and len(others) == 1:
+        return _riverEquity(ranges[0].weights, ranges[1].weights, board)
+    cumWeights = [np.cumsum(r.weights) for r in ranges]
+    if isinstance(seed, np.random.RandomState):
+        rng = seed
+    else:
+        rng = np.random.RandomState(seed)
+    z = zScore(confidence)
+    remaining = np.array((FULL_DECK - known).toInts())
+    numBoard = 5 - len(board)
+    board = np.array(board.toInts(), dtype=np.intp)
+    total = totalSq = 0.
+    wins = ties = n = 0
+    stdError = float('inf')
+    while n < trials:
+        combos = drawCombos(rng, cumWeights, batchSize)
+        if not len(combos):
+            raise EquityError("Ranges collide")
+        combos = combos[:trials - n]
+        size = len(combos)
+        drawn = drawCards(rng, remaining, size, numBoard, exclude=combos)
+        boards = np.hstack([np.tile(board, (size, 1)), drawn])
+        ranks = np.array([evaluateMany(np.hstack([combos[:, i:i + 2],
+                                                  boards]))
+                          for i in range(0, combos.shape[1], 2)])
+        mine, opponents = ranks[0], ranks[1:]
+        shares = showdownShares(mine, opponents)
+        best = opponents.max(axis=0)
+        wins += int((mine > best).sum())
+        ties += int((mine == best).sum())
+        total += shares.sum()
+        totalSq += (shares**2).sum()
+        n += size
+        variance = max(totalSq/n - (total/n)**2, 0.)
+        stdError = math.sqrt(variance/n)
+        if precision is not None and z*stdError <= precision:
+            break
+    return Equity(total/n, wins/n, ties/n, stdError, n)
+
+
+def _riverEquity(weights, otherWeights, board):
+    """
+    Enumerates all pairs of combos of two ranges on a complete board.
+    """
+    mine, theirs = np.flatnonzero(weights), np.flatnonzero(otherWeights)
+    ranks = comboRanks(board)
+    pairs = np.outer(weights[mine], otherWeights[theirs]) * \
+        _disjointMatrix()[mine[:, np.newaxis], theirs]
+    total = pairs.sum()
+    if not total > 0:
+        raise EquityError("Ranges collide")
+    diff = ranks[mine][:, np.newaxis] - ranks[theirs]
+    win = pairs[diff > 0].sum()/total
+    tie = pairs[diff == 0].sum()/total
+    return Equity(win + tie/2, win, tie, 0., int(np.count_nonzero(pairs)))
+
+
+class ActionModel(object):
+    """
+    Likelihood of the actions of a player given their pocket cards. Overwrite
+    :obj:`likelihoods`.
+    """
+
+    def likelihoods(self, actionInfo, gameInfo):
+        """
+        :param actionInfo: action (:obj:`~.ActionInfo`) of a player
+        :param gameInfo: game information (:obj:`~.Game`) after the action
+        :return: array of the likelihoods of the action given each of the
+                 :obj:`~.COMBOS` or :obj:`None` if it tells nothing
+        """
+        raise NotImplementedError
+
+
+def _percentiles(values):
+    """
+    Shares of the values below each value, counting ties half
+    """
+    ordered = np.sort(values)
+    below = np.searchsorted(ordered, values, side='left')
+    above = np.searchsorted(ordered, values, side='right')
+    return (below + above)/(2*len(values))
+
+
+def _preflopScores():
+    """
+    Rough preflop strength of each class of :obj:`~.handClass`
+    """
+    scores = np.empty(169)
+    for index in range(169):
+        row, col = divmod(index, 13)
+        high, low = max(row, col), min(row, col)
+        if row == col:
+            scores[index] = 20 + 2*high
+        else:
+            gap = high - low - 1
+            scores[index] = 2*high + low + 3*(row > col) - min(gap, 4)
+    return scores
+
+
+class StrengthModel(ActionModel):
+    """
+    Players bet and raise the more likely the stronger their pocket cards,
+    the more so the bigger the bet, call with medium and check with weaker
+    ones.
+
+    The strength of a combo is its percentile among all combos, on the flop
+    and later by its hand with the board, preflop by a rough score of its
+    class or by the equities of :obj:`~.PreflopTables`.
+
+    :param steepness: how sharply the likelihoods change with the strength
+    :param floor: minimum likelihood of any action, e.g. for bluffs
+    :param tables: preflop tables (:obj:`~.PreflopTables`)
+    """
+    def __init__(self, steepness=10., floor=0.05, tables=None):
+        self.steepness = steepness
+        self.floor = floor
+        if tables is None:
+            scores = _preflopScores()
+        else:
+            scores = tables.classEquities(1)
+        self.preflop = _percentiles(scores[COMBO_CLASSES])
+        self._cache = LRUCache(64)
+
+    def strengths(self, board):
+        """
+        :param board: board cards (:obj:`~.CardSet`)
+        :return: array of the strengths of :obj:`~.COMBOS` between 0 and 1
+        """
+        if not board:
+            return self.preflop
+        strengths = self._cache.get(board.mask)
+        if strengths is None:
+            if len(board) == 5:
+                ranks = comboRanks(board)
+            else:
+                cards = np.tile(np.array(board.toInts(), dtype=np.intp),
+                                (len(COMBOS), 1))
+                ranks = evaluateMany(np.hstack([COMBOS, cards]))
+            strengths = _percentiles(ranks)
+            self._cache.put(board.mask, strengths)
+        return strengths
+
+    def likelihoods(self, actionInfo, gameInfo):
+        kind = actionInfo.kind
+        if kind in (Action.NONE, Action.FOLD):
+            return None
+        strengths = self.strengths(gameInfo.boardCardSet)
+        # size of the bet relative to the pot before
+        bet = actionInfo.money or 0
+        fraction = min(bet/max(gameInfo.pot - bet, 1), 1.)
+        if kind == Action.CHECK:
+            likely = 1 - 0.7*self._sigmoid(strengths - 0.8)
+        elif kind == Action.CALL:
+            likely = self._sigmoid(strengths - 0.3 - 0.3*fraction)
+        elif kind == Action.ALLIN:
+            likely = self._sigmoid(strengths - 0.9)
+        else:
+            likely = self._sigmoid(strengths - 0.5 - 0.4*fraction)
+        return self.floor + (1 - self.floor)*likely
+
+    def _sigmoid(self, x):
+        return 1/(1 + np.exp(-self.steepness*x))
+
+
+class RangeTracker(object):
+    """
+    Keeps a range for each opponent in the current hand of a game.
+
+    :param model: action model (:obj:`ActionModel`)
+    """
+    def __init__(self, model):
+        self.model = model
+        self.ranges = {}
+        self._hand = None
+
+    def _sync(self, gameInfo):
+        hand = (gameInfo.gameId, gameInfo.handNum)
+        if hand != self._hand:
+            self._hand = hand
+            self.ranges = dict((p.playerId, Range()) for p in gameInfo.players
+                               if p.playerId != gameInfo.myPlayerId)
+        known = gameInfo.pocketCardSet | gameInfo.boardCardSet | \
+            gameInfo.othersCardSet
+        for playerId, playerRange in self.ranges.items():
+            self._narrow(playerRange, playerId, gameInfo, known)
+
+    def _narrow(self, playerRange, playerId, gameInfo, known):
+        # a player who showed the cards holds them, all others cannot
+        cards = gameInfo.othersCards.get(playerId)
+        if cards is not None:
+            return playerRange.hold(cards)
+        return playerRange.remove(known)
+
+    def observe(self, actionInfo, gameInfo):
+        """
+        Narrows the range of the player of an action.
+
+        :param actionInfo: action (:obj:`~.ActionInfo`)
+        :param gameInfo: game information (:obj:`~.Game`) after the action
+        """
+        self._sync(gameInfo)
+        playerRange = self.ranges.get(actionInfo.player.playerId)
+        if playerRange is None:
+            return
+        likelihoods = self.model.likelihoods(actionInfo, gameInfo)
+        if likelihoods is not None:
+            playerRange.update(likelihoods)
+
+    def getRange(self, gameInfo, playerId):
+        """
+        :param gameInfo: game information (:obj:`~.Game`)
+        :param playerId: id of an opponent
+        :return: range (:obj:`Range`) of the opponent in the current hand
+        """
+        self._sync(gameInfo)
+        if playerId not in self.ranges:
+            self.ranges[playerId] = self._narrow(
+                Range(), playerId, gameInfo,
+                gameInfo.pocketCardSet | gameInfo.boardCardSet |
+                gameInfo.othersCardSet)
+        return self.ranges[playerId]
+
+    def equity(self, gameInfo, **kwargs):
+        """
+        Estimates my equity against the ranges of the opponents still in the
+        hand.
+
+        :param gameInfo: game information (:obj:`~.Game`)
+        :param kwargs: further arguments of :obj:`~.monteCarloEquity`
+        :return: equity (:obj:`~.Equity`)
+        """
+        opponents = opponentsInHand(gameInfo)
+        ranges = [self.getRange(gameInfo, p.playerId).weights
+                  for p in opponents]
+        # only the cards shown by players out of the hand are dead
+        dead = gameInfo.othersCardSet
+        for opponent in opponents:
+            dead -= CardSet(gameInfo.othersCards.get(opponent.playerId, ()))
+        return monteCarloEquity(gameInfo.pocketCardSet,
+                                gameInfo.boardCardSet, dead=dead,
+                                ranges=ranges, **kwargs)
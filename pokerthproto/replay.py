@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Replay of recorded sessions into a protocol without any network.
+
+The frames a client received in a capture file are fed into a fresh protocol
+through a fake transport while a virtual clock, assigned to the ``clock`` of
+the protocol, follows the recorded timestamps. Thus delayed calls like the
+lobby and end of game delays of :obj:`~.ClientProtocol` fire at the recorded
+times. All frames the protocol writes are collected and can be compared to
+the frames sent in the recorded session, e.g.::
+
+    factory = PyClientProtocolFactory('PyClient1')
+    result = Replay(factory.buildProtocol(None)).run(
+        CaptureReader('client.cap'))
+    for diff in diffFrames(result.expected, result.sent):
+        print(diff)
+    print(result)
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import sys
+import time
+import argparse
+import importlib
+import timeit
+from collections import namedtuple
+
+from twisted.internet import task
+from twisted.test import proto_helpers
+
+from . import transport
+from . import logger
+from .capture import CaptureReader, Direction
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+# directions of the frames fed into the protocol and the frames expected back
+INBOUND = (Direction.RECEIVED, Direction.FROM_SERVER)
+OUTBOUND = (Direction.SENT, Direction.FROM_CLIENT)
+
+Frame = namedtuple('Frame', ['timestamp', 'frame'])
+Difference = namedtuple('Difference', ['index', 'expected', 'actual'])
+
+
+class ReplayResult(object):
+    """
+    Outcome of a replay.
+
+    :param received: number of replayed frames
+    :param elapsed: wall clock seconds of the replay
+    :param expected: frames (:obj:`~.Frame`) sent in the recorded session
+    :param sent: frames (:obj:`~.Frame`) sent by the protocol in the replay
+    """
+    def __init__(self, received, elapsed, expected, sent):
+        self.received = received
+        self.elapsed = elapsed
+        self.expected = expected
+        self.sent = sent
+
+    @property
+    def messagesPerSecond(self):
+        if not self.elapsed:
+            return float('inf')
+        return self.received/self.elapsed
+
+    def __str__(self):
+        return ("{} messages replayed in {:.3f} s ({:.0f} msg/s), "
+                "{} of {} frames sent".format(
+                    self.received, self.elapsed, self.messagesPerSecond,
+                    len(self.sent), len(self.expected)))
+
+
+class Replay(object):
+    """
+    Driver feeding the recorded frames of one connection into a protocol.
+
+    :param proto: fresh protocol, e.g. built by a
+                  :obj:`~.ClientProtocolFactory`
+    :param speed: factor of the recorded pace to replay with in wall clock
+                  time, as fast as possible if :obj:`None`
+    :param tail: virtual seconds to run the clock after the last frame to
+                 fire pending delayed calls
+    :param sleep: function to wait a number of seconds when pacing
+    """
+    def __init__(self, proto, speed=None, tail=5., sleep=time.sleep):
+        self.proto = proto
+        self.speed = speed
+        self.tail = tail
+        self.sleep = sleep
+        self.clock = task.Clock()
+        self.transport = proto_helpers.StringTransport()
+        self._decoder = transport.FrameDecoder()
+        self.sent = []
+
+    def _collect(self):
+        data = self.transport.value()
+        if not data:
+            return
+        self.transport.clear()
+        now = self.clock.seconds()
+        self.sent.extend(Frame(now, buffer.tobytes())
+                         for buffer in self._decoder.feed(data))
+
+    def _advance(self, until):
+        """
+        Advances the virtual clock step by step to fire all delayed calls in
+        order and collects the frames they write.
+        """
+        clock = self.clock
+        # the delayed calls of a clock are sorted by their time
+        calls = clock.getDelayedCalls()
+        while calls and calls[0].getTime() <= until:
+            clock.advance(max(calls[0].getTime() - clock.seconds(), 0.))
+            self._collect()
+            calls = clock.getDelayedCalls()
+        if until > clock.seconds():
+            clock.advance(until - clock.seconds())
+
+    def run(self, records, connId=None):
+        """
+        Replays the inbound frames of a capture.
+
+        :param records: iterable of records (:obj:`~.Record`), e.g. a
+                        :obj:`~.CaptureReader`
+        :param connId: id of the connection to replay, the first connection
+                       in the records if omitted
+        :return: result (:obj:`~.ReplayResult`)
+        """
+        proto, clock = self.proto, self.clock
+        proto.clock = clock
+        proto.makeConnection(self.transport)
+        self._collect()
+        expected = []
+        received = 0
+        start = None
+        timer = timeit.default_timer
+        begin = timer()
+        for record in records:
+            if connId is None:
+                connId = record.connId
+            elif record.connId != connId:
+                continue
+            if start is None:
+                start = record.timestamp
+            offset = record.timestamp - start
+            if record.direction in OUTBOUND:
+                expected.append(Frame(offset, record.frame))
+                continue
+            if record.direction not in INBOUND:
+                continue
+            if self.speed is not None:
+                delay = begin + offset/self.speed - timer()
+                if delay > 0:
+                    self.sleep(delay)
+            self._advance(offset)
+            proto.dataReceived(transport.makeSizeBytes(len(record.frame)) +
+                               record.frame)
+            received += 1
+            self._collect()
+        self._advance(clock.seconds() + self.tail)
+        elapsed = timer() - begin
+        return ReplayResult(received, elapsed, expected, self.sent)
+
+
+def _develop(frame):
+    try:
+        return transport.develop(transport.unpack(frame))
+    except Exception:
+        return frame
+
+
+def diffFrames(expected, actual):
+    """
+    Compares the frames sent in a replay to the recorded ones in order.
+
+    Frames are compared by their content, not their timestamps. Differing
+    frames are decoded to messages if possible.
+
+    :param expected: frames (:obj:`~.Frame`) of the recorded session
+    :param actual: frames (:obj:`~.Frame`) of the replay
+    :return: generator of differences (:obj:`~.Difference`) with the index
+             of the frame and the expected and actual message, :obj:`None` if
+             a frame is missing
+    """
+    for i in range(max(len(expected), len(actual))):
+        exp = expected[i].frame if i < len(expected) else None
+        act = actual[i].frame if i < len(actual) else None
+        if exp != act:
+            yield Difference(i,
+                             None if exp is None else _develop(exp),
+                             None if act is None else _develop(act))
+
+
+def loadFactory(path, nickName):
+    """
+    Creates a client factory given by its import path.
+
+    :param path: import path of a :obj:`~.ClientProtocolFactory` class like
+                 ``package.module:ClassName``
+    :param nickName: nick name of the player
+    :return: factory
+    """
+    module, name = path.split(':')
+    return getattr(importlib.import_module(module), name)(nickName)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description="Replay a recorded PokerTH session into a client")
+    parser.add_argument('capture', help="capture file")
+    parser.add_argument('--factory', required=True,
+                        help="client factory class as module:ClassName")
+    parser.add_argument('--nick', default='PyClient1',
+                        help="nick name of the player")
+    parser.add_argument('--conn-id', type=int, default=None,
+                        help="id of the connection to replay")
+    parser.add_argument('--speed', type=float, default=None,
+                        help="factor of the recorded pace, as fast as "
+                             "possible if omitted")
+    parser.add_argument('--mmap', action='store_true',
+                        help="map the capture file into memory")
+    parser.add_argument('--diff', action='store_true',
+                        help="print differences to the recorded frames")
+    return parser.parse_args(args)
+
+
+def main(args):
+    args = parse_args(args)
+    logger.setLevel(logger.Level.WARNING)
+    factory = loadFactory(args.factory, args.nick)
+    replay = Replay(factory.buildProtocol(None), speed=args.speed)
+    result = replay.run(CaptureReader(args.capture, useMmap=args.mmap),
+                        connId=args.conn_id)
+    if args.diff:
+        for diff in diffFrames(result.expected, result.sent):
+            print("Frame {0.index}:\nexpected {0.expected}\n"
+                  "actual {0.actual}".format(diff))
+    print(result)
+
+
+def run():
+    main(sys.argv[1:])
+
+
+if __name__ == '__main__':
+    run()
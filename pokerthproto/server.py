@@ -0,0 +1,785 @@
+# -*- coding: utf-8 -*-
+"""
+A stand-in PokerTH server running in-process for tests and benchmarks.
+
+It covers the handshake, the lobby, the creation and joining of games and the
+complete flow of poker hands including side pots and showdowns. Cards are
+dealt from a seeded random generator, thus a game is reproducible. Computer
+players simply check or call. Authentication, avatars, spectators, kicking
+and rejoining of games are not supported.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import random
+import functools
+
+from twisted.internet import reactor
+from twisted.internet.protocol import Factory
+
+from . import pokerth_pb2
+from . import protocol
+from . import poker
+from . import logger
+from .poker import Round, Action
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+class ServerPlayer(object):
+    """
+    A player on the server, either connected or a computer player.
+
+    :param playerId: id of the player
+    :param name: nickname of the player
+    :param proto: protocol of the connection or :obj:`None` for a computer
+                  player
+    """
+    def __init__(self, playerId, name, proto=None):
+        self.playerId = playerId
+        self.name = name
+        self.proto = proto
+        self.isHuman = proto is not None
+        self.away = False  # disconnected during a running game
+        self.game = None
+        self.seat = None
+        self.money = 0
+        self.cards = []
+        # state within a hand and a betting round
+        self.roundBet = 0
+        self.totalBet = 0
+        self.folded = False
+        self.acted = False
+
+    def send(self, msg):
+        if self.proto is not None:
+            self.proto._sendMessage(msg)
+
+    def resetHand(self):
+        self.cards = []
+        self.roundBet = 0
+        self.totalBet = 0
+        self.folded = False
+        self.acted = False
+
+    def bet(self, amount):
+        self.money -= amount
+        self.roundBet += amount
+        self.totalBet += amount
+
+
+class ServerGame(object):
+    """
+    A poker game on the server.
+
+    :param server: server factory (:obj:`~.ServerProtocolFactory`)
+    :param gameId: id of the game
+    :param gameInfo: settings of the game (:obj:`pokerth_pb2.NetGameInfo`)
+    :param admin: player that created the game (:obj:`~.ServerPlayer`)
+    :param password: optional password of the game
+    """
+    def __init__(self, server, gameId, gameInfo, admin, password=None):
+        self.server = server
+        self.gameId = gameId
+        self.gameInfo = pokerth_pb2.NetGameInfo()
+        self.gameInfo.CopyFrom(gameInfo)
+        self.admin = admin
+        self.password = password
+        self.mode = pokerth_pb2.netGameCreated
+        self.players = []
+        self.handNum = 0
+        self.dealer = None
+        self._rng = random.Random(server.rng.getrandbits(64))
+        self._acks = None
+        self._order = []
+        self._deck = []
+        self._board = []
+        self._street = None
+        self._smallBlind = 0
+        self._highestSet = 0
+        self._minimumRaise = 0
+        self._cardsShown = False
+        self._turn = None
+        self._timeout = None
+
+    @property
+    def isFull(self):
+        return len(self.players) >= self.gameInfo.maxNumPlayers
+
+    @property
+    def humans(self):
+        return [p for p in self.players if p.proto is not None]
+
+    def send(self, msg):
+        for player in self.players:
+            player.send(msg)
+
+    def addPlayer(self, player):
+        player.game = self
+        player.money = self.gameInfo.startMoney
+        self.players.append(player)
+
+    def delPlayer(self, player):
+        self.players.remove(player)
+        player.game = None
+        if player is self.admin and self.humans:
+            self.admin = self.humans[0]
+            msg = pokerth_pb2.GameAdminChangedMessage()
+            msg.gameId = self.gameId
+            msg.newAdminPlayerId = self.admin.playerId
+            self.send(msg)
+            msg = pokerth_pb2.GameListAdminChangedMessage()
+            msg.gameId = self.gameId
+            msg.newAdminPlayerId = self.admin.playerId
+            self.server.broadcast(msg)
+
+    def setAway(self, player):
+        """
+        Lets the server act for a player that disconnected during the game.
+
+        :param player: player (:obj:`~.ServerPlayer`)
+        """
+        player.away = True
+        if self._turn is player:
+            self._autoAction(player)
+
+    def start(self, fillWithComputerPlayers=False):
+        """
+        Asks all players of the game for their acknowledgement to start.
+
+        :param fillWithComputerPlayers: fill free seats with computer players
+        """
+        if self._acks is not None or self.mode != pokerth_pb2.netGameCreated:
+            return
+        if fillWithComputerPlayers:
+            while not self.isFull:
+                self.server.addComputerPlayer(self)
+        if len(self.players) < 2:
+            logger.game.warning("Game {} cannot start with less than two "
+                                "players", self.gameId)
+            return
+        msg = pokerth_pb2.StartEventMessage()
+        msg.gameId = self.gameId
+        msg.startEventType = msg.startEvent
+        msg.fillWithComputerPlayers = fillWithComputerPlayers
+        self._acks = set(p.playerId for p in self.humans)
+        self.send(msg)
+
+    def startEventAck(self, player):
+        if self._acks is None or self.mode != pokerth_pb2.netGameCreated:
+            return
+        self._acks.discard(player.playerId)
+        if not self._acks:
+            self._startGame()
+
+    def _startGame(self):
+        self.mode = pokerth_pb2.netGameStarted
+        msg = pokerth_pb2.GameListUpdateMessage()
+        msg.gameId = self.gameId
+        msg.gameMode = self.mode
+        self.server.broadcast(msg)
+        for seat, player in enumerate(self.players):
+            player.seat = seat
+        self.dealer = self._rng.randrange(len(self.players))
+        msg = pokerth_pb2.GameStartInitialMessage()
+        msg.gameId = self.gameId
+        msg.startDealerPlayerId = self.players[self.dealer].playerId
+        msg.playerSeats.extend(p.playerId for p in self.players)
+        self.send(msg)
+        self._startHand()
+
+    def _getSmallBlind(self):
+        info = self.gameInfo
+        smallBlind = info.firstSmallBlind
+        if info.raiseIntervalMode != info.raiseOnHandNum \
+                or not info.raiseEveryHands:
+            return smallBlind
+        manualBlinds = list(info.manualBlinds)
+        for _ in range((self.handNum - 1) // info.raiseEveryHands):
+            if manualBlinds:
+                smallBlind = manualBlinds.pop(0)
+            elif info.endRaiseMode == info.doubleBlinds:
+                smallBlind *= 2
+            elif info.endRaiseMode == info.raiseByEndValue:
+                smallBlind += info.endRaiseSmallBlindValue
+        return smallBlind
+
+    def _startHand(self):
+        self.handNum += 1
+        if self.handNum > 1:  # move dealer button like the client does
+            self.dealer = (self.dealer + 1) % len(self.players)
+        seats = self.players[self.dealer + 1:] + self.players[:self.dealer + 1]
+        self._order = [p for p in seats if p.money > 0]
+        self._deck = list(range(52))
+        self._rng.shuffle(self._deck)
+        self._board = []
+        self._cardsShown = False
+        for player in self.players:
+            player.resetHand()
+        for player in self._order:
+            player.cards = [self._deck.pop(), self._deck.pop()]
+        self._smallBlind = self._getSmallBlind()
+        seatStates = [pokerth_pb2.netPlayerStateNormal if p.money > 0 else
+                      pokerth_pb2.netPlayerStateNoMoney for p in self.players]
+        for player in self.humans:
+            msg = pokerth_pb2.HandStartMessage()
+            msg.gameId = self.gameId
+            if player.cards:
+                msg.plainCards.plainCard1 = player.cards[0]
+                msg.plainCards.plainCard2 = player.cards[1]
+            msg.smallBlind = self._smallBlind
+            msg.seatStates.extend(seatStates)
+            msg.dealerPlayerId = self.players[self.dealer].playerId
+            player.send(msg)
+        dealer = self.players[self.dealer]
+        if len(self._order) == 2 and dealer in self._order:
+            smallBlind, bigBlind = dealer, self._order[0]
+        else:
+            smallBlind, bigBlind = self._order[0], self._order[1]
+        self._highestSet = 0
+        self._minimumRaise = 2*self._smallBlind
+        self._postBlind(smallBlind, self._smallBlind, Round.SMALL_BLIND)
+        self._postBlind(bigBlind, 2*self._smallBlind, Round.BIG_BLIND)
+        self._street = Round.PREFLOP
+        self._nextTurn(bigBlind)
+
+    def _postBlind(self, player, amount, gameState):
+        player.bet(min(amount, player.money))
+        self._highestSet = max(self._highestSet, player.roundBet)
+        self._actionDone(player, gameState, Action.NONE)
+
+    def _actionDone(self, player, gameState, kind):
+        msg = pokerth_pb2.PlayersActionDoneMessage()
+        msg.gameId = self.gameId
+        msg.playerId = player.playerId
+        msg.gameState = gameState
+        msg.playerAction = kind
+        msg.totalPlayerBet = player.roundBet
+        msg.playerMoney = player.money
+        msg.highestSet = self._highestSet
+        msg.minimumRaise = self._minimumRaise
+        self.send(msg)
+
+    def _nextTurn(self, last):
+        contenders = [p for p in self._order if not p.folded]
+        if len(contenders) == 1:
+            return self._endHandUncontested(contenders[0])
+        active = [p for p in contenders if p.money > 0]
+        if len(active) == 0 or (len(active) == 1 and
+                                active[0].roundBet >= self._highestSet):
+            return self._endRound()
+        idx = self._order.index(last)
+        for i in range(1, len(self._order) + 1):
+            player = self._order[(idx + i) % len(self._order)]
+            if player.folded or player.money == 0:
+                continue
+            if not player.acted or player.roundBet < self._highestSet:
+                return self._startTurn(player)
+        return self._endRound()
+
+    def _startTurn(self, player):
+        self._turn = player
+        msg = pokerth_pb2.PlayersTurnMessage()
+        msg.gameId = self.gameId
+        msg.playerId = player.playerId
+        msg.gameState = self._street
+        self.send(msg)
+        if player.proto is None:
+            self._autoAction(player)
+        elif self.server.actionTimeouts:
+            self._timeout = self.server.clock.callLater(
+                self.gameInfo.playerActionTimeout, self._autoAction, player)
+
+    def _autoAction(self, player):
+        """
+        Acts for computer players, disconnected players and on timeouts.
+        """
+        self._timeout = None
+        if player.roundBet >= self._highestSet:
+            kind = Action.CHECK
+        elif player.isHuman:
+            kind = Action.FOLD
+        else:
+            kind = Action.CALL
+        self.action(player, kind, 0, self._street)
+
+    def action(self, player, kind, relativeBet, gameState):
+        """
+        Performs the action of a player.
+
+        :param player: player (:obj:`~.ServerPlayer`)
+        :param kind: type of the action of :obj:`~.Action`
+        :param relativeBet: bet relative to the highest set bet
+        :param gameState: poker round of :obj:`~.Round`
+        :return: reason of :obj:`YourActionRejectedMessage.RejectionReason`
+                 if rejected else :obj:`None`
+        """
+        Rejected = pokerth_pb2.YourActionRejectedMessage
+        if player is not self._turn:
+            return Rejected.rejectedNotYourTurn
+        if gameState != self._street:
+            return Rejected.rejectedInvalidGameState
+        toCall = self._highestSet - player.roundBet
+        if kind in (Action.BET, Action.RAISE):
+            if (kind == Action.BET) != (self._highestSet == 0):
+                return Rejected.rejectedActionNotAllowed
+            amount = toCall + relativeBet
+            if amount >= player.money:
+                kind = Action.ALLIN
+            elif relativeBet < self._minimumRaise:
+                return Rejected.rejectedActionNotAllowed
+        if kind == Action.FOLD:
+            player.folded = True
+        elif kind == Action.CHECK:
+            if toCall > 0:
+                return Rejected.rejectedActionNotAllowed
+        elif kind == Action.CALL:
+            if toCall <= 0:
+                return Rejected.rejectedActionNotAllowed
+            if toCall >= player.money:
+                kind = Action.ALLIN
+            else:
+                player.bet(toCall)
+        elif kind in (Action.BET, Action.RAISE):
+            player.bet(amount)
+        elif kind != Action.ALLIN:
+            return Rejected.rejectedActionNotAllowed
+        if kind == Action.ALLIN:
+            if player.money == 0:
+                return Rejected.rejectedActionNotAllowed
+            player.bet(player.money)
+        if player.roundBet > self._highestSet:
+            raiseBy = player.roundBet - self._highestSet
+            self._minimumRaise = max(self._minimumRaise, raiseBy)
+            self._highestSet = player.roundBet
+        player.acted = True
+        self._turn = None
+        if self._timeout is not None and self._timeout.active():
+            self._timeout.cancel()
+        self._timeout = None
+        self._actionDone(player, self._street, kind)
+        self._nextTurn(player)
+
+    def _endRound(self):
+        for player in self.players:
+            player.roundBet = 0
+            player.acted = False
+        self._highestSet = 0
+        self._minimumRaise = 2*self._smallBlind
+        if self._street == Round.RIVER:
+            return self._showdown()
+        contenders = [p for p in self._order if not p.folded]
+        runOut = len([p for p in contenders if p.money > 0]) <= 1
+        if runOut and not self._cardsShown:
+            self._cardsShown = True
+            msg = pokerth_pb2.AllInShowCardsMessage()
+            msg.gameId = self.gameId
+            for player in contenders:
+                playerAllIn = msg.playersAllIn.add()
+                playerAllIn.playerId = player.playerId
+                playerAllIn.allInCard1 = player.cards[0]
+                playerAllIn.allInCard2 = player.cards[1]
+            self.send(msg)
+        if self._street == Round.PREFLOP:
+            self._street = Round.FLOP
+            msg = pokerth_pb2.DealFlopCardsMessage()
+            msg.flopCard1, msg.flopCard2, msg.flopCard3 = self._deal(3)
+        elif self._street == Round.FLOP:
+            self._street = Round.TURN
+            msg = pokerth_pb2.DealTurnCardMessage()
+            msg.turnCard, = self._deal(1)
+        else:
+            self._street = Round.RIVER
+            msg = pokerth_pb2.DealRiverCardMessage()
+            msg.riverCard, = self._deal(1)
+        msg.gameId = self.gameId
+        self.send(msg)
+        if runOut:
+            return self._endRound()
+        return self._nextTurn(self._order[-1])
+
+    def _deal(self, n):
+        cards = [self._deck.pop() for _ in range(n)]
+        self._board.extend(cards)
+        return cards
+
+    def _showdown(self):
+        contenders = [p for p in self._order if not p.folded]
+        hands = dict((p, poker.bestHand(p.cards + self._board))
+                     for p in contenders)
+        wins = self._distribute(contenders, hands)
+        msg = pokerth_pb2.EndOfHandShowCardsMessage()
+        msg.gameId = self.gameId
+        for player in contenders:
+            rank, positions = hands[player]
+            result = msg.playerResults.add()
+            result.playerId = player.playerId
+            result.resultCard1 = player.cards[0]
+            result.resultCard2 = player.cards[1]
+            result.bestHandPosition.extend(positions)
+            result.moneyWon = wins.get(player, 0)
+            result.playerMoney = player.money
+            result.cardsValue = rank
+        self.send(msg)
+        self._endHand()
+
+    def _distribute(self, contenders, hands):
+        """
+        Splits the main and side pots among the best hands.
+
+        :return: dictionary of the money won by each player
+        """
+        wins = {}
+        levels = sorted(set(p.totalBet for p in contenders))
+        last = 0
+        for level in levels:
+            if level == levels[-1]:  # uncalled bets of folded players
+                level = max(p.totalBet for p in self.players)
+            pot = sum(min(p.totalBet, level) - min(p.totalBet, last)
+                      for p in self.players)
+            last = level
+            eligible = [p for p in contenders if p.totalBet >= level] or \
+                [p for p in contenders if p.totalBet == levels[-1]]
+            best = max(hands[p][0] for p in eligible)
+            winners = [p for p in eligible if hands[p][0] == best]
+            share, rest = divmod(pot, len(winners))
+            for i, player in enumerate(winners):
+                wins[player] = wins.get(player, 0) + share + (i < rest)
+        for player, money in wins.items():
+            player.money += money
+        return wins
+
+    def _endHandUncontested(self, winner):
+        pot = sum(p.totalBet for p in self.players)
+        winner.money += pot
+        msg = pokerth_pb2.EndOfHandHideCardsMessage()
+        msg.gameId = self.gameId
+        msg.playerId = winner.playerId
+        msg.moneyWon = pot
+        msg.playerMoney = winner.money
+        self.send(msg)
+        self._endHand()
+
+    def _endHand(self):
+        self._turn = None
+        alive = [p for p in self.players if p.money > 0]
+        if len(alive) == 1:
+            return self._endGame(alive[0])
+        if not self.humans:
+            return self.server.closeGame(self)
+        self.server.clock.callLater(self.server.handDelay, self._startHand)
+
+    def _endGame(self, winner):
+        msg = pokerth_pb2.EndOfGameMessage()
+        msg.gameId = self.gameId
+        msg.winnerPlayerId = winner.playerId
+        self.send(msg)
+        self.server.closeGame(self)
+
+
+def _loggedIn(handler):
+    """
+    Rejects a message with an error and disconnects if the client did not
+    send an InitMessage before
+    """
+    @functools.wraps(handler)
+    def wrapper(self, msg):
+        if self.player is None:
+            logger.dispatch.error("{} received before InitMessage",
+                                  msg.DESCRIPTOR.name)
+            error = pokerth_pb2.ErrorMessage()
+            error.errorReason = error.invalidState
+            self._sendMessage(error)
+            self.transport.loseConnection()
+            return
+        return handler(self, msg)
+    return wrapper
+
+
+class ServerProtocol(protocol.PokerTHProtocol):
+    """
+    Connection of a client to the stand-in server.
+    """
+    player = None
+
+    def connectionMade(self):
+        protocol.PokerTHProtocol.connectionMade(self)
+        msg = pokerth_pb2.AnnounceMessage()
+        msg.protocolVersion.majorVersion = 5
+        msg.protocolVersion.minorVersion = 1
+        msg.latestGameVersion.majorVersion = 1
+        msg.latestGameVersion.minorVersion = 1
+        msg.latestBetaRevision = 0
+        msg.serverType = msg.serverTypeInternetNoAuth
+        msg.numPlayersOnServer = len(self.factory.players)
+        self._sendMessage(msg)
+
+    def connectionLost(self, reason):
+        protocol.PokerTHProtocol.connectionLost(self, reason)
+        if self.player is not None:
+            self.factory.logout(self.player)
+
+    def initReceived(self, msg):
+        self.factory.login(self, msg.nickName)
+
+    @_loggedIn
+    def playerInfoRequestReceived(self, msg):
+        for playerId in msg.playerId:
+            self._sendMessage(self.factory.getPlayerInfo(playerId))
+
+    @_loggedIn
+    def joinNewGameReceived(self, msg):
+        password = msg.password if msg.HasField('password') else None
+        self.factory.joinNewGame(self.player, msg.gameInfo, password)
+
+    @_loggedIn
+    def joinExistingGameReceived(self, msg):
+        password = msg.password if msg.HasField('password') else None
+        self.factory.joinExistingGame(self.player, msg.gameId, password)
+
+    @_loggedIn
+    def startEventReceived(self, msg):
+        game = self.player.game
+        if game is not None and game.gameId == msg.gameId \
+                and game.admin is self.player:
+            game.start(msg.fillWithComputerPlayers)
+
+    @_loggedIn
+    def startEventAckReceived(self, msg):
+        game = self.player.game
+        if game is not None and game.gameId == msg.gameId:
+            game.startEventAck(self.player)
+
+    @_loggedIn
+    def myActionRequestReceived(self, msg):
+        game = self.player.game
+        Rejected = pokerth_pb2.YourActionRejectedMessage
+        if game is None or game.gameId != msg.gameId:
+            reason = Rejected.rejectedInvalidGameState
+        else:
+            reason = game.action(self.player, msg.myAction, msg.myRelativeBet,
+                                 msg.gameState)
+        if reason is not None:
+            reply = Rejected()
+            reply.gameId = msg.gameId
+            reply.gameState = msg.gameState
+            reply.yourAction = msg.myAction
+            reply.yourRelativeBet = msg.myRelativeBet
+            reply.rejectionReason = reason
+            self._sendMessage(reply)
+
+    @_loggedIn
+    def chatRequestReceived(self, msg):
+        self.factory.chat(self.player, msg)
+
+
+class ServerProtocolFactory(Factory):
+    """
+    The stand-in PokerTH server.
+
+    :param seed: seed of the random generator used for dealing
+    :param handDelay: seconds between two hands
+    :param actionTimeouts: fold for a player once the
+                           ``playerActionTimeout`` of the game is exceeded
+    """
+    protocol = ServerProtocol
+    # provider of callLater, e.g. the reactor
+    clock = reactor
+
+    def __init__(self, seed=None, handDelay=0, actionTimeouts=False):
+        self.rng = random.Random(seed)
+        self.handDelay = handDelay
+        self.actionTimeouts = actionTimeouts
+        self.players = {}
+        self.games = {}
+        self._lastPlayerId = 0
+        self._lastGameId = 0
+
+    def buildProtocol(self, addr):
+        proto = Factory.buildProtocol(self, addr)
+        proto.clock = self.clock
+        return proto
+
+    def broadcast(self, msg):
+        for player in self.players.values():
+            player.send(msg)
+
+    def _addPlayer(self, name, proto=None):
+        self._lastPlayerId += 1
+        player = ServerPlayer(self._lastPlayerId, name, proto)
+        self.players[player.playerId] = player
+        msg = pokerth_pb2.PlayerListMessage()
+        msg.playerId = player.playerId
+        msg.playerListNotification = msg.playerListNew
+        self.broadcast(msg)
+        return player
+
+    def _delPlayer(self, player):
+        del self.players[player.playerId]
+        msg = pokerth_pb2.PlayerListMessage()
+        msg.playerId = player.playerId
+        msg.playerListNotification = msg.playerListLeft
+        self.broadcast(msg)
+
+    def login(self, proto, nickName):
+        if any(p.name == nickName for p in self.players.values()):
+            msg = pokerth_pb2.ErrorMessage()
+            msg.errorReason = msg.initPlayerNameInUse
+            proto._sendMessage(msg)
+            proto.transport.loseConnection()
+            return
+        msg = pokerth_pb2.InitAckMessage()
+        msg.yourSessionId = '{:016x}'.format(self.rng.getrandbits(64))
+        msg.yourPlayerId = self._lastPlayerId + 1
+        proto._sendMessage(msg)
+        for player in self.players.values():
+            msg = pokerth_pb2.PlayerListMessage()
+            msg.playerId = player.playerId
+            msg.playerListNotification = msg.playerListNew
+            proto._sendMessage(msg)
+        proto.player = self._addPlayer(nickName, proto)
+        for game in self.games.values():
+            proto._sendMessage(self._getGameListNew(game))
+
+    def logout(self, player):
+        game = player.game
+        player.proto = None
+        if game is not None:
+            if game.mode == pokerth_pb2.netGameStarted:
+                game.setAway(player)  # leaves when the game is over
+                return
+            self._leaveGame(player, game)
+        self._delPlayer(player)
+
+    def _leaveGame(self, player, game):
+        game.delPlayer(player)
+        msg = pokerth_pb2.GamePlayerLeftMessage()
+        msg.gameId = game.gameId
+        msg.playerId = player.playerId
+        msg.gamePlayerLeftReason = msg.leftOnRequest
+        game.send(msg)
+        msg = pokerth_pb2.GameListPlayerLeftMessage()
+        msg.gameId = game.gameId
+        msg.playerId = player.playerId
+        self.broadcast(msg)
+        if not game.humans:
+            self.closeGame(game)
+
+    def getPlayerInfo(self, playerId):
+        msg = pokerth_pb2.PlayerInfoReplyMessage()
+        msg.playerId = playerId
+        player = self.players.get(playerId)
+        if player is not None:
+            info = msg.playerInfoData
+            info.playerName = player.name
+            info.isHuman = player.isHuman
+            info.playerRights = pokerth_pb2.netPlayerRightsNormal
+        return msg
+
+    def addComputerPlayer(self, game):
+        name = 'Computer{}'.format(self._lastPlayerId + 1)
+        player = self._addPlayer(name)
+        self._joinGame(player, game)
+        return player
+
+    def _getGameListNew(self, game):
+        msg = pokerth_pb2.GameListNewMessage()
+        msg.gameId = game.gameId
+        msg.gameMode = game.mode
+        msg.isPrivate = game.password is not None
+        msg.playerIds.extend(p.playerId for p in game.players)
+        msg.adminPlayerId = game.admin.playerId
+        msg.gameInfo.CopyFrom(game.gameInfo)
+        return msg
+
+    def _joinFailed(self, player, gameId, reason):
+        msg = pokerth_pb2.JoinGameFailedMessage()
+        msg.gameId = gameId
+        msg.joinGameFailureReason = reason
+        player.send(msg)
+
+    def joinNewGame(self, player, gameInfo, password=None):
+        Failed = pokerth_pb2.JoinGameFailedMessage
+        if player.game is not None:
+            return self._joinFailed(player, 0, Failed.invalidSettings)
+        if any(g.gameInfo.gameName == gameInfo.gameName
+               for g in self.games.values()):
+            return self._joinFailed(player, 0, Failed.gameNameInUse)
+        self._lastGameId += 1
+        game = ServerGame(self, self._lastGameId, gameInfo, player, password)
+        self.games[game.gameId] = game
+        self.broadcast(self._getGameListNew(game))
+        self._joinGame(player, game)
+
+    def joinExistingGame(self, player, gameId, password=None):
+        Failed = pokerth_pb2.JoinGameFailedMessage
+        game = self.games.get(gameId)
+        if game is None or player.game is not None:
+            return self._joinFailed(player, gameId, Failed.invalidGame)
+        if game.mode != pokerth_pb2.netGameCreated:
+            return self._joinFailed(player, gameId, Failed.gameIsRunning)
+        if game.isFull:
+            return self._joinFailed(player, gameId, Failed.gameIsFull)
+        if game.password is not None and game.password != password:
+            return self._joinFailed(player, gameId, Failed.invalidPassword)
+        self._joinGame(player, game)
+
+    def _joinGame(self, player, game):
+        msg = pokerth_pb2.JoinGameAckMessage()
+        msg.gameId = game.gameId
+        msg.areYouGameAdmin = player is game.admin
+        msg.gameInfo.CopyFrom(game.gameInfo)
+        player.send(msg)
+        for other in game.players:
+            msg = pokerth_pb2.GamePlayerJoinedMessage()
+            msg.gameId = game.gameId
+            msg.playerId = other.playerId
+            msg.isGameAdmin = other is game.admin
+            player.send(msg)
+        msg = pokerth_pb2.GamePlayerJoinedMessage()
+        msg.gameId = game.gameId
+        msg.playerId = player.playerId
+        msg.isGameAdmin = player is game.admin
+        game.send(msg)
+        game.addPlayer(player)
+        msg = pokerth_pb2.GameListPlayerJoinedMessage()
+        msg.gameId = game.gameId
+        msg.playerId = player.playerId
+        self.broadcast(msg)
+
+    def closeGame(self, game):
+        """
+        Removes a game, its computer players and players that left.
+
+        :param game: game (:obj:`~.ServerGame`)
+        """
+        game.mode = pokerth_pb2.netGameClosed
+        del self.games[game.gameId]
+        msg = pokerth_pb2.GameListUpdateMessage()
+        msg.gameId = game.gameId
+        msg.gameMode = game.mode
+        self.broadcast(msg)
+        for player in game.players:
+            player.game = None
+            if player.proto is None:
+                self._delPlayer(player)
+
+    def chat(self, player, request):
+        msg = pokerth_pb2.ChatMessage()
+        msg.playerId = player.playerId
+        msg.chatText = request.chatText
+        if request.HasField('targetGameId'):
+            game = self.games.get(request.targetGameId)
+            if game is not None and player in game.players:
+                msg.gameId = game.gameId
+                msg.chatType = msg.chatTypeGame
+                game.send(msg)
+        elif request.HasField('targetPlayerId'):
+            target = self.players.get(request.targetPlayerId)
+            if target is not None:
+                msg.chatType = msg.chatTypePrivate
+                target.send(msg)
+        else:
+            msg.chatType = msg.chatTypeLobby
+            self.broadcast(msg)
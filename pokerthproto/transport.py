@@ -6,6 +6,9 @@ developing messages.
 
 from __future__ import print_function, absolute_import, division
 
+import struct
+
+from . import pokerth_pb2
 from .pokerth_pb2 import PokerTHMessage
 
 __author__ = 'Florian Wilhelm'
@@ -33,11 +36,73 @@ def readSizeBytes(string):
     return int(string.encode('hex'), 16)
 
 
+class FrameDecoder(object):
+    """
+    Reassembles size-prefixed PokerTH frames from a stream of data chunks.
+
+    Incoming data is appended to a growable :obj:`bytearray` and frames are
+    handed out as :obj:`memoryview` slices of it, i.e. without copying. The
+    consumed part of the buffer is only discarded if it grows beyond
+    ``compactSize`` bytes or the whole buffer was consumed.
+
+    Yielded frames are only valid until the next call of :obj:`feed` and
+    must not be kept around.
+
+    :param compactSize: number of consumed bytes that triggers a compaction
+    """
+    def __init__(self, compactSize=65536):
+        self._buffer = bytearray()
+        self._offset = 0
+        self._compactSize = compactSize
+
+    def __len__(self):
+        return len(self._buffer) - self._offset
+
+    def _compact(self):
+        if self._offset == len(self._buffer):
+            del self._buffer[:]
+            self._offset = 0
+        elif self._offset >= self._compactSize:
+            del self._buffer[:self._offset]
+            self._offset = 0
+
+    def feed(self, data):
+        """
+        Adds a chunk of data and yields all frames that are complete.
+
+        :param data: data as string
+        :return: generator of frames as :obj:`memoryview`
+        """
+        try:
+            self._compact()
+            self._buffer.extend(data)
+        except BufferError:
+            # frames of a former call are still referenced somewhere, so
+            # leave the old buffer to them and continue with a fresh one
+            self._buffer = self._buffer[self._offset:]
+            self._offset = 0
+            self._buffer.extend(data)
+        return self._frames()
+
+    def _frames(self):
+        buffer = self._buffer
+        view = memoryview(buffer)
+        end = len(buffer)
+        offset = self._offset
+        while end - offset >= 4:
+            start = offset + 4
+            stop = start + struct.unpack_from('!I', buffer, offset)[0]
+            if stop > end:
+                break
+            self._offset = offset = stop
+            yield view[start:stop]
+
+
 def unpack(data):
     """
     Unpacks/Deserializes a PokerTH network messsage.
 
-    :param data: data as string
+    :param data: data as string or :obj:`memoryview`
     :return: PokerTHMessage object containing the message
     """
     envelope = PokerTHMessage()
@@ -57,37 +122,50 @@ def pack(envelope):
     return size_bytes + data
 
 
-def develop(envelope):
+def _buildTables():
     """
-    Remove the envelope from a message.
+    Builds the lookup tables between messages and fields of the envelope from
+    the descriptor of :obj:`PokerTHMessage`.
 
-    :param envelope: PokerTHMessage object that envelops a message
-    :return: PokerTH message from the envelope
+    :return: tuple of dictionaries mapping the message type to the field name
+             and the message class to a tuple of field name and message type
     """
-    msg = [v for _, v in envelope.ListFields() if v != envelope.messageType]
-    assert len(msg) == 1
-    assert msg[0].IsInitialized()
-    return msg[0]
+    msgTypes = PokerTHMessage.DESCRIPTOR.enum_types_by_name[
+        'PokerTHMessageType'].values_by_name
+    fieldByType = {}
+    fieldByClass = {}
+    for field in PokerTHMessage.DESCRIPTOR.fields:
+        if field.message_type is None:  # the messageType field itself
+            continue
+        msg_name = field.message_type.name
+        msg_type = msgTypes['Type_{}'.format(msg_name)].number
+        fieldByType[msg_type] = field.name
+        fieldByClass[getattr(pokerth_pb2, msg_name)] = (field.name, msg_type)
+    return fieldByType, fieldByClass
+
+_fieldByType, _fieldByClass = _buildTables()
 
 
-def _getEnvelopeAttr(msg_name):
+def getMsgType(msgClass):
     """
-    Get attribute name of an envelope for a given message name.
+    Get the message type of a message class as used in the envelope.
 
-    :param msg_name: name of message
-    :return: attribute name of message
+    :param msgClass: class of a PokerTH message
+    :return: message type of :obj:`PokerTHMessage.PokerTHMessageType`
     """
-    return msg_name[0].lower() + msg_name[1:]
+    return _fieldByClass[msgClass][1]
 
 
-def _getMsgTypeAttr(msg_name):
+def develop(envelope):
     """
-    Get the attribute name for the type of a message.
+    Remove the envelope from a message.
 
-    :param msg_name: name of message
-    :return: attribute name of message's type
+    :param envelope: PokerTHMessage object that envelops a message
+    :return: PokerTH message from the envelope
     """
-    return "Type_{}".format(msg_name)
+    msg = getattr(envelope, _fieldByType[envelope.messageType])
+    assert msg.IsInitialized()
+    return msg
 
 
 def envelop(msg):
@@ -97,10 +175,8 @@ def envelop(msg):
     :param msg: PokerTH message object
     :return: message wrapped in a PokerTHMessage object
     """
-    msg_name = msg.__class__.__name__
+    field, msg_type = _fieldByClass[msg.__class__]
     envelope = PokerTHMessage()
-    envelope_msg = getattr(envelope, _getEnvelopeAttr(msg_name))
-    envelope_msg.MergeFrom(msg)
-    msg_type = getattr(envelope, _getMsgTypeAttr(msg_name))
-    setattr(envelope, 'messageType', msg_type)
+    getattr(envelope, field).MergeFrom(msg)
+    envelope.messageType = msg_type
     return envelope
@@ -40,7 +40,9 @@ CLASSIFIERS = ['Development Status :: 4 - Beta',
                'Programming Language :: Python :: 2.7']
 
 # Add here console scripts like ['hello_world = pokerthproto.module:function']
-CONSOLE_SCRIPTS = []
+CONSOLE_SCRIPTS = ['pokerth_loadgen = pokerthproto.loadgen:run',
+                   'pokerth_replay = pokerthproto.replay:run',
+                   'pokerth_preflop = pokerthproto.preflop:run']
 
 # Versioneer configuration
 versioneer.versionfile_source = os.path.join(MAIN_PACKAGE, '_version.py')
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import pytest
+
+from pokerthproto.analysis import (HandReducer, AnalysisError, Task, analyze,
+                                   planTasks, runTask)
+from pokerthproto.capture import CaptureWriter, CaptureReader, Direction
+from pokerthproto.index import CaptureIndex, IndexBuilder, indexPath
+
+from .test_replay import recordGame
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+class HandsReducer(HandReducer):
+    """
+    Collects the hands like :obj:`PyClientProtocol.handleEndOfHand`
+    """
+
+    def initial(self):
+        return {}
+
+    def reduce(self, result, hand):
+        game = hand.game
+        money = sum(p.money for p in game.players)
+        result.setdefault((hand.path, hand.connId), []).append(
+            (game.handNum, money, sorted(game.wins.items())))
+        assert hand.handNum == game.handNum - 1
+        return result
+
+    def merge(self, result, other):
+        for key, hands in other.items():
+            result.setdefault(key, []).extend(hands)
+        return result
+
+
+class FailingReducer(HandsReducer):
+
+    def reduce(self, result, hand):
+        raise RuntimeError("bad reducer")
+
+
+@pytest.fixture(scope='module')
+def captures(tmpdir_factory):
+    """
+    Capture of a single game and an indexed capture of three games of
+    different connections
+    """
+    tmpdir = tmpdir_factory.mktemp('captures')
+    single = str(tmpdir.join('single.cap'))
+    hands = {(single, 0): recordGame(single, seed=1).hands}
+    multi = str(tmpdir.join('multi.cap'))
+    with CaptureWriter(multi, blockSize=4096,
+                       index=IndexBuilder(indexPath(multi))) as writer:
+        for connId, seed in [(1, 2), (2, 3), (3, 4)]:
+            path = str(tmpdir.join('game{}.cap'.format(connId)))
+            hands[(multi, connId)] = recordGame(path, seed=seed).hands
+            for r in CaptureReader(path):
+                writer.write(r.direction, connId, r.frame, r.timestamp)
+    return [single, multi], hands
+
+
+def test_planTasks(captures):
+    (single, multi), _ = captures
+    tasks = planTasks([single, multi], 2)
+    assert tasks[0] == Task(single, None, None)
+    assert len(tasks) == 3
+    assert sorted(tasks[1].connIds | tasks[2].connIds) == [1, 2, 3]
+    assert len(planTasks([multi], 10)) == 3
+
+
+@pytest.mark.parametrize('numWorkers', [0, 2])
+def test_analyze(captures, numWorkers):
+    paths, hands = captures
+    assert analyze(paths, HandsReducer(), numWorkers=numWorkers) == hands
+
+
+def test_runTask(captures):
+    (single, _), hands = captures
+    result = runTask(HandsReducer(), Task(single, None, None))
+    assert result == {(single, 0): hands[(single, 0)]}
+
+
+class HandNumsReducer(HandsReducer):
+
+    def initial(self):
+        return set()
+
+    def reduce(self, result, hand):
+        result.add((hand.connId, hand.game.gameId, hand.handNum))
+        return result
+
+
+def test_handNum(captures):
+    (_, multi), _ = captures
+    result = runTask(HandNumsReducer(), Task(multi, None, None))
+    with CaptureIndex(indexPath(multi)) as index:
+        indexed = set((h.connId, h.gameId, h.handNum) for h in index.hands)
+    assert result == indexed
+
+
+def test_analyze_failure(captures):
+    paths, _ = captures
+    with pytest.raises(AnalysisError) as excinfo:
+        analyze(paths, FailingReducer(), numWorkers=1)
+    assert 'bad reducer' in str(excinfo.value)
+
+
+def test_broken_connection(tmpdir, captures):
+    (single, _), hands = captures
+    path = str(tmpdir.join('broken.cap'))
+    with CaptureWriter(path) as writer:
+        writer.write(Direction.RECEIVED, 9, b'garbage', 0.)
+        for r in CaptureReader(single):
+            writer.write(r.direction, 1, r.frame, r.timestamp)
+            writer.write(r.direction, 9, r.frame, r.timestamp)
+    result = analyze([path], HandsReducer(), numWorkers=0)
+    assert result == {(path, 1): hands[(single, 0)]}
+
+
+class PotReducer(HandReducer):
+    """
+    Compares the pot at the end of each hand to the money won
+    """
+
+    def initial(self):
+        return []
+
+    def reduce(self, result, hand):
+        game = hand.game
+        result.append((game.pot, sum(game.wins.values()),
+                       sum(pot.amount for pot in game.sidePots)))
+        return result
+
+    def merge(self, result, other):
+        return result + other
+
+
+def test_pot(captures):
+    (single, _), _ = captures
+    pots = analyze([single], PotReducer(), numWorkers=0)
+    assert len(pots) > 5
+    for pot, won, sidePots in pots:
+        assert pot == won == sidePots
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import pytest
+from twisted.internet import task
+from twisted.test import iosim
+
+from pokerthproto import capture
+from pokerthproto import server
+from pokerthproto import transport
+from pokerthproto import pokerth_pb2
+from pokerthproto.capture import (CaptureWriter, CaptureReader, CaptureError,
+                                  Direction, Record)
+from pokerthproto.protocol import ClientProtocol, ClientProtocolFactory
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+def makeRecords(n):
+    return [Record(float(i), i % 4, i // 10, b'frame {}'.format(i)*(i % 7))
+            for i in range(n)]
+
+
+def writeCapture(path, records, **kwargs):
+    with CaptureWriter(path, **kwargs) as writer:
+        for record in records:
+            writer.write(record.direction, record.connId, record.frame,
+                         record.timestamp)
+    return writer
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+@pytest.mark.parametrize('useMmap', [False, True])
+def test_roundtrip(tmpdir, compression, useMmap):
+    path = str(tmpdir.join('test.cap'))
+    records = makeRecords(1000)
+    writer = writeCapture(path, records, compression=compression,
+                          blockSize=1024)
+    assert writer.numRecords == 1000
+    reader = CaptureReader(path, useMmap=useMmap)
+    assert list(reader) == records
+    blocks = list(reader.blocks())
+    assert len(blocks) > 10
+    assert blocks[0][0] == capture.HEADER.size
+    first = reader.readBlock(blocks[0][0])
+    second = reader.readBlock(blocks[1][0])
+    assert first + second == records[:len(first) + len(second)]
+
+
+def test_compression(tmpdir):
+    records = makeRecords(1000)
+    plain, packed = str(tmpdir.join('plain.cap')), str(tmpdir.join('z.cap'))
+    writeCapture(plain, records)
+    writeCapture(packed, records, compression='zlib')
+    assert tmpdir.join('z.cap').size() < tmpdir.join('plain.cap').size()/2
+
+
+def test_memoryview(tmpdir):
+    path = str(tmpdir.join('test.cap'))
+    with CaptureWriter(path, clock=lambda: 42.) as writer:
+        frame = memoryview(bytearray(b'xxframe'))[2:]
+        writer.write(Direction.SENT, 3, frame)
+    reader = CaptureReader(path)
+    assert reader.monoStart == 42.
+    assert reader.toWallTime(43.) == reader.wallStart + 1.
+    assert list(reader) == [Record(42., Direction.SENT, 3, b'frame')]
+
+
+def test_errors(tmpdir):
+    path = tmpdir.join('test.cap')
+    path.write(b'no capture file at all')
+    with pytest.raises(CaptureError):
+        CaptureReader(str(path))
+    with pytest.raises(CaptureError):
+        CaptureWriter(str(path), compression='bzip2')
+    if capture.lzma is None:
+        with pytest.raises(CaptureError):
+            CaptureWriter(str(path), compression='lzma')
+    writeCapture(str(path), makeRecords(10))
+    path.write(path.read()[:-1], mode='wb')
+    for useMmap in (False, True):
+        with pytest.raises(CaptureError):
+            list(CaptureReader(str(path), useMmap=useMmap))
+
+
+class LobbyClientProtocol(ClientProtocol):
+
+    def handleInsideLobby(self, lobbyInfo):
+        self.factory.inLobby = True
+
+
+def test_PokerTHProtocol_capture(tmpdir):
+    path = str(tmpdir.join('client.cap'))
+    clock = task.Clock()
+    serverFactory = server.ServerProtocolFactory(seed=42)
+    serverFactory.clock = clock
+    factory = ClientProtocolFactory('PyClient1')
+    factory.protocol = LobbyClientProtocol
+    factory.inLobby = False
+    serverProto = serverFactory.buildProtocol(None)
+    clientProto = factory.buildProtocol(None)
+    clientProto.clock = clock
+    clientProto.capture = CaptureWriter(path)
+    clientProto.connId = 5
+    pump = iosim.connect(serverProto, iosim.makeFakeServer(serverProto),
+                         clientProto, iosim.makeFakeClient(clientProto))
+    for _ in range(3):
+        pump.flush()
+        clock.advance(1)
+    assert factory.inLobby
+    clientProto.capture.close()
+    records = list(CaptureReader(path))
+    assert [r.direction for r in records[:2]] == [Direction.RECEIVED,
+                                                  Direction.SENT]
+    assert all(r.connId == 5 for r in records)
+    timestamps = [r.timestamp for r in records]
+    assert timestamps == sorted(timestamps)
+    msgs = [transport.develop(transport.unpack(r.frame)) for r in records]
+    assert isinstance(msgs[0], pokerth_pb2.AnnounceMessage)
+    assert isinstance(msgs[1], pokerth_pb2.InitMessage)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import os
+import threading
+from Queue import Queue
+
+import pytest
+from twisted.internet import task
+from twisted.test import iosim
+
+from pokerthproto import server
+from pokerthproto import pokerth_pb2
+from pokerthproto.decision import (DecisionExecutor, DecisionClientProtocol,
+                                   DecisionError, safeAction)
+from pokerthproto.game import Game
+from pokerthproto.lobby import GameInfo
+from pokerthproto.player import Player
+from pokerthproto.poker import Action, Round
+from pokerthproto.protocol import ClientProtocolFactory
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+class FakeReactor(task.Clock):
+    """
+    Clock that runs the calls from other threads on demand
+    """
+    def __init__(self):
+        task.Clock.__init__(self)
+        self._fromThread = Queue()
+
+    def callFromThread(self, f, *args, **kwargs):
+        self._fromThread.put((f, args, kwargs))
+
+    def runFromThread(self, timeout=5.):
+        f, args, kwargs = self._fromThread.get(timeout=timeout)
+        f(*args, **kwargs)
+
+
+def makeGame(highestSet=20):
+    game = Game(1, 1)
+    game.addPlayer(Player(1))
+    game.startNewHand()
+    game.addRound(Round.BIG_BLIND)
+    game.addRound(Round.PREFLOP)
+    game.addAction(1, Action.CALL, 10)
+    game.highestSet = highestSet
+    return game
+
+
+def callStrategy(game):
+    return Action.CALL, 0
+
+
+def checkOrCallStrategy(game):
+    if game.highestSet > game.myBet:
+        return Action.CALL, 0
+    return Action.CHECK, 0
+
+
+def pidStrategy(game):
+    return Action.RAISE, os.getpid()
+
+
+def failingStrategy(game):
+    raise RuntimeError("bad strategy")
+
+
+def test_safeAction():
+    assert safeAction(makeGame(20)) == (Action.FOLD, 0)
+    assert safeAction(makeGame(20), Action.CALL) == (Action.CALL, 0)
+    assert safeAction(makeGame(10)) == (Action.CHECK, 0)
+
+
+def test_decide():
+    reactor = FakeReactor()
+    executor = DecisionExecutor(2, reactor=reactor)
+    results = []
+    executor.decide(callStrategy, makeGame(), 20).addCallback(results.append)
+    assert executor.pending == 1
+    reactor.runFromThread()
+    assert results == [(Action.CALL, 0)]
+    assert executor.pending == 0
+    assert not reactor.getDelayedCalls()
+    executor.close()
+
+
+def test_decide_deadline():
+    reactor = FakeReactor()
+    executor = DecisionExecutor(1, margin=2., reactor=reactor)
+    release = threading.Event()
+
+    def slowStrategy(game):
+        release.wait()
+        return Action.CALL, 0
+
+    results = []
+    executor.decide(slowStrategy, makeGame(), 20).addCallback(results.append)
+    reactor.advance(17.9)
+    assert results == []
+    reactor.advance(0.1)
+    assert results == [(Action.FOLD, 0)]
+    assert executor.timeouts == 1
+    assert executor.pending == 0
+    release.set()
+    reactor.runFromThread()
+    assert results == [(Action.FOLD, 0)]
+    assert executor.pending == 0
+    executor.close()
+
+
+def test_decide_failure():
+    reactor = FakeReactor()
+    executor = DecisionExecutor(1, reactor=reactor)
+    errors = []
+    executor.decide(failingStrategy, makeGame(), 20).addErrback(errors.append)
+    reactor.runFromThread()
+    error, = errors
+    assert error.check(DecisionError)
+    assert 'bad strategy' in error.getErrorMessage()
+    executor.close()
+
+
+def test_decide_closed():
+    reactor = FakeReactor()
+    executor = DecisionExecutor(1, reactor=reactor)
+    executor.close()
+    errors = []
+    executor.decide(callStrategy, makeGame(), 20).addErrback(errors.append)
+    assert len(errors) == 1  # submitting to a closed pool fails
+    assert executor.pending == 0
+    assert not reactor.getDelayedCalls()
+
+
+def test_decide_processes():
+    reactor = FakeReactor()
+    executor = DecisionExecutor(1, processes=True, reactor=reactor)
+    results = []
+    executor.decide(pidStrategy, makeGame(), 20).addCallback(results.append)
+    reactor.runFromThread()
+    (action, pid), = results
+    assert action == Action.RAISE
+    assert pid != os.getpid()
+    executor.close()
+
+
+class PyClientProtocol(DecisionClientProtocol):
+
+    def handleInsideLobby(self, lobbyInfo):
+        gameInfo = GameInfo('PyClient Game')
+        gameInfo._maxNumPlayers = 3
+        self.sendJoinNewGame(gameInfo)
+
+    def joinGameAckReceived(self, msg):
+        DecisionClientProtocol.joinGameAckReceived(self, msg)
+        self.sendStartEvent(msg.gameId,
+                            pokerth_pb2.StartEventMessage.startEvent,
+                            fillWithBots=True)
+
+    def handleEndOfGame(self, gameInfo, winner):
+        self.factory.winner = winner.playerId
+
+
+@pytest.mark.parametrize('strategy', [checkOrCallStrategy,
+                                      failingStrategy])
+def test_DecisionClientProtocol(strategy):
+    reactor = FakeReactor()
+    serverFactory = server.ServerProtocolFactory(seed=42)
+    serverFactory.clock = reactor
+    factory = ClientProtocolFactory('PyClient1')
+    factory.protocol = PyClientProtocol
+    factory.strategy = strategy
+    factory.executor = DecisionExecutor(1, reactor=reactor)
+    factory.winner = None
+    serverProto = serverFactory.buildProtocol(None)
+    clientProto = factory.buildProtocol(None)
+    clientProto.clock = reactor
+    pump = iosim.connect(serverProto, iosim.makeFakeServer(serverProto),
+                         clientProto, iosim.makeFakeClient(clientProto))
+    for _ in range(10000):
+        pump.flush()
+        while factory.executor.pending:
+            reactor.runFromThread()
+            pump.flush()
+        if factory.winner is not None:
+            break
+        reactor.advance(1)
+    assert factory.winner is not None
+    assert factory.executor.timeouts == 0
+    factory.executor.close()
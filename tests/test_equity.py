@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+from itertools import combinations
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pokerthproto import game
+from pokerthproto import player
+from pokerthproto import poker
+from pokerthproto.equity import (monteCarloEquity, gameEquity, drawCards,
+                                 showdownShares, zScore, activeOpponents,
+                                 mergeEquities, comboIndex, EquityService,
+                                 exactEquity, LRUCache, EquityError, COMBOS,
+                                 boardCache, equityCache)
+
+from .test_decision import FakeReactor
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+def test_zScore():
+    assert abs(zScore(0.95) - 1.95996) < 1e-4
+    assert abs(zScore(0.99) - 2.57583) < 1e-4
+
+
+def test_drawCards():
+    rng = np.random.RandomState(42)
+    cards = np.arange(10, 20)
+    drawn = drawCards(rng, cards, 20000, 3)
+    assert drawn.shape == (20000, 3)
+    assert all(len(set(row)) == 3 for row in drawn.tolist())
+    # every card is equally likely at every position
+    for column in drawn.T:
+        counts = np.bincount(column - 10, minlength=10)
+        assert abs(counts/20000. - 0.1).max() < 0.015
+    assert sorted(drawCards(rng, cards, 1, 10)[0].tolist()) == list(cards)
+
+
+def test_showdownShares():
+    hero = np.array([5, 5, 5, 5])
+    opponents = np.array([[4, 5, 6, 5], [3, 4, 1, 5]])
+    assert showdownShares(hero, opponents).tolist() == [1., 0.5, 0., 1/3.]
+
+
+@pytest.mark.parametrize('pocket,numOpponents,expected', [
+    (['Ah', 'Ad'], 1, 0.852), (['Ah', 'Ad'], 3, 0.639),
+    (['7h', '2d'], 1, 0.346), (['Ah', 'Kh'], 1, 0.670)])
+def test_monteCarloEquity(pocket, numOpponents, expected):
+    result = monteCarloEquity(pocket, numOpponents=numOpponents, seed=42)
+    assert result.trials == 100000
+    assert abs(result.equity - expected) < 4*result.stdError
+    assert result.win <= result.equity <= result.win + result.tie
+
+
+def test_monteCarloEquity_board():
+    result = monteCarloEquity(['Ah', 'Kh'], ['Qh', 'Jh', 'Th'], seed=42)
+    assert result.equity == 1.
+    # board plays, opponents can only tie
+    result = monteCarloEquity(['2c', '3d'], ['Ah', 'Kh', 'Qh', 'Jh', 'Th'],
+                              numOpponents=2, trials=1000, seed=42)
+    assert abs(result.equity - 1/3.) < 1e-9
+    assert result.tie == 1.
+
+
+def test_monteCarloEquity_precision():
+    result = monteCarloEquity(['Ah', 'Ad'], precision=0.01, batchSize=1000,
+                              seed=42)
+    assert result.trials < 100000
+    assert 1.96*result.stdError <= 0.01
+    first = monteCarloEquity(['Ah', 'Ad'], trials=5000, seed=7)
+    assert first == monteCarloEquity(['Ah', 'Ad'], trials=5000, seed=7)
+
+
+def test_monteCarloEquity_dead():
+    # the kings left would beat the aces
+    board = ['Kh', 'Kd', '7c', '2s']
+    result = monteCarloEquity(['Ah', 'Ad'], board, dead=['Ks', 'Kc'],
+                              seed=42)
+    alive = monteCarloEquity(['Ah', 'Ad'], board, seed=42)
+    assert result.equity > alive.equity
+    with pytest.raises(EquityError):
+        monteCarloEquity(['Ah', 'Ad'], numOpponents=30)
+    with pytest.raises(EquityError):
+        monteCarloEquity(['Ah'])
+
+
+def test_gameEquity():
+    pgame = game.Game(1, 1)
+    for playerId in (1, 2, 3, 4):
+        pgame.addPlayer(player.Player(playerId))
+        pgame.getPlayer(playerId).money = 100
+    pgame.getPlayer(4).money = 0
+    pgame.addRound(poker.Round.SMALL_BLIND)
+    pgame.addRound(poker.Round.BIG_BLIND)
+    pgame.addRound(poker.Round.PREFLOP)
+    pgame.addAction(3, poker.Action.FOLD)
+    pgame.addRound(poker.Round.FLOP, ['2c', '7d', '9s'])
+    pgame.pocketCards = ['Ah', 'Ad']
+    assert activeOpponents(pgame) == 1
+    result = gameEquity(pgame, trials=20000, seed=42)
+    expected = monteCarloEquity(['Ah', 'Ad'], ['2c', '7d', '9s'],
+                                trials=20000, seed=42)
+    assert result == expected
+    assert gameEquity(pgame, exact=True) == \
+        exactEquity(['Ah', 'Ad'], ['2c', '7d', '9s'])
+    pgame.addRound(poker.Round.TURN, ['Kd'])
+    assert gameEquity(pgame) == \
+        exactEquity(['Ah', 'Ad'], ['2c', '7d', '9s', 'Kd'])
+    # the cards of folded players are dead, shown ones of others are held
+    pgame.addOthersCards(3, ['Kh', 'Ks'])
+    assert gameEquity(pgame) == \
+        exactEquity(['Ah', 'Ad'], ['2c', '7d', '9s', 'Kd'], dead=['Kh', 'Ks'])
+    pgame.addOthersCards(2, ['9h', '9d'])
+    result = gameEquity(pgame, trials=1000, seed=42)
+    # two aces left of 42 cards
+    assert result.equity == result.win
+    assert abs(result.equity - 2/42) < 4*result.stdError
+    assert result.trials == 1000
+    with pytest.raises(EquityError):
+        gameEquity(pgame, exact=True)
+    pgame.addRound(poker.Round.RIVER, ['Ac'])
+    assert gameEquity(pgame, trials=1000).equity == 1.
+    pgame.addAction(2, poker.Action.FOLD)
+    assert gameEquity(pgame) == (1., 1., 0., 0., 0)
+
+
+def aces():
+    weights = np.zeros(len(COMBOS))
+    for card1, card2 in combinations(['Ad', 'Ah', 'As', 'Ac'], 2):
+        weights[comboIndex(poker.cardToInt(card1),
+                           poker.cardToInt(card2))] = 1.
+    return weights
+
+
+def test_comboIndex():
+    assert len(COMBOS) == 1326
+    for i, (card1, card2) in enumerate(COMBOS.tolist()):
+        assert comboIndex(card1, card2) == comboIndex(card2, card1) == i
+
+
+def test_monteCarloEquity_ranges():
+    # kings against aces
+    result = monteCarloEquity(['Kh', 'Kd'], ranges=[aces()], seed=42)
+    assert abs(result.equity - 0.18) < 0.01
+    # card removal leaves the aces of spades and diamonds making a set
+    result = monteCarloEquity(['Ah', 'Kd'], ['2c', '7d', 'Ac'],
+                              ranges=[aces()], trials=1000, seed=42)
+    assert result.equity < 0.05
+    result = monteCarloEquity(['Kh', 'Kd'], ranges=[aces(), None],
+                              trials=20000, seed=42)
+    assert result.trials == 20000
+    # two opponents holding aces collide in most trials
+    both = monteCarloEquity(['Kh', 'Kd'], ranges=[aces(), aces()],
+                            trials=20000, seed=42)
+    assert both.trials == 20000
+    assert 0.15 < both.equity < 0.25
+    with pytest.raises(EquityError):
+        monteCarloEquity(['Ah', 'Ad'], ['As', 'Ac', '2d'], ranges=[aces()])
+
+
+def test_mergeEquities():
+    results = [monteCarloEquity(['Ah', 'Kh'], trials=t, seed=s)
+               for t, s in [(10000, 1), (30000, 2)]]
+    merged = mergeEquities(results)
+    assert merged.trials == 40000
+    assert merged.equity == pytest.approx(
+        (results[0].equity + 3*results[1].equity)/4)
+    assert merged.stdError < min(r.stdError for r in results)
+    assert mergeEquities(results[:1]) == pytest.approx(results[0])
+
+
+def test_EquityService():
+    reactor = FakeReactor()
+    service = EquityService(2, numShards=3, reactor=reactor)
+    try:
+        results = []
+        d = service.compute(['Ah', 'Ad'], numOpponents=2, trials=30000,
+                            seed=42)
+        d.addCallback(results.append)
+        for _ in range(3):
+            reactor.runFromThread()
+        result, = results
+        shards = [monteCarloEquity(**shard) for shard in
+                  service.shards(['Ah', 'Ad'], numOpponents=2,
+                                 trials=30000, seed=42)]
+        assert [s.trials for s in shards] == [10000]*3
+        assert result == mergeEquities(shards)
+        assert abs(result.equity - 0.735) < 0.01
+        assert service.pending == 0
+        errors = []
+        d = service.compute(['Ah'], trials=3)
+        d.addErrback(errors.append)
+        for _ in range(3):
+            reactor.runFromThread()
+        errors[0].trap(EquityError)
+        assert len(service.shards(['Ah', 'Ad'], trials=2)) == 2
+    finally:
+        service.close()
+    errors = []
+    service.compute(['Ah', 'Ad'], trials=30000).addErrback(errors.append)
+    assert len(errors) == 1  # submitting to a closed pool fails
+    assert service.pending == 0
+
+
+def bruteForceEquity(pocket, board, numOpponents=1):
+    pocket = [poker.cardToInt(c) for c in pocket]
+    board = [poker.cardToInt(c) for c in board]
+    deck = [c for c in range(52) if c not in pocket + board]
+    total = n = 0
+    for runout in combinations(deck, 5 - len(board)):
+        full = board + list(runout)
+        mine = poker.bestHand(pocket + full)[0]
+        left = [c for c in deck if c not in runout]
+        for hand in combinations(left, 2):
+            theirs = poker.bestHand(list(hand) + full)[0]
+            total += 1. if mine > theirs else 0.5 if mine == theirs else 0.
+            n += 1
+    return total/n, n
+
+
+def test_LRUCache():
+    cache = LRUCache(2)
+    cache.put(1, 'a')
+    cache.put(2, 'b')
+    assert cache.get(1) == 'a'
+    cache.put(3, 'c')
+    assert cache.get(2) is None
+    assert cache.get(3) == 'c'
+    assert cache.get(1) == 'a'
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_exactEquity():
+    equityCache.clear()
+    board = ['Kh', 'Kd', '7c', '2s', '9d']
+    result = exactEquity(['Ah', 'Qh'], board)
+    equity, n = bruteForceEquity(['Ah', 'Qh'], board)
+    assert result.trials == n == 990
+    assert result.equity == pytest.approx(equity)
+    assert result.stdError == 0
+    assert exactEquity(['Qh', 'Ah'], reversed(board)) is result
+    # a permutation of the suits hits the cache
+    assert exactEquity(['As', 'Qs'], ['Ks', 'Kd', '7h', '2c', '9d']) is result
+    turn = exactEquity(['Ah', 'Qh'], board[:4])
+    assert turn.trials == 46*990
+    assert turn.win <= turn.equity <= turn.win + turn.tie
+    assert exactEquity(['Ah', 'Qh'], board, dead=['Kc', 'Ks']).equity > \
+        result.equity
+    multiway = exactEquity(['Ah', 'Qh'], board, numOpponents=2)
+    assert multiway.trials == 990*903//2
+    assert multiway.equity < result.equity
+    sampled = monteCarloEquity(['Ah', 'Qh'], board[:4], numOpponents=2,
+                               seed=42)
+    assert abs(exactEquity(['Ah', 'Qh'], board[:4], 2).equity -
+               sampled.equity) < 4*sampled.stdError
+    with pytest.raises(EquityError):
+        exactEquity(['Ah', 'Qh'], board[:2])
+    with pytest.raises(EquityError):
+        exactEquity(['Ah', 'Qh'], board, numOpponents=3)
+    with pytest.raises(EquityError):
+        exactEquity(['Ah', 'Kh'], board)
+    with pytest.raises(EquityError):
+        exactEquity(['Ah', 'Qh'], board[:3], numOpponents=2)
+
+
+def test_exactEquity_turn():
+    equity, n = bruteForceEquity(['7h', '8h'], ['9h', 'Th', '2c', 'Kd'])
+    result = exactEquity(['7h', '8h'], ['9h', 'Th', '2c', 'Kd'])
+    assert result.trials == n
+    assert result.equity == pytest.approx(equity)
+
+
+def test_exactEquity_cache():
+    equityCache.clear()
+    boardCache.clear()
+    exactEquity(['Ah', 'Qh'], ['Kh', 'Kd', '7c', '2s'])
+    assert len(boardCache) == 46
+    misses = boardCache.misses
+    # other pocket cards on the same board reuse the ranks of all runouts
+    exactEquity(['Jh', 'Jd'], ['Kh', 'Kd', '7c', '2s'], numOpponents=2)
+    assert boardCache.misses == misses + 2
@@ -37,6 +37,8 @@ def test_rounds():
         pgame.addRound(poker.Round.FLOP)
     other_round = game.RoundInfo(poker.Round.SMALL_BLIND)
     assert pgame.currRoundInfo == other_round
+    assert len(other_round.cardSet) == 0
+    assert pgame.currRoundInfo == other_round
     assert other_round.__eq__(object) == NotImplemented
     print(pgame.currRoundInfo)
 
@@ -52,6 +54,11 @@ def test_players():
     assert player1 == other_player1
     pgame.delPlayer(player1)
     assert len(pgame.players) == 0
+    assert not pgame.existPlayer(1)
+    with pytest.raises(game.GameError):
+        pgame.getPlayer(1)
+    pgame.addPlayer(player1)
+    assert pgame.getPlayer(1) is player1
 
 
 def test_actions():
@@ -157,3 +164,89 @@ def test_startNewHand():
     assert pgame.handNum == 2
     pgame.startNewHand()
     assert pgame.dealer == player2
+
+
+def test_bets():
+    pgame = game.Game(1, 1)
+    for playerId in (1, 2, 3):
+        pgame.addPlayer(player.Player(playerId))
+        pgame.getPlayer(playerId).money = 100
+        pgame.getPlayer(playerId).seat = playerId - 1
+    pgame.dealer = pgame.getPlayer(3)
+    pgame.startNewHand()
+    pgame.addAction(1, poker.Action.NONE, 5)
+    pgame.addRound(poker.Round.BIG_BLIND)
+    pgame.addAction(2, poker.Action.NONE, 10)
+    pgame.addRound(poker.Round.PREFLOP)
+    pgame.highestSet = 10
+    assert pgame.toCall == 5
+    pgame.addAction(3, poker.Action.RAISE, 30)
+    pgame.addAction(1, poker.Action.CALL, 30)
+    pgame.highestSet = 30
+    assert pgame.myBet == 30
+    assert pgame.toCall == 0
+    pgame.addAction(2, poker.Action.FOLD, 10)
+    assert pgame.roundBets == {1: 30, 2: 10, 3: 30}
+    assert pgame.pot == 70
+    assert pgame.folded == {2}
+    assert pgame.sidePots == [game.SidePot(70, [1, 3])]
+    pgame.addRound(poker.Round.FLOP)
+    pgame.highestSet = 0
+    assert pgame.myBet == 0
+    assert pgame.roundBets == {}
+    pgame.addAction(1, poker.Action.CHECK, 0)
+    pgame.addAction(3, poker.Action.ALLIN, 70)
+    pgame.getPlayer(3).money = 0
+    pgame.highestSet = 70
+    pgame.getPlayer(1).money = 50
+    assert pgame.toCall == 50
+    pgame.addAction(1, poker.Action.ALLIN, 50)
+    pgame.getPlayer(1).money = 0
+    assert pgame.handBets == {1: 80, 2: 10, 3: 100}
+    assert pgame.pot == 190
+    assert pgame.isAllIn(1) and pgame.isAllIn(3)
+    assert not pgame.isAllIn(2)
+    assert pgame.sidePots == [game.SidePot(170, [1, 3]),
+                              game.SidePot(20, [3])]
+    pgame.startNewHand()
+    assert pgame.pot == 0
+    assert pgame.handBets == {}
+    assert pgame.sidePots == []
+
+
+def test_sidePots():
+    pgame = game.Game(1, 1)
+    for playerId, money in [(1, 0), (2, 0), (3, 500), (4, 500)]:
+        pgame.addPlayer(player.Player(playerId))
+        pgame.getPlayer(playerId).money = money
+    pgame.startNewHand()
+    pgame.addRound(poker.Round.BIG_BLIND)
+    pgame.addRound(poker.Round.PREFLOP)
+    for playerId, money in [(1, 20), (2, 50), (3, 100), (4, 60)]:
+        pgame.addAction(playerId, poker.Action.CALL, money)
+    # player 4 may still call the raise of player 3
+    assert pgame.sidePots == [game.SidePot(80, [1, 2, 3, 4]),
+                              game.SidePot(90, [2, 3, 4]),
+                              game.SidePot(60, [3, 4])]
+
+
+def test_cardSets():
+    pgame = game.Game(1, 1)
+    pgame.pocketCards = ['2h', 'Tc']
+    assert pgame.pocketCardSet == poker.CardSet(['2h', 'Tc'])
+    pgame.pocketCards = poker.CardSet(['Ah', 'Ad'])
+    assert pgame.pocketCards == ['Ad', 'Ah']
+    with pytest.raises(ValueError):
+        pgame.pocketCards = ['Ah', 'Xx']
+    pgame.addRound(poker.Round.SMALL_BLIND)
+    pgame.addRound(poker.Round.BIG_BLIND)
+    pgame.addRound(poker.Round.PREFLOP)
+    pgame.addRound(poker.Round.FLOP, cards=['2d', '3d', '4d'])
+    pgame.addRound(poker.Round.TURN, cards=poker.CardSet(['5d']))
+    assert pgame.currRoundInfo.cards == ['5d']
+    assert pgame.currRoundInfo.cardSet == poker.CardSet(['5d'])
+    assert pgame.currRoundInfo == game.RoundInfo(poker.Round.TURN, ['5d'])
+    assert pgame.boardCardSet == poker.CardSet(['2d', '3d', '4d', '5d'])
+    pgame.addOthersCards(2, ['Ks', 'Kc'])
+    pgame.addOthersCards(3, ['Qs', 'Qc'])
+    assert pgame.othersCardSet == poker.CardSet(['Ks', 'Kc', 'Qs', 'Qc'])
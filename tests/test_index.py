@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import heapq
+
+import pytest
+
+from pokerthproto import transport
+from pokerthproto import pokerth_pb2
+from pokerthproto.capture import CaptureWriter, CaptureReader, CaptureError
+from pokerthproto.index import (IndexBuilder, CaptureIndex, buildIndex,
+                                indexPath, readMsgType, HAND_START, HAND_ENDS)
+
+from .test_replay import recordGame
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+@pytest.fixture(scope='module')
+def games(tmpdir_factory):
+    """
+    Records of two games of different connections, interleaved by time
+    """
+    tmpdir = tmpdir_factory.mktemp('games')
+    recordings = []
+    for connId, seed in [(1, 42), (2, 7)]:
+        path = str(tmpdir.join('game{}.cap'.format(connId)))
+        recordGame(path, seed=seed)
+        recordings.append([r._replace(connId=connId)
+                           for r in CaptureReader(path)])
+    return list(heapq.merge(*recordings))
+
+
+def writeCapture(path, records, **kwargs):
+    with CaptureWriter(path, **kwargs) as writer:
+        for r in records:
+            writer.write(r.direction, r.connId, r.frame, r.timestamp)
+
+
+def test_readMsgType():
+    msg = pokerth_pb2.PlayersActionDoneMessage()
+    msg.gameId = 1
+    msg.playerId = 2
+    msg.gameState = pokerth_pb2.netStatePreflop
+    msg.playerAction = pokerth_pb2.netActionCall
+    msg.totalPlayerBet = 20
+    msg.playerMoney = 2980
+    msg.highestSet = 20
+    msg.minimumRaise = 20
+    frame = transport.pack(transport.envelop(msg))[4:]
+    msgType = transport.getMsgType(pokerth_pb2.PlayersActionDoneMessage)
+    assert readMsgType(frame) == msgType
+    assert readMsgType(memoryview(frame)) == msgType
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_index(tmpdir, games, compression):
+    path = str(tmpdir.join('games.cap'))
+    writeCapture(path, games, compression=compression, blockSize=4096,
+                 index=IndexBuilder(indexPath(path)))
+    built = buildIndex(path, str(tmpdir.join('built.idx')))
+    assert tmpdir.join('built.idx').read_binary() == \
+        tmpdir.join('games.cap.idx').read_binary()
+    reader = CaptureReader(path)
+    with CaptureIndex(indexPath(path)) as index:
+        assert index.numBlocks > 10
+        numStarts = sum(readMsgType(r.frame) == HAND_START for r in games)
+        assert index.numHands == numStarts
+        connIds = [[r.connId for r in reader.readBlock(
+            index.block(i).offset)] for i in range(index.numBlocks)]
+        for conn in index.conns:
+            blocks = [i for i, ids in enumerate(connIds) if conn.connId in ids]
+            assert (conn.firstBlock, conn.lastBlock) == (blocks[0], blocks[-1])
+        assert index.numConns == 2
+        hands = list(index.hands)
+        keys = [(h.gameId, h.handNum, h.connId) for h in hands]
+        assert keys == sorted(keys)
+        hands = index.findHands(1)
+        assert len(hands) == index.numHands
+        assert [h.connId for h in hands[:2]] == [1, 2]
+        for connId in (1, 2):
+            handNums = [h.handNum for h in hands if h.connId == connId]
+            assert handNums == list(range(1, len(handNums) + 1))
+        hand, = [h for h in index.findHands(1, 3) if h.connId == 2]
+        assert hand.startBlock < hand.endBlock
+        records = index.readHand(reader, hand)
+        assert all(r.connId == 2 for r in records)
+        assert readMsgType(records[0].frame) == HAND_START
+        assert readMsgType(records[-1].frame) in HAND_ENDS
+        assert records[0].timestamp == hand.startTimestamp
+        assert records[-1].timestamp == hand.endTimestamp
+        expected = [r for r in games if r.connId == 2 and
+                    hand.startTimestamp <= r.timestamp <= hand.endTimestamp]
+        assert [r.frame for r in records] == \
+            [r.frame for r in expected][:len(records)]
+        assert index.findHands(1, 1000) == []
+        assert index.findHands(99) == []
+        endOfGame = transport.getMsgType(pokerth_pb2.EndOfGameMessage)
+        blocks = index.findBlocks(endOfGame)
+        assert 1 <= len(blocks) <= 2
+        assert blocks[-1] == index.numBlocks - 1
+        for i in blocks:
+            frames = [r.frame for r in
+                      reader.readBlock(index.block(i).offset)]
+            assert endOfGame in map(readMsgType, frames)
+        assert index.findBlocks(start=hand.startTimestamp,
+                                end=hand.endTimestamp) == \
+            list(range(hand.startBlock, hand.endBlock + 1))
+    assert built == str(tmpdir.join('built.idx'))
+
+
+def test_unfinished_hand(tmpdir, games):
+    path = str(tmpdir.join('games.cap'))
+    records = [r for r in games if r.connId == 1]
+    end = [readMsgType(r.frame) in HAND_ENDS for r in records].index(True)
+    writeCapture(path, records[:end])
+    with CaptureIndex(buildIndex(path)) as index:
+        hand, = index.hands
+        assert hand.handNum == 1
+        conn, = index.conns
+        assert conn.connId == 1
+        assert conn.firstBlock == conn.lastBlock == 0
+        assert hand.endTimestamp == records[end - 1].timestamp
+        start = [readMsgType(r.frame) for r in records].index(HAND_START)
+        assert index.readHand(CaptureReader(path), hand) == \
+            records[start:end]
+
+
+def test_errors(tmpdir):
+    path = tmpdir.join('test.idx')
+    path.write(b'no index file at all')
+    with pytest.raises(CaptureError):
+        CaptureIndex(str(path))
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import pytest
+from twisted.internet import task
+from twisted.test import iosim
+
+from pokerthproto import server
+from pokerthproto.loadgen import LoadGenerator, LoadStats, parse_args
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+def test_LoadStats():
+    clock = task.Clock()
+    stats = LoadStats(clock)
+    assert stats.percentile(50) is None
+    for i in range(100, 0, -1):
+        stats.latencies.record(0.01*i)
+    assert stats.percentile(50) == pytest.approx(0.5, rel=0.01)
+    assert stats.percentile(99) == pytest.approx(0.99, rel=0.01)
+    assert stats.percentile(100) == pytest.approx(1., rel=0.01)
+    assert stats.percentile(0) == pytest.approx(0.01, rel=0.01)
+    clock.advance(2)
+    stats.connectionMade()
+    stats.connectionMade()
+    clock.advance(2)
+    stats.sent, stats.received = 10, 30
+    report = stats.report()
+    assert report['connectionsPerSec'] == 1.
+    assert report['messagesPerSec'] == 10.
+    assert report['actions'] == 100
+    assert report['latencies'][90] == pytest.approx(0.9, rel=0.01)
+    assert 'action latency p99.9: ' in str(stats)
+
+
+def test_LoadGenerator():
+    clock = task.Clock()
+    serverFactory = server.ServerProtocolFactory(seed=42)
+    serverFactory.clock = clock
+    pumps = []
+
+    def connect(factory):
+        serverProto = serverFactory.buildProtocol(None)
+        clientProto = factory.buildProtocol(None)
+        pumps.append(iosim.connect(
+            serverProto, iosim.makeFakeServer(serverProto),
+            clientProto, iosim.makeFakeClient(clientProto)))
+
+    generator = LoadGenerator(connect, 7, rampUp=7., thinkTime=(0., 2.),
+                              humansPerGame=3, maxNumPlayers=4, seed=42,
+                              clock=clock)
+    d = generator.run(duration=1000)
+    results = []
+    d.addCallback(results.append)
+    for _ in range(1000):
+        for pump in pumps:
+            pump.flush()
+        clock.advance(1)
+    stats, = results
+    assert stats is generator.stats
+    assert stats.connections == 7
+    assert stats.lastConnection == 6.
+    assert [f.numHumans for f in generator.factories] == [3]*6 + [1]
+    assert [f.isAdmin for f in generator.factories][:4] == \
+        [True, False, False, True]
+    assert stats.hands > 0
+    # the last session plays alone and one game after the other
+    assert generator.factories[-1].round == stats.games > 1
+    assert stats.latencies.count > 0
+    assert stats.sent > 0 and stats.received > stats.sent
+    assert not generator.running
+    assert all(pump.client.transport.disconnecting for pump in pumps)
+
+
+def test_parse_args():
+    args = parse_args(['--sessions', '10', '--think-time', '0.5', '2'])
+    assert args.sessions == 10
+    assert args.think_time == [0.5, 2.]
+    assert not args.local
+    for flag in ('--sessions', '--humans-per-game', '--players-per-game'):
+        with pytest.raises(SystemExit):
+            parse_args([flag, '0'])
+        with pytest.raises(SystemExit):
+            parse_args([flag, '-3'])
+
+
+def test_LoadGenerator_without_sessions():
+    with pytest.raises(ValueError):
+        LoadGenerator(lambda factory: None, 0)
+    with pytest.raises(ValueError):
+        LoadGenerator(lambda factory: None, 10, humansPerGame=0)
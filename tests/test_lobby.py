@@ -75,3 +75,28 @@ def test_players():
     lobby.getGameInfo(42).players[0].playerId == 1
     lobby.delPlayerFromGame(1, 42)
     assert len(lobby.getGameInfo(42).players) == 0
+    with pytest.raises(LobbyError):
+        lobby.delPlayer(2)
+    lobby.addPlayer(2)
+    assert [p.playerId for p in lobby.players] == [1, 2]
+
+
+def test_gameNames():
+    lobby = Lobby()
+    for gameId in (1, 2, 3):
+        gameinfo = GameInfo("My Game" if gameId < 3 else "Other Game")
+        gameinfo.gameId = gameId
+        lobby.addGameInfo(gameinfo)
+    assert [g.gameId for g in lobby.gameInfos] == [1, 2, 3]
+    assert lobby.getGameInfoId("Other Game") == 3
+    with pytest.raises(LobbyError):
+        lobby.getGameInfoId("My Game")
+    lobby.delGameInfo(1)
+    assert [g.gameId for g in lobby.gameInfos] == [2, 3]
+    assert lobby.getGameInfoId("My Game") == 2
+    lobby.delGameInfo(3)
+    with pytest.raises(LobbyError):
+        lobby.getGameInfoId("Other Game")
+    with pytest.raises(LobbyError):
+        lobby.delGameInfo(3)
+    assert lobby._gameIdsByName == {"My Game": [2]}
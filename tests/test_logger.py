@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+from twisted.python import log
+
+from pokerthproto import logger
+from pokerthproto.logger import Level, Category
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+class Formatted(object):
+    count = 0
+
+    def __str__(self):
+        Formatted.count += 1
+        return 'formatted'
+
+
+def test_Logger():
+    events = []
+    log.addObserver(events.append)
+    try:
+        game_log = logger.Logger(Category.GAME, Level.INFO)
+        assert game_log.category == Category.GAME
+        assert game_log.isEnabledFor(Level.ERROR)
+        assert not game_log.isEnabledFor(Level.DEBUG)
+        arg = Formatted()
+        game_log.debug("{}", arg)
+        game_log.log(Level.DEBUG, "{}", arg)
+        assert Formatted.count == 0
+        assert events == []
+        game_log.info("{} {name}", arg, name='info')
+        game_log.warning("warning")
+        game_log.error("{}", arg)
+        game_log.log(Level.ERROR, "log")
+        assert Formatted.count == 2
+        texts = [e['message'][0] for e in events]
+        assert texts == ['formatted info', 'warning', 'formatted', 'log']
+        assert all(e['system'] == Category.GAME for e in events)
+        assert events[0]['logLevel'] == Level.INFO
+    finally:
+        log.removeObserver(events.append)
+
+
+def test_setLevel():
+    assert logger.getLogger(Category.WIRE) is logger.wire
+    try:
+        logger.setLevel(Level.OFF)
+        for category in (Category.WIRE, Category.DISPATCH, Category.GAME,
+                         Category.LOBBY):
+            assert logger.getLogger(category).level == Level.OFF
+        logger.setLevel(Level.DEBUG, Category.LOBBY)
+        assert logger.lobby.isEnabledFor(Level.DEBUG)
+        assert not logger.game.isEnabledFor(Level.ERROR)
+    finally:
+        logger.setLevel(Level.INFO)
+
+
+def test_Hex():
+    data = memoryview(bytearray(b'\x00\x01\xff'))
+    assert "{}".format(logger.Hex(data)) == '0001ff'
+    assert str(logger.Hex(b'ab')) == '6162'
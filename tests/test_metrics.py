@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import random
+from StringIO import StringIO
+
+from twisted.test import proto_helpers
+
+from pokerthproto import pokerth_pb2
+from pokerthproto import transport
+from pokerthproto.metrics import Histogram, MessageMetrics, Stage
+from pokerthproto.protocol import PokerTHProtocol
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+def test_Histogram():
+    histogram = Histogram(significantDigits=2)
+    assert histogram.percentile(50) is None
+    assert histogram.mean is None
+    rng = random.Random(42)
+    values = sorted(rng.expovariate(1/0.01) for _ in range(10000))
+    for value in values:
+        histogram.record(value)
+    assert histogram.count == len(values)
+    for p in (1, 50, 90, 99, 99.9):
+        exact = values[int(round(p*len(values)/100)) - 1]
+        assert abs(histogram.percentile(p) - exact) <= 0.01*exact + 2e-6
+    assert histogram.percentile(100) == int(values[-1]*1e6)*1e-6
+    assert abs(histogram.mean - sum(values)/len(values)) < 1e-5
+    histogram = Histogram()
+    histogram.record(0.)
+    histogram.record(-1.)
+    assert histogram.percentile(100) == 0.
+
+
+def test_Histogram_merge():
+    first, second, both = Histogram(), Histogram(), Histogram()
+    for value in (1e-6, 0.5, 3.):
+        first.record(value)
+        both.record(value)
+    for value in (2e-3, 10.):
+        second.record(value)
+        both.record(value)
+    first.merge(second)
+    assert first.count == 5
+    assert first.min == both.min and first.max == both.max
+    assert first._counts == both._counts
+
+
+class Timer(object):
+
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        self.now += 0.001
+        return self.now
+
+
+class TimedProtocol(PokerTHProtocol):
+
+    def playersTurnReceived(self, msg):
+        self.metrics.timer.now += 0.010
+
+    def playersActionDoneReceived(self, msg):
+        self._sendMessage(pokerth_pb2.MyActionRequestMessage(
+            gameId=1, handNum=1, gameState=pokerth_pb2.netStatePreflop,
+            myAction=pokerth_pb2.netActionCheck, myRelativeBet=0))
+
+
+def test_MessageMetrics():
+    timer = Timer()
+    metrics = MessageMetrics(timer)
+    proto = TimedProtocol()
+    proto.metrics = metrics
+    proto.makeConnection(proto_helpers.StringTransport())
+    turn = pokerth_pb2.PlayersTurnMessage(
+        gameId=1, playerId=2, gameState=pokerth_pb2.netStatePreflop)
+    proto.dataReceived(transport.pack(transport.envelop(turn)))
+    histogram = metrics.getHistogram(pokerth_pb2.PlayersTurnMessage)
+    assert histogram.count == 1
+    assert abs(histogram.percentile(50) - 0.012) < 1e-4
+    handler = metrics.getHistogram(pokerth_pb2.PlayersTurnMessage,
+                                   Stage.HANDLER)
+    assert abs(handler.percentile(50) - 0.011) < 1e-4
+    # a delayed reply is attributed to the last received message
+    timer.now += 1.
+    proto._sendMessage(pokerth_pb2.MyActionRequestMessage(
+        gameId=1, handNum=1, gameState=pokerth_pb2.netStatePreflop,
+        myAction=pokerth_pb2.netActionCheck, myRelativeBet=0))
+    response = metrics.getHistogram(pokerth_pb2.PlayersTurnMessage,
+                                    Stage.RESPONSE)
+    assert abs(response.percentile(50) - 1.013) < 0.01
+    proto._sendMessage(pokerth_pb2.MyActionRequestMessage(
+        gameId=1, handNum=1, gameState=pokerth_pb2.netStatePreflop,
+        myAction=pokerth_pb2.netActionCheck, myRelativeBet=0))
+    assert response.count == 1
+    action = pokerth_pb2.PlayersActionDoneMessage(
+        gameId=1, playerId=2, gameState=pokerth_pb2.netStatePreflop,
+        playerAction=pokerth_pb2.netActionCheck, totalPlayerBet=0,
+        playerMoney=100, highestSet=0, minimumRaise=10)
+    proto.dataReceived(2*transport.pack(transport.envelop(action)))
+    histogram = metrics.getHistogram(pokerth_pb2.PlayersActionDoneMessage,
+                                     Stage.RESPONSE)
+    assert histogram.count == 2
+    assert metrics.getHistogram(pokerth_pb2.InitMessage) is None
+    rows = metrics.summary(percentiles=(50,))
+    assert [row[:3] for row in rows[:4]] == [
+        ('PlayersTurnMessage', Stage.DECODE, 1),
+        ('PlayersTurnMessage', Stage.HANDLER, 1),
+        ('PlayersTurnMessage', Stage.TOTAL, 1),
+        ('PlayersTurnMessage', Stage.RESPONSE, 1)]
+    out = StringIO()
+    metrics.dump(out)
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 9
+    assert lines[0].split() == ['message', 'stage', 'count', 'mean', 'p50',
+                                'p90', 'p99', 'p100']
+
+
+def test_dumpOnShutdown():
+    reactor = proto_helpers.MemoryReactor()
+    metrics = MessageMetrics()
+    out = StringIO()
+    metrics.dumpOnShutdown(out, reactor=reactor)
+    assert reactor.triggers['before']['shutdown'][0] == (metrics.dump,
+                                                         (out,), {})
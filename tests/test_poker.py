@@ -2,6 +2,9 @@
 
 from __future__ import print_function, absolute_import, division
 
+import random
+from itertools import permutations
+
 import pytest
 
 from pokerthproto import poker
@@ -19,3 +22,140 @@ def test_cardToInt_and_intToCard():
         assert poker.intToCard(i) == c
     for card in poker.deck:
         assert card == poker.intToCard(poker.cardToInt(card))
+
+
+def test_rankHand():
+    def rank(hand):
+        return poker.rankHand([poker.cardToInt(c) for c in hand.split()])
+
+    hands = ['2d 3h 4s 5c 7d', '2d 3h 4s 5c 8d', 'Ad Kh Qs Jc 9d',
+             '2d 2h 4s 5c 7d', '2d 2h As Kc Qd', 'Ad Ah 4s 5c 7d',
+             '3d 3h 2s 2c Ad', 'Ad Ah 2s 2c 3d', '2d 2h 2s 5c 7d',
+             'Ad 2h 3s 4c 5d', '2d 3h 4s 5c 6d', 'Td Jh Qs Kc Ad',
+             '2d 3d 4d 5d 7d', 'Ad Kd Qd Jd 9d', '2d 2h 2s 3c 3d',
+             'Ad Ah As Kc Kd', '2d 2h 2s 2c 3d', 'Ad 2d 3d 4d 5d',
+             '9d Td Jd Qd Kd', 'Ts Js Qs Ks As']
+    ranks = [rank(hand) for hand in hands]
+    assert ranks == sorted(ranks)
+    assert len(set(ranks)) == len(ranks)
+    assert rank('2d 3h 4s 5c 7d') == rank('7h 5s 4d 3c 2h')
+    assert poker.handCategory(ranks[0]) == poker.HandCategory.HIGH_CARD
+    assert poker.handCategory(ranks[-1]) == poker.HandCategory.STRAIGHT_FLUSH
+
+
+def test_bestHand():
+    cards = [poker.cardToInt(c) for c in 'Ah Kd 2h 7h 9c Qh 3h'.split()]
+    rank, positions = poker.bestHand(cards)
+    assert positions == (0, 2, 3, 5, 6)
+    assert poker.handCategory(rank) == poker.HandCategory.FLUSH
+    rank, positions = poker.bestHand(cards[:5])
+    assert positions == (0, 1, 2, 3, 4)
+    assert poker.handCategory(rank) == poker.HandCategory.HIGH_CARD
+
+
+def test_evaluate():
+    random.seed(42)
+    for n in (5, 6, 7):
+        for _ in range(2000):
+            cards = random.sample(range(52), n)
+            assert poker.evaluate(cards) == poker.bestHand(cards)[0]
+    cards = [poker.cardToInt(c) for c in 'Ah Kd 2h 7h 9c Qh 3h'.split()]
+    assert poker.evaluate(cards) == poker.bestHand(cards)[0]
+    wheel = [poker.cardToInt(c) for c in 'Ah 2h 3h 4h 5h 5d 5c'.split()]
+    assert poker.handCategory(poker.evaluate(wheel)) == \
+        poker.HandCategory.STRAIGHT_FLUSH
+    # number of distinct poker hands of five cards
+    tables = poker._evaluatorTables()
+    fives = set(rank for rank in tables.flushes if rank)
+    for counts in poker._rankMultisets(5):
+        fives.add(poker._rankCounts(counts))
+    assert len(fives) == 7462
+
+
+def test_evaluateMany():
+    np = pytest.importorskip('numpy')
+    random.seed(42)
+    for n in (5, 6, 7):
+        cards = np.array([random.sample(range(52), n) for _ in range(5000)])
+        ranks = poker.evaluateMany(cards)
+        assert ranks.tolist() == [poker.evaluate(c) for c in cards.tolist()]
+
+
+def test_CardSet():
+    cards = poker.CardSet(['Ah', '2d', 'Tc'])
+    assert len(cards) == 3
+    assert 'Ah' in cards and poker.cardToInt('Ah') in cards
+    assert 'Ad' not in cards
+    assert cards.toInts() == sorted(poker.cardToInt(c)
+                                    for c in ['Ah', '2d', 'Tc'])
+    assert cards.toStrings() == ['2d', 'Ah', 'Tc']
+    assert list(cards) == cards.toInts()
+    assert poker.CardSet(cards.toInts()) == cards
+    assert poker.CardSet.fromMask(cards.mask) == cards
+    assert poker.CardSet(cards) == cards
+    assert hash(poker.CardSet(['Ah', '2d', 'Tc'])) == hash(cards)
+    other = poker.CardSet([poker.cardToInt('Ah'), poker.cardToInt('Ks')])
+    assert (cards | other).toStrings() == ['2d', 'Ah', 'Ks', 'Tc']
+    assert (cards & other).toStrings() == ['Ah']
+    assert (cards - other).toStrings() == ['2d', 'Tc']
+    assert (cards - ['2d']) != cards
+    assert not cards.isdisjoint(other)
+    assert cards.isdisjoint(['Ks'])
+    assert not poker.CardSet()
+    assert len(poker.FULL_DECK) == 52
+    assert sorted(poker.FULL_DECK.toStrings()) == sorted(poker.deck)
+    assert len(poker.FULL_DECK - cards - other) == 48
+    assert repr(other) == "CardSet(['Ah', 'Ks'])"
+    assert poker.evaluate(poker.CardSet('Ah Kh Qh Jh Th 2c'.split())) == \
+        poker.evaluate([poker.cardToInt(c) for c in 'Ah Kh Qh Jh Th'.split()])
+    with pytest.raises(ValueError):
+        poker.CardSet(['Xx'])
+    with pytest.raises(ValueError):
+        poker.CardSet([52])
+
+
+def permuteSuits(cards, perm):
+    return [13*perm[c // 13] + c % 13 for c in cards]
+
+
+def test_canonicalIndex():
+    # known numbers of hands distinct up to permutations of the suits
+    assert [poker.numCanonical(n) for n in (0, 3, 4, 5)] == \
+        [169, 1286792, 13960050, 123156254]
+    assert poker.canonicalIndex(['As', 'Kd'], ['Qh', 'Jh', '2c']) == \
+        poker.canonicalIndex(['Ah', 'Ks'], ['2c', 'Qd', 'Jd'])
+    assert poker.canonicalIndex(['As', 'Kd'], ['Qh', 'Jh', '2c']) != \
+        poker.canonicalIndex(['As', 'Kd'], ['Qs', 'Jh', '2c'])
+    preflop = set(poker.canonicalIndex(poker.CardSet([c1, c2]))
+                  for c1 in range(52) for c2 in range(c1 + 1, 52))
+    assert preflop == set(range(169))
+    random.seed(42)
+    for numBoard in (0, 3, 4, 5):
+        for _ in range(500):
+            cards = random.sample(range(52), 2 + numBoard)
+            index = poker.canonicalIndex(cards[:2], cards[2:])
+            assert 0 <= index < poker.numCanonical(numBoard)
+            perm = random.sample(range(4), 4)
+            cards = permuteSuits(cards, perm)
+            assert poker.canonicalIndex(cards[:2], cards[2:]) == index
+    with pytest.raises(ValueError):
+        poker.canonicalIndex(['Ah', 'Ks'], ['Ah', '2c', '3c'])
+    with pytest.raises(ValueError):
+        poker.canonicalIndex(['Ah', 'Ks'], ['2c'])
+
+
+def test_canonicalHand():
+    random.seed(42)
+    for numBoard in (0, 3, 4, 5):
+        size = poker.numCanonical(numBoard)
+        for index in random.sample(range(size), 100) + [0, size - 1]:
+            hole, board = poker.canonicalHand(index, numBoard)
+            assert len(hole) == 2 and len(board) == numBoard
+            assert poker.canonicalIndex(hole, board) == index
+        cards = random.sample(range(52), 2 + numBoard)
+        hole, board = poker.canonicalize(cards[:2], cards[2:])
+        assert any(sorted(permuteSuits(cards[:2], perm)) == hole and
+                   sorted(permuteSuits(cards[2:], perm)) == board
+                   for perm in permutations(range(4)))
+    with pytest.raises(ValueError):
+        poker.canonicalHand(169)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+from collections import Counter
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pokerthproto.poker import cardToInt
+from pokerthproto.equity import COMBOS
+from pokerthproto.preflop import (PreflopTables, PreflopError, handClass,
+                                  handClassName, classCards, drawBoards,
+                                  matchupEquities, main)
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+def cards(text):
+    return [cardToInt(c) for c in text.split()]
+
+
+@pytest.fixture(scope='module')
+def tables(tmpdir_factory):
+    path = str(tmpdir_factory.mktemp('preflop').join('preflop.tbl'))
+    main([path, '--trials', '200', '--hand-trials', '2',
+          '--max-opponents', '2', '--seed', '42'])
+    return path
+
+
+def test_handClass():
+    classes = Counter(handClass(*combo) for combo in COMBOS.tolist())
+    assert sorted(classes) == list(range(169))
+    names = dict((handClassName(i), n) for i, n in classes.items())
+    assert names['AA'] == 6
+    assert names['AKs'] == 4
+    assert names['AKo'] == 12
+    assert names['T9o'] == 12
+    assert handClass(*cards('Ah Kh')) == handClass(*cards('Kd Ad'))
+    assert handClass(*cards('Ah Kd')) != handClass(*cards('Ah Kh'))
+    for i in range(169):
+        assert handClass(*classCards(i)) == i
+
+
+def test_drawBoards():
+    rng = np.random.RandomState(42)
+    known = np.tile(np.arange(4), (10000, 1))
+    boards = drawBoards(rng, known)
+    assert (boards >= 4).all()
+    cards = np.sort(boards, axis=1)
+    assert (cards[:, 1:] != cards[:, :-1]).all()
+    counts = np.bincount(boards.ravel(), minlength=52)[4:]
+    assert abs(counts/50000. - 1/48.).max() < 0.005
+
+
+def test_matchupEquities():
+    rng = np.random.RandomState(42)
+    equities = matchupEquities(np.array([cards('Ah Ad'), cards('7h 2d')]),
+                               np.array([cards('Kh Kd'), cards('Ah Ad')]),
+                               20000, rng, chunkSize=10000)
+    assert abs(equities[0] - 0.82) < 0.01
+    assert abs(equities[1] - 0.11) < 0.01
+
+
+def test_PreflopTables(tables):
+    with PreflopTables(tables) as preflop:
+        assert preflop.maxOpponents == 2
+        assert (preflop.trials, preflop.handTrials) == (200, 2)
+        aces = preflop.equity(cards('Ah Ad'))
+        assert aces > preflop.equity(cards('7h 2d'))
+        assert aces > preflop.equity(cards('As Ac'), numOpponents=2)
+        assert aces == preflop.classEquities()[handClass(*cards('Ah Ad'))]
+        assert len(preflop.classEquities(2)) == 169
+        equity = preflop.handVsHand(cards('Ah Ad'), cards('Kh Kd'))
+        assert 0 <= equity <= 1
+        # same matchup with other suits
+        assert preflop.handVsHand(cards('As Ac'), cards('Ks Kc')) == equity
+        assert preflop.handVsHand(cards('Ac As'), cards('Kc Ks')) == equity
+        with pytest.raises(ValueError):
+            preflop.handVsHand(cards('Ah Ad'), cards('Ah Kd'))
+
+
+def test_PreflopError(tmpdir):
+    path = tmpdir.join('preflop.tbl')
+    path.write(b'no tables')
+    with pytest.raises(PreflopError):
+        PreflopTables(str(path))
+    path.write(b'no tables at all, really not')
+    with pytest.raises(PreflopError):
+        PreflopTables(str(path))
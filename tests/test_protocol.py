@@ -6,8 +6,8 @@ import sys
 import random
 
 from twisted.internet.endpoints import TCP4ClientEndpoint, connectProtocol
-from twisted.internet import reactor, task
-from twisted.python import log
+from twisted.internet import reactor, task, error
+from twisted.python import log, failure
 from twisted.internet.defer import Deferred
 from twisted.test import proto_helpers
 
@@ -17,8 +17,10 @@ from pokerthproto import lobby
 from pokerthproto import game
 from pokerthproto import protocol
 from pokerthproto import pokerth_pb2
+from pokerthproto import poker
 from pokerthproto.protocol import ClientProtocol, ClientProtocolFactory
-from pokerthproto.transport import unpack, develop
+from pokerthproto.transport import unpack, develop, pack, envelop, \
+    FrameDecoder
 
 __author__ = 'Florian Wilhelm'
 __copyright__ = 'Florian Wilhelm'
@@ -182,3 +184,110 @@ def test_chat():
     assert reply.targetPlayerId == 6
 
 
+def test_dispatch():
+    received = []
+
+    class PyClientProtocol(ClientProtocol):
+
+        def chatReceived(self, msg):
+            received.append(msg)
+
+    class PyClientProtocolFactory(ClientProtocolFactory):
+        protocol = PyClientProtocol
+
+    factory = PyClientProtocolFactory('PyClient1')
+    proto = factory.buildProtocol(("localhost", 0))
+    proto.makeConnection(proto_helpers.StringTransport())
+    msg_type = pokerth_pb2.PokerTHMessage.Type_ChatMessage
+    assert proto._handlers[msg_type] == proto.chatReceived
+    msg_type = pokerth_pb2.PokerTHMessage.Type_ErrorMessage
+    assert proto._handlers[msg_type] == proto.unhandledMessageReceived
+    msg = pokerth_pb2.ChatMessage()
+    msg.chatType = msg.chatTypeLobby
+    msg.chatText = "Ping"
+    data = pack(envelop(msg))
+    proto.dataReceived(data + data[:7])
+    proto.dataReceived(data[7:])
+    assert received == [msg, msg]
+
+
+def gameListNew(gameId, gameName):
+    msg = pokerth_pb2.GameListNewMessage()
+    msg.gameId = gameId
+    msg.gameMode = pokerth_pb2.netGameCreated
+    msg.isPrivate = False
+    msg.adminPlayerId = 1
+    msg.gameInfo.MergeFrom(lobby.GameInfo(gameName).getMsg())
+    return msg
+
+
+def test_gameListUpdate():
+    factory = ClientProtocolFactory('PyClient1')
+    proto = factory.buildProtocol(("localhost", 0))
+    proto.makeConnection(proto_helpers.StringTransport())
+    proto.dataReceived(pack(envelop(gameListNew(1, "Load Game"))))
+    msg = pokerth_pb2.GameListUpdateMessage()
+    msg.gameId = 1
+    msg.gameMode = pokerth_pb2.netGameStarted
+    proto.dataReceived(pack(envelop(msg)))
+    assert factory.lobby.getGameInfo(1).gameMode == pokerth_pb2.netGameStarted
+    msg.gameMode = pokerth_pb2.netGameClosed
+    proto.dataReceived(pack(envelop(msg)))
+    assert not factory.lobby.gameInfos
+    proto.dataReceived(pack(envelop(gameListNew(2, "Load Game"))))
+    assert factory.lobby.getGameInfoId("Load Game") == 2
+
+
+def test_corked():
+    class PyClientProtocol(ClientProtocol):
+        corked = True
+
+    class PyClientProtocolFactory(ClientProtocolFactory):
+        protocol = PyClientProtocol
+
+    factory = PyClientProtocolFactory('PyClient1')
+    factory.game = game.Game(1, 42)
+    factory.game.addRound(poker.Round.SMALL_BLIND)
+    proto = factory.buildProtocol(("localhost", 0))
+    proto.clock = task.Clock()
+    transport = proto_helpers.StringTransport()
+    proto.makeConnection(transport)
+    proto.sendChatRequest("Hello")
+    proto.sendChatRequest("World")
+    assert transport.value() == ''
+    proto.clock.advance(0)
+    frames = list(FrameDecoder().feed(transport.value()))
+    texts = [develop(unpack(frame)).chatText for frame in frames]
+    assert texts == ["Hello", "World"]
+    transport.clear()
+    proto.sendChatRequest("Hello")
+    proto.sendMyAction(poker.Action.CHECK, 0)
+    frames = list(FrameDecoder().feed(transport.value()))
+    assert len(frames) == 2
+    assert not proto.clock.getDelayedCalls()
+
+
+def test_waitFor():
+    factory = ClientProtocolFactory('PyClient1')
+    proto = factory.buildProtocol(("localhost", 0))
+    proto.makeConnection(proto_helpers.StringTransport())
+    d_chat = proto.waitFor(pokerth_pb2.ChatMessage)
+    d_error = proto.waitFor(pokerth_pb2.ErrorMessage)
+    queue = proto.addMessageQueue()
+    received = []
+    d_chat.addCallback(received.append)
+    msg = pokerth_pb2.ChatMessage()
+    msg.chatType = msg.chatTypeLobby
+    msg.chatText = "Ping"
+    proto.dataReceived(pack(envelop(msg)))
+    assert received == [msg]
+    assert not d_error.called
+    queue.get().addCallback(received.append)
+    assert received == [msg, msg]
+    proto.removeMessageQueue(queue)
+    proto.dataReceived(pack(envelop(msg)))
+    assert not queue.pending
+    proto.connectionLost(failure.Failure(error.ConnectionDone()))
+    errors = []
+    d_error.addErrback(errors.append)
+    assert errors[0].check(error.ConnectionDone)
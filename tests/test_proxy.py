@@ -6,13 +6,19 @@ import random
 
 from twisted.internet.endpoints import TCP4ServerEndpoint, connectProtocol, \
     TCP4ClientEndpoint
-from twisted.internet import reactor
+from twisted.internet import reactor, task, defer
 from twisted.internet.defer import Deferred
+from twisted.python import log
+from twisted.test import iosim, proto_helpers
 
-from .fixtures import pokerth_server
+from .fixtures import pokerth_server, initMsgData
 
 from pokerthproto import proxy
+from pokerthproto import capture
 from pokerthproto import protocol
+from pokerthproto import server
+from pokerthproto import transport
+from pokerthproto import pokerth_pb2
 from pokerthproto.protocol import ClientProtocol, ClientProtocolFactory
 
 __author__ = 'Florian Wilhelm'
@@ -46,3 +52,140 @@ def test_ProxyProtocol(pokerth_server):
     d = server_endpoint.listen(proxy.ProxyProtocolFactory())
     d.addCallback(start_client)
     return d
+
+
+class LobbyClientProtocol(ClientProtocol):
+
+    def handleInsideLobby(self, lobbyInfo):
+        self.factory.inLobby = True
+
+
+def test_ProxyProtocol_forwards(tmpdir):
+    clock = task.Clock()
+    serverFactory = server.ServerProtocolFactory(seed=42)
+    serverFactory.clock = clock
+    frames = []
+    monitor = proxy.FrameMonitor(handler=lambda *args: frames.append(args),
+                                 process=False)
+    pumps = []
+
+    class LocalProxyProtocolFactory(proxy.ProxyProtocolFactory):
+
+        def connectServer(self, clientFactory):
+            clientProto = clientFactory.buildProtocol(None)
+            serverProto = serverFactory.buildProtocol(None)
+            pumps.append(iosim.connect(
+                serverProto, iosim.makeFakeServer(serverProto),
+                clientProto, iosim.makeFakeClient(clientProto)))
+            return defer.succeed(clientProto)
+
+    path = str(tmpdir.join('proxy.cap'))
+    proxyFactory = LocalProxyProtocolFactory(
+        monitor=monitor, capture=capture.CaptureWriter(path))
+    proxyFactory.startFactory()
+    factory = ClientProtocolFactory('PyClient1')
+    factory.protocol = LobbyClientProtocol
+    factory.inLobby = False
+    clientProto = factory.buildProtocol(None)
+    clientProto.clock = clock
+    proxyProto = proxyFactory.buildProtocol(None)
+    pumps.append(iosim.connect(proxyProto, iosim.makeFakeServer(proxyProto),
+                               clientProto, iosim.makeFakeClient(clientProto)))
+    for _ in range(3):
+        for pump in pumps:
+            pump.flush()
+        clock.advance(1)
+    assert factory.inLobby
+    assert factory.playerId == 1
+    proxyFactory.stopFactory()
+    assert monitor.handled == monitor.seen == len(frames)
+    directions = [direction for direction, _, _ in frames]
+    assert directions[:2] == [capture.Direction.FROM_SERVER,
+                              capture.Direction.FROM_CLIENT]
+    assert all(connId == 1 for _, connId, _ in frames)
+    announce = transport.develop(transport.unpack(frames[0][2]))
+    assert isinstance(announce, pokerth_pb2.AnnounceMessage)
+    records = list(capture.CaptureReader(path))
+    assert [r.frame for r in records] == [frame for _, _, frame in frames]
+    assert [r.direction for r in records[:2]] == [
+        capture.Direction.FROM_SERVER, capture.Direction.FROM_CLIENT]
+
+
+class PendingProxyProtocolFactory(proxy.ProxyProtocolFactory):
+
+    def connectServer(self, clientFactory):
+        self.serverFactory = clientFactory
+        self.connecting = Deferred()
+        return self.connecting
+
+
+def test_ProxyProtocol_server_failed():
+    proxyFactory = PendingProxyProtocolFactory()
+    proxyProto = proxyFactory.buildProtocol(None)
+    proxyTransport = proto_helpers.StringTransport()
+    proxyProto.makeConnection(proxyTransport)
+    proxyFactory.connecting.errback(RuntimeError("refused"))
+    assert proxyTransport.disconnecting
+
+
+def test_ProxyProtocol_client_lost(initMsgData):
+    proxyFactory = PendingProxyProtocolFactory()
+    proxyProto = proxyFactory.buildProtocol(None)
+    proxyProto.makeConnection(proto_helpers.StringTransport())
+    proxyProto.dataReceived(initMsgData)
+    proxyProto.connectionLost(None)
+    serverProto = proxy.ClientProtocol()
+    serverTransport = proto_helpers.StringTransport()
+    serverProto.makeConnection(serverTransport)
+    proxyFactory.connecting.callback(serverProto)
+    assert serverTransport.disconnecting
+    assert serverTransport.value() == b''
+    assert proxyProto.client_proto is None
+
+
+def test_ProxyProtocol_server_lost():
+    proxyFactory = PendingProxyProtocolFactory()
+    proxyProto = proxyFactory.buildProtocol(None)
+    proxyTransport = proto_helpers.StringTransport()
+    proxyProto.makeConnection(proxyTransport)
+    serverProto = proxyFactory.serverFactory.buildProtocol(None)
+    serverProto.makeConnection(proto_helpers.StringTransport())
+    proxyFactory.connecting.callback(serverProto)
+    assert not proxyTransport.disconnecting
+    serverProto.connectionLost(None)
+    assert proxyTransport.disconnecting
+
+
+def test_FrameMonitor():
+    frames = []
+    monitor = proxy.FrameMonitor(handler=lambda *args: frames.append(args),
+                                 maxSize=2, process=False)
+    frame = memoryview(bytearray(b'frame'))
+    for _ in range(3):
+        monitor.put(capture.Direction.FROM_CLIENT, 1, frame)
+    assert monitor.seen == 3
+    assert monitor.dropped == 1
+    monitor.start()
+    monitor.stop()
+    assert frames == 2*[(capture.Direction.FROM_CLIENT, 1, b'frame')]
+    assert monitor.handled == 2
+    # the handler runs in another process, thus only the counts are visible
+    sampled = proxy.FrameMonitor(handler=lambda *args: None, sampleEvery=3,
+                                 process=True)
+    sampled.start()
+    for _ in range(9):
+        sampled.put(capture.Direction.FROM_SERVER, 1, frame)
+    sampled.stop()
+    assert sampled.seen == 9
+    assert sampled.handled == 3
+
+
+def test_logFrame(initMsgData):
+    events = []
+    log.addObserver(events.append)
+    try:
+        proxy.logFrame(capture.Direction.FROM_CLIENT, 7, initMsgData[4:])
+    finally:
+        log.removeObserver(events.append)
+    text = events[0]['message'][0]
+    assert text.startswith('InitMessage from client 7:')
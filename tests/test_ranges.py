@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pokerthproto import game
+from pokerthproto import player
+from pokerthproto import poker
+from pokerthproto.poker import Action, CardSet, cardToInt
+from pokerthproto.analysis import AnalysisProtocol
+from pokerthproto.capture import CaptureReader, Direction
+from pokerthproto.equity import (COMBOS, EquityError, comboIndex,
+                                 exactEquity, monteCarloEquity)
+from pokerthproto.ranges import (Range, RangeTracker, StrengthModel,
+                                 ActionModel, rangeEquity)
+
+from .test_replay import recordGame
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+BOARD = ['2c', '7d', '9s', 'Kd', '3h']
+
+
+def single(card1, card2):
+    weights = np.zeros(len(COMBOS))
+    weights[comboIndex(cardToInt(card1), cardToInt(card2))] = 1.
+    return Range(weights)
+
+
+def test_Range():
+    full = Range()
+    assert full.numCombos == 1326
+    assert Range.fromHands(['AA']).numCombos == 6
+    assert Range.fromHands(['AKs']).numCombos == 4
+    assert Range.fromHands(['AKo']).numCombos == 12
+    assert Range.fromHands(['AK', 'QQ']).numCombos == 22
+    with pytest.raises(ValueError):
+        Range.fromHands(['AAs'])
+    aces = Range.fromHands(['AA', 'KK']).remove(['Ah', 'Kd', 'Ks'])
+    assert aces.numCombos == 3 + 1
+    assert aces.weight(['Ad', 'Ac']) == 1. and aces.weight(['Ah', 'Ad']) == 0
+    assert aces.copy().hold(['Kh', 'Kc']).numCombos == 1
+    copy = aces.copy().normalize()
+    assert copy.total == pytest.approx(1.)
+    assert aces.total == 4.
+    with pytest.raises(EquityError):
+        Range.fromHands(['AA']).remove(['Ah', 'Ad', 'Ac']).normalize()
+
+
+def test_Range_update():
+    likelihoods = np.where(np.arange(len(COMBOS)) % 2, 0.5, 0.25)
+    result = Range().remove(['Ah']).update(likelihoods)
+    assert result.total == pytest.approx(1.)
+    assert result.weight(['Kd', 'Ks']) / result.weight(['Kd', 'Kc']) in \
+        (2., 0.5)
+    assert result.weight(['Ah', 'Kd']) == 0.
+
+
+def test_rangeEquity():
+    # exact on the river for single combos
+    result = single('Ah', 'Ac').equity([Range()], BOARD)
+    assert result.equity == pytest.approx(
+        exactEquity(['Ah', 'Ac'], BOARD).equity)
+    assert result.stdError == 0
+    kings = Range.fromHands(['KK'])
+    assert Range.fromHands(['AA']).equity([kings], BOARD).equity == 0.
+    assert Range().equity([Range()], BOARD).equity == pytest.approx(0.5)
+    # sampled before
+    expected = monteCarloEquity(['Ah', 'Ac'], BOARD[:3], trials=20000,
+                                seed=1)
+    result = rangeEquity(single('Ah', 'Ac'), [Range()], BOARD[:3],
+                         trials=20000, seed=1)
+    assert abs(result.equity - expected.equity) < \
+        4*(result.stdError + expected.stdError)
+    result = rangeEquity(Range.fromHands(['AA']), [kings, Range()],
+                         precision=0.02, seed=1)
+    assert result.trials < 100000
+    assert 0.55 < result.equity < 0.75
+    with pytest.raises(EquityError):
+        rangeEquity(Range.fromHands(['AA']), [])
+    with pytest.raises(EquityError):
+        rangeEquity(Range.fromHands(['KK']), [Range()], ['Kh', 'Kd', 'Ks'],
+                    dead=['Kc'])
+
+
+class Game(object):
+    pot = 100
+    boardCardSet = CardSet(BOARD[:3])
+
+
+def test_StrengthModel():
+    model = StrengthModel()
+    strengths = model.strengths(CardSet(BOARD[:3]))
+    assert strengths[comboIndex(cardToInt('9h'), cardToInt('9d'))] > 0.99
+    assert model.strengths(CardSet()).argmax() in \
+        [comboIndex(*sorted(cardToInt(c) for c in cards))
+         for cards in [('Ah', 'Ad'), ('Ah', 'As'), ('Ah', 'Ac'),
+                       ('Ad', 'As'), ('Ad', 'Ac'), ('As', 'Ac')]]
+    someone = player.Player(2)
+    means = {}
+    for kind in (Action.CHECK, Action.CALL, Action.RAISE):
+        likelihoods = model.likelihoods(game.ActionInfo(someone, kind, 50),
+                                        Game())
+        assert likelihoods.min() >= model.floor
+        weights = Range().remove(BOARD[:3]).update(likelihoods).weights
+        means[kind] = (weights*strengths).sum()
+    assert means[Action.CHECK] < means[Action.CALL] < means[Action.RAISE]
+    assert model.likelihoods(game.ActionInfo(someone, Action.FOLD),
+                             Game()) is None
+    with pytest.raises(NotImplementedError):
+        ActionModel().likelihoods(None, None)
+
+
+def test_RangeTracker():
+    pgame = game.Game(1, 1)
+    for playerId in (1, 2, 3):
+        pgame.addPlayer(player.Player(playerId))
+        pgame.getPlayer(playerId).money = 100
+    pgame.addRound(poker.Round.SMALL_BLIND)
+    pgame.addRound(poker.Round.BIG_BLIND)
+    pgame.addRound(poker.Round.PREFLOP)
+    pgame.pocketCards = ['Ah', 'Ad']
+    tracker = RangeTracker(StrengthModel())
+    pgame.addAction(2, Action.RAISE, 40)
+    tracker.observe(pgame.currRoundInfo.actions[-1], pgame)
+    pgame.addAction(3, Action.FOLD)
+    tracker.observe(pgame.currRoundInfo.actions[-1], pgame)
+    raiser = tracker.getRange(pgame, 2)
+    assert raiser.weight(['Ah', 'Kh']) == 0
+    assert raiser.weight(['Ks', 'Kc']) > raiser.weight(['7s', '2c'])
+    assert tracker.getRange(pgame, 3).numCombos == 1225
+    assert 1 not in tracker.ranges
+    pgame.addRound(poker.Round.FLOP, BOARD[:3])
+    result = tracker.equity(pgame, trials=10000, seed=1)
+    expected = monteCarloEquity(['Ah', 'Ad'], BOARD[:3], dead=[],
+                                ranges=[raiser.weights], trials=10000,
+                                seed=1)
+    assert result == expected
+    assert tracker.getRange(pgame, 2).weight(['9s', '9h']) == 0
+    # shown cards are held by their player and blocked for all others
+    pgame.addOthersCards(2, ['Ks', 'Kc'])
+    raiser = tracker.getRange(pgame, 2)
+    assert raiser.numCombos == 1 and raiser.weight(['Ks', 'Kc']) == 1.
+    assert tracker.getRange(pgame, 3).weight(['Ks', 'Kh']) == 0
+    pgame.addAction(2, Action.BET, 20)
+    tracker.observe(pgame.currRoundInfo.actions[-1], pgame)
+    assert tracker.getRange(pgame, 2).weight(['Ks', 'Kc']) == 1.
+    assert tracker.equity(pgame, trials=1000, seed=1) == \
+        monteCarloEquity(['Ah', 'Ad'], BOARD[:3], dead=[],
+                         ranges=[single('Ks', 'Kc').weights], trials=1000,
+                         seed=1)
+    pgame.startNewHand()
+    raiser = tracker.getRange(pgame, 2)
+    assert raiser.weight(['Ks', 'Kc']) == raiser.weight(['7s', '2c'])
+
+
+class TrackingProtocol(AnalysisProtocol):
+
+    def __init__(self):
+        AnalysisProtocol.__init__(self, lambda game: None)
+        self.tracker = RangeTracker(StrengthModel())
+        self.numActions = 0
+
+    def handleAction(self, actionInfo, gameInfo):
+        self.numActions += 1
+        self.tracker.observe(actionInfo, gameInfo)
+        known = gameInfo.pocketCardSet | gameInfo.boardCardSet
+        for playerRange in self.tracker.ranges.values():
+            assert playerRange.weights[
+                (COMBOS[:, :, np.newaxis] ==
+                 np.array(known.toInts())).any(axis=(1, 2))].sum() == 0
+
+
+def test_handleAction(tmpdir):
+    path = str(tmpdir.join('client.cap'))
+    recordGame(path)
+    proto = TrackingProtocol()
+    for record in CaptureReader(path):
+        if record.direction == Direction.RECEIVED:
+            proto.feed(record.frame)
+    assert proto.numActions > 10
+    assert proto.tracker.ranges
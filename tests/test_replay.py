@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+from twisted.internet import task
+from twisted.test import iosim
+
+from pokerthproto import server
+from pokerthproto import pokerth_pb2
+from pokerthproto.capture import CaptureWriter, CaptureReader, Direction
+from pokerthproto.replay import Replay, diffFrames, loadFactory, main
+
+from .test_server import PyClientProtocolFactory, run
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+def recordGame(path, seed=42, numPlayers=3):
+    clock = task.Clock()
+    serverFactory = server.ServerProtocolFactory(seed=seed)
+    serverFactory.clock = clock
+    factory = PyClientProtocolFactory('PyClient1', numPlayers=numPlayers)
+    serverProto = serverFactory.buildProtocol(None)
+    clientProto = factory.buildProtocol(None)
+    clientProto.clock = clock
+    clientProto.capture = CaptureWriter(path, clock=clock.seconds)
+    pump = iosim.connect(serverProto, iosim.makeFakeServer(serverProto),
+                         clientProto, iosim.makeFakeClient(clientProto))
+    run([pump], clock, lambda: factory.winner is not None)
+    clientProto.capture.close()
+    return factory
+
+
+def test_Replay(tmpdir):
+    path = str(tmpdir.join('client.cap'))
+    recorded = recordGame(path)
+    factory = PyClientProtocolFactory('PyClient1')
+    result = Replay(factory.buildProtocol(None)).run(CaptureReader(path))
+    assert factory.winner == recorded.winner
+    assert factory.hands == recorded.hands
+    records = list(CaptureReader(path))
+    assert result.received == sum(r.direction == Direction.RECEIVED
+                                  for r in records)
+    assert len(result.expected) == len(result.sent) > 10
+    assert list(diffFrames(result.expected, result.sent)) == []
+    assert [f.timestamp for f in result.sent] == \
+        [f.timestamp for f in result.expected]
+    assert result.messagesPerSecond > 0
+    assert 'messages replayed' in str(result)
+
+
+def test_Replay_speed(tmpdir):
+    path = str(tmpdir.join('client.cap'))
+    recordGame(path)
+    factory = PyClientProtocolFactory('PyClient1')
+    replay = Replay(factory.buildProtocol(None), speed=1000.)
+    result = replay.run(CaptureReader(path))
+    assert factory.winner is not None
+    duration = result.expected[-1].timestamp
+    assert duration > 10
+    assert result.elapsed >= duration/1000.
+
+
+def test_diffFrames(tmpdir):
+    path = str(tmpdir.join('client.cap'))
+    recordGame(path)
+    factory = PyClientProtocolFactory('PyClient2')
+    result = Replay(factory.buildProtocol(None)).run(CaptureReader(path))
+    diffs = list(diffFrames(result.expected, result.sent))
+    assert diffs[0].index == 0
+    assert isinstance(diffs[0].expected, pokerth_pb2.InitMessage)
+    assert diffs[0].expected.nickName == 'PyClient1'
+    assert diffs[0].actual.nickName == 'PyClient2'
+    missing = list(diffFrames(result.expected, result.sent[:-1]))
+    assert missing[-1].actual is None
+
+
+def test_main(tmpdir, capsys):
+    path = str(tmpdir.join('client.cap'))
+    recordGame(path)
+    factory = loadFactory('tests.test_server:PyClientProtocolFactory', 'Py')
+    assert isinstance(factory, PyClientProtocolFactory)
+    assert factory.nickName == 'Py'
+    main([path, '--factory', 'tests.test_server:PyClientProtocolFactory',
+          '--mmap', '--diff'])
+    out, _ = capsys.readouterr()
+    assert 'messages replayed' in out
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+from twisted.internet import task
+from twisted.test import proto_helpers
+from twisted.test import iosim
+
+from pokerthproto import server
+from pokerthproto import pokerth_pb2
+from pokerthproto import transport
+from pokerthproto.lobby import GameInfo, LobbyError
+from pokerthproto.poker import Action, Round
+from pokerthproto.protocol import ClientProtocol, ClientProtocolFactory
+
+__author__ = 'Florian Wilhelm'
+__copyright__ = 'Florian Wilhelm'
+
+
+class PyClientProtocol(ClientProtocol):
+
+    def handleInsideLobby(self, lobbyInfo):
+        if self.factory.createGame:
+            gameInfo = GameInfo('PyClient Game')
+            gameInfo._maxNumPlayers = self.factory.numPlayers
+            self.sendJoinNewGame(gameInfo)
+        else:
+            try:
+                gameId = lobbyInfo.getGameInfoId('PyClient Game')
+            except LobbyError:
+                self.clock.callLater(1, self.handleInsideLobby, lobbyInfo)
+            else:
+                self.sendJoinExistingGame(gameId)
+
+    def joinGameAckReceived(self, msg):
+        ClientProtocol.joinGameAckReceived(self, msg)
+        self.startIfReady()
+
+    def gamePlayerJoinedReceived(self, msg):
+        ClientProtocol.gamePlayerJoinedReceived(self, msg)
+        self.startIfReady()
+
+    def startIfReady(self):
+        if self.factory.createGame and \
+                len(self.factory.game.players) == self.factory.numHumans:
+            startEvent = pokerth_pb2.StartEventMessage.startEvent
+            self.sendStartEvent(self.factory.game.gameId, startEvent,
+                                fillWithBots=True)
+
+    def handleMyTurn(self, gameInfo):
+        if gameInfo.highestSet > gameInfo.myBet:
+            action = Action.CALL
+        else:
+            action = Action.CHECK
+        self.sendMyAction(action, 0)
+
+    def handleEndOfHand(self, gameInfo):
+        money = sum(p.money for p in gameInfo.players)
+        self.factory.hands.append((gameInfo.handNum, money,
+                                   sorted(gameInfo.wins.items())))
+
+    def handleEndOfGame(self, gameInfo, winner):
+        self.factory.winner = winner.playerId
+
+
+class PyClientProtocolFactory(ClientProtocolFactory):
+    protocol = PyClientProtocol
+
+    def __init__(self, nickName, createGame=True, numPlayers=3, numHumans=1):
+        ClientProtocolFactory.__init__(self, nickName)
+        self.createGame = createGame
+        self.numPlayers = numPlayers
+        self.numHumans = numHumans
+        self.hands = []
+        self.winner = None
+
+
+def connect(serverFactory, clientFactory, clock):
+    serverProto = serverFactory.buildProtocol(None)
+    clientProto = clientFactory.buildProtocol(None)
+    clientProto.clock = clock
+    return iosim.connect(serverProto, iosim.makeFakeServer(serverProto),
+                         clientProto, iosim.makeFakeClient(clientProto))
+
+
+def run(pumps, clock, until, maxSteps=10000):
+    for _ in range(maxSteps):
+        for pump in pumps:
+            pump.flush()
+        if until():
+            return
+        clock.advance(1)
+    raise RuntimeError("Condition not reached")
+
+
+def playGame(seed, numPlayers=3):
+    clock = task.Clock()
+    serverFactory = server.ServerProtocolFactory(seed=seed)
+    serverFactory.clock = clock
+    factory = PyClientProtocolFactory('PyClient1', numPlayers=numPlayers)
+    pump = connect(serverFactory, factory, clock)
+    run([pump], clock, lambda: factory.winner is not None)
+    return serverFactory, factory
+
+
+def test_lobby():
+    clock = task.Clock()
+    serverFactory = server.ServerProtocolFactory(seed=42)
+    serverFactory.clock = clock
+    factory1 = PyClientProtocolFactory('PyClient1', createGame=False)
+    factory2 = PyClientProtocolFactory('PyClient2', createGame=False)
+    pump1 = connect(serverFactory, factory1, clock)
+    pump2 = connect(serverFactory, factory2, clock)
+    pump1.flush()
+    assert factory1.playerId == 1
+    assert factory2.playerId == 2
+    for factory in (factory1, factory2):
+        names = sorted(p.name for p in factory.lobby.players)
+        assert names == ['PyClient1', 'PyClient2']
+    factory3 = PyClientProtocolFactory('PyClient1')
+    pump3 = connect(serverFactory, factory3, clock)
+    assert factory3.playerId is None
+    assert pump3.clientIO.disconnecting
+    pump2.client.transport.loseConnection()
+    pump2.flush()
+    pump1.flush()
+    assert len(factory1.lobby.players) == 1
+
+
+def test_game():
+    serverFactory, factory = playGame(seed=42)
+    assert factory.winner in (p.playerId for p in factory.game.players)
+    assert len(factory.hands) > 1
+    assert all(money == 3*3000 for _, money, _ in factory.hands)
+    assert not serverFactory.games
+    assert list(serverFactory.players.keys()) == [factory.playerId]
+    # closed games are removed from the lobby
+    assert not factory.lobby.gameInfos
+
+
+def test_deterministic():
+    _, factory1 = playGame(seed=1)
+    _, factory2 = playGame(seed=1)
+    _, factory3 = playGame(seed=2)
+    assert factory1.hands == factory2.hands
+    assert factory1.hands != factory3.hands
+
+
+def test_two_humans():
+    clock = task.Clock()
+    serverFactory = server.ServerProtocolFactory(seed=42)
+    serverFactory.clock = clock
+    factory1 = PyClientProtocolFactory('PyClient1', numPlayers=4,
+                                       numHumans=2)
+    factory2 = PyClientProtocolFactory('PyClient2', createGame=False)
+    pumps = [connect(serverFactory, factory1, clock),
+             connect(serverFactory, factory2, clock)]
+    run(pumps, clock, lambda: factory1.winner and factory2.winner)
+    assert factory1.winner == factory2.winner
+    assert len(factory1.game.players) == 4
+    assert factory1.hands == factory2.hands
+
+
+class MessageRecorder(object):
+
+    def __init__(self):
+        self.msgs = []
+
+    def _sendMessage(self, msg, flush=False):
+        self.msgs.append(msg)
+
+
+def test_action():
+    serverFactory = server.ServerProtocolFactory(seed=42)
+    serverFactory.clock = task.Clock()
+    admin = server.ServerPlayer(1, 'Admin', MessageRecorder())
+    other = server.ServerPlayer(2, 'Other', MessageRecorder())
+    game = server.ServerGame(serverFactory, 1, GameInfo('Game').getMsg(),
+                             admin)
+    serverFactory.games[1] = game
+    game.addPlayer(admin)
+    game.addPlayer(other)
+    game._acks = set()
+    game._turn = admin
+    game._order = [admin, other]
+    game._street = Round.PREFLOP
+    game._highestSet = 20
+    game._minimumRaise = 20
+    admin.money = other.money = 3000
+    admin.bet(10)
+    other.bet(20)
+    Rejected = pokerth_pb2.YourActionRejectedMessage
+    assert game.action(other, Action.CALL, 0, Round.PREFLOP) == \
+        Rejected.rejectedNotYourTurn
+    assert game.action(admin, Action.CALL, 0, Round.FLOP) == \
+        Rejected.rejectedInvalidGameState
+    assert game.action(admin, Action.CHECK, 0, Round.PREFLOP) == \
+        Rejected.rejectedActionNotAllowed
+    assert game.action(admin, Action.BET, 40, Round.PREFLOP) == \
+        Rejected.rejectedActionNotAllowed
+    assert game.action(admin, Action.RAISE, 10, Round.PREFLOP) == \
+        Rejected.rejectedActionNotAllowed
+    assert game.action(admin, Action.RAISE, 40, Round.PREFLOP) is None
+    assert admin.roundBet == 60
+    assert admin.money == 2940
+    assert game._highestSet == 60
+    assert game._minimumRaise == 40
+    actionDone, playersTurn = other.proto.msgs[-2:]
+    assert actionDone.playerAction == Action.RAISE
+    assert actionDone.highestSet == 60
+    assert playersTurn.playerId == other.playerId
+
+
+def test_distribute():
+    serverFactory = server.ServerProtocolFactory(seed=42)
+    admin = server.ServerPlayer(1, 'Admin')
+    game = server.ServerGame(serverFactory, 1, GameInfo('Game').getMsg(),
+                             admin)
+    players = [server.ServerPlayer(i, str(i)) for i in range(4)]
+    game.players = players
+    for player, bet in zip(players, [50, 100, 200, 300]):
+        player.bet(bet)
+    players[3].folded = True
+    contenders = players[:3]
+    # short stack has the best hand, the biggest stack the worst
+    hands = {players[0]: (3, None), players[1]: (2, None),
+             players[2]: (1, None)}
+    wins = game._distribute(contenders, hands)
+    assert wins[players[0]] == 4*50
+    assert wins[players[1]] == 3*50
+    assert wins[players[2]] == 2*100 + 100
+    assert sum(wins.values()) == 650
+
+
+def test_message_before_init():
+    serverFactory = server.ServerProtocolFactory(seed=42)
+    serverFactory.clock = task.Clock()
+    proto = serverFactory.buildProtocol(None)
+    tr = proto_helpers.StringTransport()
+    proto.makeConnection(tr)
+    tr.clear()
+    msg = pokerth_pb2.JoinNewGameMessage()
+    msg.gameInfo.MergeFrom(GameInfo('Game').getMsg())
+    proto.dataReceived(transport.pack(transport.envelop(msg)))
+    frames = list(transport.FrameDecoder().feed(tr.value()))
+    assert len(frames) == 1
+    reply = transport.develop(transport.unpack(frames[0]))
+    assert reply.errorReason == pokerth_pb2.ErrorMessage.invalidState
+    assert tr.disconnecting
+    assert not serverFactory.games
@@ -5,6 +5,8 @@ from __future__ import print_function, absolute_import, division
 __author__ = 'Florian Wilhelm'
 __copyright__ = 'Florian Wilhelm'
 
+import random
+
 from pokerthproto import transport
 from pokerthproto.pokerth_pb2 import PokerTHMessage
 
@@ -37,3 +39,47 @@ def test_pack_unpack(initMsgData):
     assert isinstance(envelope, PokerTHMessage)
     data = transport.pack(envelope)
     assert data == initMsgData
+
+
+def test_FrameDecoder(initMsgData):
+    decoder = transport.FrameDecoder(compactSize=64)
+    frames = list(decoder.feed(initMsgData))
+    assert len(frames) == 1
+    assert frames[0].tobytes() == initMsgData[4:]
+    assert len(decoder) == 0
+    del frames
+    stream = 100*initMsgData
+    cuts = sorted(random.sample(range(1, len(stream)), 50))
+    received = []
+    for start, stop in zip([0] + cuts, cuts + [len(stream)]):
+        for frame in decoder.feed(stream[start:stop]):
+            received.append(transport.unpack(frame))
+    assert len(received) == 100
+    assert all(msg == received[0] for msg in received)
+    assert len(decoder) == 0
+
+
+def test_FrameDecoder_keeps_referenced_frames(initMsgData):
+    decoder = transport.FrameDecoder(compactSize=0)
+    frames = list(decoder.feed(initMsgData + initMsgData[:5]))
+    assert len(decoder) == 5
+    frames.extend(decoder.feed(initMsgData[5:]))
+    assert [f.tobytes() for f in frames] == 2*[initMsgData[4:]]
+
+
+def test_envelop_all_message_types():
+    msg_types = PokerTHMessage.PokerTHMessageType.values()
+    assert len(transport._fieldByType) == len(msg_types)
+    for msg_type in msg_types:
+        field = transport._fieldByType[msg_type]
+        msg = getattr(PokerTHMessage(), field)
+        envelope = transport.envelop(msg)
+        assert envelope.messageType == msg_type
+        assert transport._fieldByClass[msg.__class__] == (field, msg_type)
+
+
+def test_envelop_develop(initMsgData):
+    envelope = transport.unpack(initMsgData[4:])
+    msg = transport.develop(envelope)
+    assert msg.nickName == 'Human Player'
+    assert transport.envelop(msg) == envelope